@@ -1,8 +1,14 @@
-import csv
+import asyncio
+import heapq
 import os
-import re
-from typing import List, Optional, Set
-
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from bm25_scorer import BM25Scorer
+from case_index import CaseIndex, tokenize
+from corpus_bin import default_bin_path
+from fts_backend import FTSCaseStore
 from models import AnalystOutput, DataPoint
 
 
@@ -13,77 +19,167 @@ class AnalystAgent:
 
     NEW:
     - Supports exclude_sources: when provided, it will skip rows whose case_id is already used.
+    - Uses an inverted index (token -> row ids), so a query only touches
+      the rows that share at least one token with it.
+    - The index is persisted next to the CSV (see case_index.py) and loaded
+      lazily, so creating an AnalystAgent is cheap.
+    - scoring="bm25" ranks with vectorized BM25 (needs numpy + scipy);
+      scoring="overlap" (default) keeps the original token-overlap count.
+    - run_many(topics) retrieves for a batch of topics at once.
+    - backend="fts5" serves queries from an SQLite FTS5 table instead of the
+      in-memory index (near-constant memory for very large corpora).
+    - mmap_corpus=True reads case rows from a memory-mapped <csv>.bin file
+      (see corpus_bin.py), shared between worker processes via the page cache.
+    - ingest_workers > 1 builds a missing/stale index with a process pool.
+    - arun()/arun_many() for asyncio callers.
+    - Thread-safe: the index / scorer / FTS store are loaded once even when
+      several threads (e.g. Streamlit sessions sharing one agent) query at once.
     """
 
-    def __init__(self, csv_path: str = "business_memo_cases_20k.csv", top_k: int = 3):
+    SCORING_MODES = ("overlap", "bm25")
+    BACKENDS = ("index", "fts5")
+    BATCH_SIZE = 64  # topics per sparse product in run_many (bounds the dense score matrix)
+
+    def __init__(self, csv_path: str = "business_memo_cases_20k.csv", top_k: int = 3,
+                 index_path: Optional[str] = None, scoring: str = "overlap",
+                 backend: str = "index", mmap_corpus: bool = False, ingest_workers: int = 1):
+        if scoring not in self.SCORING_MODES:
+            raise ValueError(f"Unknown scoring mode {scoring!r} (expected one of {self.SCORING_MODES})")
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r} (expected one of {self.BACKENDS})")
+
         self.csv_path = csv_path
         self.top_k = top_k
-        self.rows = self._load_rows()
-
-    def _load_rows(self) -> List[dict]:
+        self.index_path = index_path
+        self.scoring = scoring
+        self.backend = backend
+        self.mmap_corpus = mmap_corpus
+        self.ingest_workers = ingest_workers
+        self._index: Optional[CaseIndex] = None
+        self._index_loaded = False
+        self._bm25: Optional[BM25Scorer] = None
+        self._fts: Optional[FTSCaseStore] = None
+        self._load_lock = threading.Lock()
+
+    def _resolve_csv_path(self) -> Optional[str]:
         if not os.path.exists(self.csv_path):
             alt = "business_memo_cases.csv"
             if os.path.exists(alt):
                 self.csv_path = alt
             else:
-                return []
+                return None
+        return self.csv_path
 
-        rows = []
-        with open(self.csv_path, "r", encoding="utf-8", newline="") as f:
-            reader = csv.DictReader(f)
-            for r in reader:
-                rows.append(r)
-        return rows
+    @property
+    def index(self) -> Optional[CaseIndex]:
+        """
+        Loaded lazily on first use: reads the prebuilt <csv>.idx file,
+        or (re)builds it when it is missing or the CSV changed.
+        """
+        if not self._index_loaded:
+            with self._load_lock:
+                if not self._index_loaded:
+                    csv_path = self._resolve_csv_path()
+                    if csv_path is not None:
+                        bin_path = default_bin_path(csv_path) if self.mmap_corpus else None
+                        self._index = CaseIndex.load_or_build(csv_path, self.index_path, bin_path,
+                                                              workers=self.ingest_workers)
+                    self._index_loaded = True
+        return self._index
 
     def _tokenize(self, text: str) -> set:
-        return set(re.findall(r"[a-z0-9]+", (text or "").lower()))
+        return tokenize(text)
+
+    def _rank_overlap(self, index: CaseIndex, topic: str, exclude_sources: Set[str]) -> List[int]:
+        # score = number of query tokens the row contains, counted from the postings
+        scores: Dict[int, int] = defaultdict(int)
+        for token in self._tokenize(topic):
+            for row_id in index.postings.get(token, ()):
+                scores[row_id] += 1
+
+        # threshold to avoid random matches; ties keep CSV order (lowest row id first)
+        store = index.store
+        candidates = (
+            (s, row_id) for row_id, s in scores.items()
+            if s >= 2 and not (exclude_sources and store.case_id(row_id) in exclude_sources)
+        )
+        best = heapq.nsmallest(self.top_k, candidates, key=lambda x: (-x[0], x[1]))
+        return [row_id for _, row_id in best]
+
+    def _bm25_scorer(self, index: CaseIndex) -> BM25Scorer:
+        if self._bm25 is None:
+            with self._load_lock:
+                if self._bm25 is None:
+                    self._bm25 = BM25Scorer(index)
+        return self._bm25
+
+    def _fts_store(self) -> Optional[FTSCaseStore]:
+        if self._fts is None:
+            with self._load_lock:
+                if self._fts is None:
+                    csv_path = self._resolve_csv_path()
+                    if csv_path is None:
+                        return None
+                    store = FTSCaseStore(csv_path)
+                    store.ensure_ready()  # import under the lock too, not in the first concurrent search()
+                    self._fts = store
+        return self._fts
+
+    def _index_hits(self, index: CaseIndex, best: List[int]) -> List[Tuple[str, str]]:
+        """(case_id, gold_data_points) for the selected rows, best first."""
+        if not best:
+            return []
+        records = index.store.records(best)
+        return [(records[row_id].case_id, records[row_id].gold_data_points) for row_id in best]
+
+    def _to_output(self, topic: str, hits: List[Tuple[str, str]]) -> AnalystOutput:
+        if not hits:
+            return AnalystOutput(topic=topic, data_points=[])
+
+        data_points: List[DataPoint] = []
+        for case_id, gold in hits:
+            for dp in [x.strip() for x in gold.split("|") if x.strip()]:
+                data_points.append(DataPoint(text=dp, source=case_id))
+
+        # limit to avoid noisy drafts
+        return AnalystOutput(topic=topic, data_points=data_points[:8])
 
     def run(self, topic: str, exclude_sources: Optional[Set[str]] = None) -> AnalystOutput:
         """
         Retrieve relevant data points for the topic.
         If exclude_sources is provided, rows with case_id in exclude_sources are skipped.
         """
-        if not self.rows:
-            return AnalystOutput(topic=topic, data_points=[])
+        return self.run_many([topic], exclude_sources)[0]
 
+    def run_many(self, topics: List[str], exclude_sources: Optional[Set[str]] = None) -> List[AnalystOutput]:
+        """
+        Retrieve data points for several topics (one AnalystOutput per topic, same order).
+        In bm25 mode the whole batch is scored with one sparse matrix product.
+        """
         exclude_sources = exclude_sources or set()
 
-        q = self._tokenize(topic)
-        scored = []
+        if self.backend == "fts5":
+            store = self._fts_store()
+            if store is None:
+                return [AnalystOutput(topic=topic, data_points=[]) for topic in topics]
+            return [self._to_output(topic, store.search(topic, self.top_k, exclude_sources)) for topic in topics]
 
-        for r in self.rows:
-            case_id = (r.get("case_id") or "UNKNOWN_CASE").strip()
+        index = self.index
+        if not index:
+            return [AnalystOutput(topic=topic, data_points=[]) for topic in topics]
 
-            # ✅ NEW: skip already-used cases
-            if case_id in exclude_sources:
-                continue
+        if self.scoring == "bm25":
+            scorer = self._bm25_scorer(index)
+            ranked: List[List[int]] = []
+            for i in range(0, len(topics), self.BATCH_SIZE):
+                ranked.extend(scorer.top_k(topics[i:i + self.BATCH_SIZE], self.top_k, exclude_sources))
+        else:
+            ranked = [self._rank_overlap(index, topic, exclude_sources) for topic in topics]
 
-            corpus = " ".join([
-                r.get("topic", "") or "",
-                r.get("audience", "") or "",
-                r.get("tone", "") or "",
-                r.get("evidence_pack", "") or "",
-                r.get("gold_data_points", "") or "",
-            ])
+        return [self._to_output(topic, self._index_hits(index, best)) for topic, best in zip(topics, ranked)]
 
-            tokens = self._tokenize(corpus)
-            score = len(q & tokens)
-            scored.append((score, r))
-
-        scored.sort(key=lambda x: x[0], reverse=True)
-
-        # threshold to avoid random matches
-        best = [r for s, r in scored[: self.top_k] if s >= 2]
-        if not best:
-            return AnalystOutput(topic=topic, data_points=[])
+    async def arun(self, topic: str, exclude_sources: Optional[Set[str]] = None) -> AnalystOutput:
+        return await asyncio.to_thread(self.run, topic, exclude_sources)
 
-        data_points: List[DataPoint] = []
-        for r in best:
-            case_id = (r.get("case_id") or "UNKNOWN_CASE").strip()
-            gold = r.get("gold_data_points", "") or ""
-
-            for dp in [x.strip() for x in gold.split("|") if x.strip()]:
-                data_points.append(DataPoint(text=dp, source=case_id))
-
-        # limit to avoid noisy drafts
-        return AnalystOutput(topic=topic, data_points=data_points[:8])
+    async def arun_many(self, topics: List[str], exclude_sources: Optional[Set[str]] = None) -> List[AnalystOutput]:
+        return await asyncio.to_thread(self.run_many, topics, exclude_sources)
@@ -0,0 +1,215 @@
+# analytics.py
+#
+# Reports over the SQLite evaluation_log / feedback_log tables. All
+# aggregation runs inside SQLite (GROUP BY over indexed columns), so only the
+# summary rows are brought into Python. Rows older than the retention horizon
+# are read from the evaluation_daily / feedback_daily rollups written by
+# maintenance.py (day resolution), so reports still cover the full history.
+# Run reports leave out batch_memo.py runs (final_decision batch_*), which had
+# no human review.
+#
+#   python analytics.py --since 2026-01-01 --window week --top 20
+
+import argparse
+from typing import Any, Dict, List, Optional, Tuple
+
+from analyze_evaluation import BATCH_DECISION_PREFIX
+from database import get_connection, init_db
+
+# strftime() patterns for rating_trend() windows
+WINDOWS = {
+    "day": "%Y-%m-%d",
+    "week": "%Y-W%W",
+    "month": "%Y-%m",
+}
+
+
+def _time_filter(since: Optional[str], until: Optional[str],
+                 column: str = "timestamp", runs: bool = False) -> Tuple[str, List[str]]:
+    """
+    WHERE clause on an ISO date/time column (string comparison uses the index).
+    For the rollups' day column, since is truncated to its day. runs: also
+    leave out batch runs (evaluation tables only).
+    """
+    clauses, params = [], []
+    if since:
+        clauses.append(f"{column} >= ?")
+        params.append(since[:10] if column == "day" else since)
+    if until:
+        clauses.append(f"{column} < ?")
+        params.append(until)
+    if runs:
+        clauses.append("final_decision NOT LIKE ? ESCAPE '\\'")
+        params.append(BATCH_DECISION_PREFIX.replace("_", "\\_") + "%")
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def _raw_and_rollup(since: Optional[str], until: Optional[str],
+                    runs: bool = False) -> Tuple[str, str, List[str]]:
+    """WHERE clauses for the raw log and for its daily rollup, plus their combined params."""
+    raw_where, raw_params = _time_filter(since, until, runs=runs)
+    day_where, day_params = _time_filter(since, until, column="day", runs=runs)
+    return raw_where, day_where, raw_params + day_params
+
+
+def approval_summary(since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, Any]:
+    """Total runs, counts per final_decision, approval rate and mean revision cycles."""
+    raw_where, day_where, params = _raw_and_rollup(since, until, runs=True)
+    conn = get_connection()
+    rows = conn.execute(
+        f"""
+        SELECT final_decision, SUM(runs) AS runs, SUM(cycles) AS cycles FROM (
+            SELECT final_decision, COUNT(*) AS runs, SUM(revision_cycles) AS cycles
+            FROM evaluation_log{raw_where}
+            GROUP BY final_decision
+            UNION ALL
+            SELECT final_decision, SUM(runs), SUM(revision_cycles * runs)
+            FROM evaluation_daily{day_where}
+            GROUP BY final_decision
+        )
+        GROUP BY final_decision
+        """,
+        params,
+    ).fetchall()
+
+    decisions = {r["final_decision"]: r["runs"] for r in rows}
+    total = sum(decisions.values())
+    total_cycles = sum(r["cycles"] or 0 for r in rows)
+    return {
+        "total_runs": total,
+        "decisions": decisions,
+        "approval_rate": decisions.get("approve", 0) / total if total else 0.0,
+        "avg_revision_cycles": total_cycles / total if total else 0.0,
+    }
+
+
+def revision_cycle_distribution(since: Optional[str] = None, until: Optional[str] = None) -> Dict[int, int]:
+    """Number of runs per revision-cycle count."""
+    raw_where, day_where, params = _raw_and_rollup(since, until, runs=True)
+    conn = get_connection()
+    rows = conn.execute(
+        f"""
+        SELECT revision_cycles, SUM(runs) AS runs FROM (
+            SELECT revision_cycles, COUNT(*) AS runs
+            FROM evaluation_log{raw_where}
+            GROUP BY revision_cycles
+            UNION ALL
+            SELECT revision_cycles, SUM(runs)
+            FROM evaluation_daily{day_where}
+            GROUP BY revision_cycles
+        )
+        GROUP BY revision_cycles
+        ORDER BY revision_cycles
+        """,
+        params,
+    ).fetchall()
+    return {r["revision_cycles"]: r["runs"] for r in rows}
+
+
+def topic_stats(since: Optional[str] = None, until: Optional[str] = None,
+                limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Per-topic runs, approval rate and mean revision cycles (most frequent topics first)."""
+    raw_where, day_where, params = _raw_and_rollup(since, until, runs=True)
+    conn = get_connection()
+    rows = conn.execute(
+        f"""
+        SELECT topic, SUM(runs) AS runs, SUM(approved) AS approved, SUM(cycles) AS cycles FROM (
+            SELECT topic, COUNT(*) AS runs,
+                   SUM(final_decision = 'approve') AS approved,
+                   SUM(revision_cycles) AS cycles
+            FROM evaluation_log{raw_where}
+            GROUP BY topic
+            UNION ALL
+            SELECT topic, SUM(runs),
+                   SUM(CASE WHEN final_decision = 'approve' THEN runs ELSE 0 END),
+                   SUM(revision_cycles * runs)
+            FROM evaluation_daily{day_where}
+            GROUP BY topic
+        )
+        GROUP BY topic
+        ORDER BY runs DESC, topic
+        LIMIT ?
+        """,
+        params + [limit if limit is not None else -1],
+    ).fetchall()
+    return [
+        {
+            "topic": r["topic"],
+            "runs": r["runs"],
+            "approval_rate": r["approved"] / r["runs"],
+            "avg_revision_cycles": r["cycles"] / r["runs"],
+        }
+        for r in rows
+    ]
+
+
+def rating_trend(window: str = "day", since: Optional[str] = None,
+                 until: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Feedback count and mean rating per time window (day / week / month)."""
+    if window not in WINDOWS:
+        raise ValueError(f"Unknown window {window!r} (expected one of {', '.join(WINDOWS)})")
+    raw_where, day_where, params = _raw_and_rollup(since, until)
+    fmt = WINDOWS[window]
+    conn = get_connection()
+    rows = conn.execute(
+        f"""
+        SELECT period, SUM(feedback) AS feedback, SUM(rated) AS rated,
+               CAST(SUM(rating_sum) AS REAL) / NULLIF(SUM(rated), 0) AS avg_rating
+        FROM (
+            SELECT strftime('{fmt}', timestamp) AS period, COUNT(*) AS feedback,
+                   COUNT(rating_1_to_5) AS rated, SUM(rating_1_to_5) AS rating_sum
+            FROM feedback_log{raw_where}
+            GROUP BY period
+            UNION ALL
+            SELECT strftime('{fmt}', day), SUM(feedback), SUM(rated), SUM(rating_sum)
+            FROM feedback_daily{day_where}
+            GROUP BY 1
+        )
+        GROUP BY period
+        ORDER BY period
+        """,
+        params,
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluation / feedback analytics from memo_system.db.")
+    parser.add_argument("--since", help="only rows with timestamp >= this ISO date/time")
+    parser.add_argument("--until", help="only rows with timestamp < this ISO date/time")
+    parser.add_argument("--window", choices=sorted(WINDOWS), default="day", help="rating trend bucket")
+    parser.add_argument("--top", type=int, default=20, help="number of topics to list (default: 20)")
+    args = parser.parse_args()
+
+    init_db()
+    summary = approval_summary(args.since, args.until)
+    if not summary["total_runs"]:
+        print("No runs logged in memo_system.db for this period.")
+        return
+
+    print("=== Business Memo System – Evaluation Summary (SQLite) ===")
+    print(f"Total runs: {summary['total_runs']}")
+    for decision, runs in sorted(summary["decisions"].items(), key=lambda kv: -kv[1]):
+        print(f"  {decision}: {runs}")
+    print(f"Approval rate: {summary['approval_rate'] * 100:.1f}%")
+    print(f"Average revision cycles: {summary['avg_revision_cycles']:.2f}")
+
+    print("\nRevision-cycle distribution:")
+    for cycles, runs in revision_cycle_distribution(args.since, args.until).items():
+        print(f"  {cycles}: {runs} ({runs / summary['total_runs'] * 100:.1f}%)")
+
+    print(f"\nTop {args.top} topics:")
+    for t in topic_stats(args.since, args.until, limit=args.top):
+        print(f"  - {t['topic']!r}: runs {t['runs']}, approved {t['approval_rate'] * 100:.1f}%, "
+              f"avg cycles {t['avg_revision_cycles']:.2f}")
+
+    trend = rating_trend(args.window, args.since, args.until)
+    if trend:
+        print(f"\nRating trend per {args.window}:")
+        for p in trend:
+            avg = f"{p['avg_rating']:.2f}" if p["avg_rating"] is not None else "-"
+            print(f"  {p['period']}: avg rating {avg} ({p['rated']} rated / {p['feedback']} feedback)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,122 @@
+import argparse
 import csv
+from itertools import chain
 from pathlib import Path
-from statistics import mean
-from collections import Counter
+from typing import Dict, Iterator, List
 
+# For the SQLite logs (evaluation_log / feedback_log tables) see analytics.py.
 
-def load_evaluation_log(filepath: str = "evaluation_log.csv"):
+# final_decision prefix of batch_memo.py runs: generated without human review,
+# so they are left out of approval rates and revision-cycle averages
+BATCH_DECISION_PREFIX = "batch_"
+
+
+def rollup_path(filepath: str) -> str:
+    """Daily rollup written by maintenance.py for rows trimmed from the CSV log."""
+    path = Path(filepath)
+    return str(path.with_name(path.stem + ".daily.csv"))
+
+
+def iter_evaluation_log(filepath: str = "evaluation_log.csv") -> Iterator[tuple]:
+    """
+    Streams (topic, final_decision, revision_cycles, runs) tuples from the CSV
+    log, one row at a time (runs is always 1), so memory stays flat however
+    large the file is.
+    """
     path = Path(filepath)
     if not path.exists():
         print(f"No evaluation_log.csv found at {path.resolve()}")
-        return []
+        return
 
-    rows = []
     with path.open(mode="r", newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header:
+            return
+        i_topic = header.index("topic")
+        i_decision = header.index("final_decision")
+        i_cycles = header.index("revision_cycles")
+        width = max(i_topic, i_decision, i_cycles)
+
         for row in reader:
+            if len(row) <= width:
+                continue
             # Convert revision_cycles to int safely
             try:
-                row["revision_cycles"] = int(row["revision_cycles"])
-            except (ValueError, KeyError):
-                row["revision_cycles"] = 0
-            rows.append(row)
-    return rows
+                cycles = int(row[i_cycles])
+            except ValueError:
+                cycles = 0
+            yield row[i_topic], row[i_decision], cycles, 1
+
+
+def iter_evaluation_rollup(filepath: str = "evaluation_log.csv") -> Iterator[tuple]:
+    """Same tuples from the daily rollup of older runs (runs = number of runs in that group)."""
+    path = Path(rollup_path(filepath))
+    if not path.exists():
+        return
+    with path.open(mode="r", newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            yield row["topic"], row["final_decision"], int(row["revision_cycles"]), int(row["runs"])
+
+
+def load_evaluation_log(filepath: str = "evaluation_log.csv") -> List[dict]:
+    """Whole log as a list of dicts (small files only; main() streams instead)."""
+    return [
+        {"topic": topic, "final_decision": decision, "revision_cycles": cycles}
+        for topic, decision, cycles, _ in iter_evaluation_log(filepath)
+    ]
+
+
+def summarize(rows: Iterator[tuple]) -> Dict:
+    """
+    Single pass with running totals: O(number of topics) memory, not O(rows).
+    Batch runs (final_decision batch_*) are skipped.
+    """
+    total_runs = 0
+    total_cycles = 0
+    decision_counts: Dict[str, int] = {}
+    topic_totals: Dict[str, List[int]] = {}  # topic -> [runs, cycles]
+
+    for topic, decision, cycles, runs in rows:
+        if decision.startswith(BATCH_DECISION_PREFIX):
+            continue
+        total_runs += runs
+        total_cycles += cycles * runs
+        decision_counts[decision] = decision_counts.get(decision, 0) + runs
+        totals = topic_totals.get(topic)
+        if totals is None:
+            topic_totals[topic] = [runs, cycles * runs]
+        else:
+            totals[0] += runs
+            totals[1] += cycles * runs
+
+    return {
+        "total_runs": total_runs,
+        "total_cycles": total_cycles,
+        "decision_counts": decision_counts,
+        "topic_totals": topic_totals,
+    }
 
 
 def main():
-    rows = load_evaluation_log()
-    if not rows:
+    parser = argparse.ArgumentParser(description="Summarize evaluation_log.csv (streamed).")
+    parser.add_argument("filepath", nargs="?", default="evaluation_log.csv")
+    parser.add_argument("--top", type=int, default=None,
+                        help="only list the N most frequent topics (default: all, in first-seen order)")
+    args = parser.parse_args()
+
+    # older runs trimmed by maintenance.py live in the daily rollup
+    stats = summarize(chain(iter_evaluation_rollup(args.filepath), iter_evaluation_log(args.filepath)))
+    total_runs = stats["total_runs"]
+    if not total_runs:
         print("No data to analyze yet. Run business_memo_system.py a few times first.")
         return
 
-    total_runs = len(rows)
-    decisions = [r["final_decision"] for r in rows]
-    revision_cycles = [r["revision_cycles"] for r in rows]
-
-    decision_counts = Counter(decisions)
+    decision_counts = stats["decision_counts"]
     approved = decision_counts.get("approve", 0)
     rejected = decision_counts.get("reject", 0)
 
-    avg_revision_cycles = mean(revision_cycles)
+    avg_revision_cycles = stats["total_cycles"] / total_runs
 
     print("=== Business Memo System – Evaluation Summary ===")
     print(f"Total runs: {total_runs}")
@@ -48,13 +127,12 @@ def main():
 
     # Optional: per-topic stats
     print("\nPer-topic average revision cycles:")
-    topic_to_cycles = {}
-    for r in rows:
-        topic = r["topic"]
-        topic_to_cycles.setdefault(topic, []).append(r["revision_cycles"])
+    topics = list(stats["topic_totals"].items())
+    if args.top is not None:
+        topics = sorted(topics, key=lambda kv: (-kv[1][0], kv[0]))[:args.top]
 
-    for topic, cycles in topic_to_cycles.items():
-        print(f"  - {topic!r}: {mean(cycles):.2f} (runs: {len(cycles)})")
+    for topic, (runs, cycles) in topics:
+        print(f"  - {topic!r}: {cycles / runs:.2f} (runs: {runs})")
 
 
 if __name__ == "__main__":
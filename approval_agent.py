@@ -1,3 +1,5 @@
+from typing import Iterable
+
 from models import DraftOutput, ApprovalOutput
 
 
@@ -7,6 +9,9 @@ class ApprovalAgent:
     Shows the draft to the user and collects:
     - approve
     - edit_request
+
+    NEW:
+    - run_stream() prints the draft while it is being generated.
     """
 
     def run(self, draft: DraftOutput) -> ApprovalOutput:
@@ -15,6 +20,19 @@ class ApprovalAgent:
         print(draft.body)
         print("\n=======================\n")
 
+        return self._ask_decision()
+
+    def run_stream(self, subject: str, body_pieces: Iterable[str]) -> ApprovalOutput:
+        """Same as run(), but renders the body piece by piece as it arrives."""
+        print("\n===== EMAIL DRAFT =====")
+        print(f"{subject}\n")
+        for piece in body_pieces:
+            print(piece, end="", flush=True)
+        print("\n\n=======================\n")
+
+        return self._ask_decision()
+
+    def _ask_decision(self) -> ApprovalOutput:
         while True:
             choice = input("Type 'a' = approve, 'e' = edit_request: ").strip().lower()
 
@@ -0,0 +1,196 @@
+# batch_memo.py
+#
+# Headless batch generation: one memo (v1, no human review) per input topic.
+#
+#   python batch_memo.py topics.jsonl --output memos.jsonl --workers 8 --llm-concurrency 2
+#
+# Input: JSONL ({"topic": "..."} or a plain JSON string per line) or CSV with a
+# "topic" column. Results are streamed to the output JSONL as they finish and
+# every run is logged to the SQLite evaluation_log table (final_decision
+# batch_generated / batch_error, which the approval reports leave out).
+
+import argparse
+import csv
+import json
+import math
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional
+
+from analyst_agent import AnalystAgent
+from analyze_evaluation import BATCH_DECISION_PREFIX
+from database import init_db
+from drafting_agent import DraftingAgent
+from evaluation_logger_sql import EvaluationLoggerSQL
+from models import DraftInput
+
+
+def read_topics(path: str, input_errors: Optional[List[Dict]] = None) -> Iterator[str]:
+    """
+    Yields the non-empty topics of the input file. Lines that are not valid
+    JSON or whose topic is not a string (e.g. {"topic": 123} or null) are
+    skipped and recorded in input_errors as {"line": n, "error": ...}.
+    """
+    def reject(line_no: int, error: str) -> None:
+        if input_errors is not None:
+            input_errors.append({"line": line_no, "error": error})
+
+    if path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                topic = (row.get("topic") or "").strip()
+                if topic:
+                    yield topic
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                reject(line_no, f"invalid JSON: {e}")
+                continue
+            topic = item.get("topic") if isinstance(item, dict) else item
+            if not isinstance(topic, str):
+                reject(line_no, f"topic is not a string: {topic!r}")
+                continue
+            if topic.strip():
+                yield topic.strip()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (values need not be sorted)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class BatchMemoRunner:
+    """
+    Runs retrieval + drafting for many topics on a thread pool.
+    Retrieval runs with full worker parallelism; LLM calls are additionally
+    limited by llm_concurrency (the local model is the scarce resource).
+    """
+
+    def __init__(self, workers: int = 4, llm_concurrency: int = 1,
+                 analyst: AnalystAgent | None = None, drafter: DraftingAgent | None = None):
+        self.workers = workers
+        self.analyst = analyst or AnalystAgent()
+        self.drafter = drafter or DraftingAgent()
+        self.logger = EvaluationLoggerSQL()
+        self._llm_slots = threading.Semaphore(llm_concurrency)
+
+    def generate(self, topic: str) -> Dict:
+        started = time.perf_counter()
+        try:
+            analyst_output = self.analyst.run(topic)
+            points = analyst_output.data_points
+            draft_input = DraftInput(
+                topic=topic,
+                data_points=points,
+                edit_request=None,
+                version=1,
+                grounded=bool(points),
+            )
+            with self._llm_slots:
+                draft = self.drafter.run(draft_input)
+
+            result = {
+                "topic": topic,
+                "subject": draft.subject,
+                "body": draft.body,
+                "grounded": bool(points),
+                "sources": sorted({dp.source for dp in points if dp.source}),
+                "error": None,
+            }
+            decision = BATCH_DECISION_PREFIX + "generated"
+        except Exception as e:  # one bad topic must not stop the batch
+            result = {"topic": topic, "error": f"{type(e).__name__}: {e}"}
+            decision = BATCH_DECISION_PREFIX + "error"
+
+        result["latency_s"] = round(time.perf_counter() - started, 3)
+        self.logger.log(topic=topic, revision_cycles=0, final_decision=decision)
+        return result
+
+    def run(self, topics: Iterator[str], output_path: str) -> Dict:
+        # load the retrieval index once, before worker threads race for it
+        _ = self.analyst.index
+
+        latencies: List[float] = []
+        errors = 0
+        started = time.perf_counter()
+        max_in_flight = self.workers * 4  # bounded, so huge inputs are not all queued at once
+
+        with open(output_path, "w", encoding="utf-8") as out, \
+                ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = set()
+
+            def drain(block_until_below: int):
+                nonlocal errors, pending
+                while len(pending) >= block_until_below and pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        result = future.result()
+                        latencies.append(result["latency_s"])
+                        if result["error"]:
+                            errors += 1
+                        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                        out.flush()
+
+            for topic in topics:
+                pending.add(pool.submit(self.generate, topic))
+                drain(max_in_flight)
+            drain(1)
+
+        elapsed = time.perf_counter() - started
+        return {
+            "memos": len(latencies),
+            "errors": errors,
+            "elapsed_s": round(elapsed, 2),
+            "throughput_per_min": round(len(latencies) / elapsed * 60, 2) if elapsed > 0 else 0.0,
+            "p50_latency_s": percentile(latencies, 50),
+            "p95_latency_s": percentile(latencies, 95),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate memos for a file of topics (no human review).")
+    parser.add_argument("input", help="topics file (.jsonl or .csv with a 'topic' column)")
+    parser.add_argument("--output", default="batch_memos.jsonl")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--llm-concurrency", type=int, default=1,
+                        help="max simultaneous LLM generations (default: 1)")
+    parser.add_argument("--model", default="phi3")
+    parser.add_argument("--no-cache", action="store_true", help="always generate fresh text")
+    parser.add_argument("--persist-cache", action="store_true",
+                        help="keep responses in memo_system.db for a day, so re-running a batch reuses them")
+    args = parser.parse_args()
+
+    init_db()
+    runner = BatchMemoRunner(
+        workers=args.workers,
+        llm_concurrency=args.llm_concurrency,
+        drafter=DraftingAgent(model_name=args.model, use_cache=not args.no_cache,
+                              persist_cache=args.persist_cache),
+    )
+    input_errors: List[Dict] = []
+    report = runner.run(read_topics(args.input, input_errors), args.output)
+
+    print("=== Batch memo generation ===")
+    print(f"Memos written: {report['memos']} -> {args.output} (errors: {report['errors']})")
+    print(f"Elapsed: {report['elapsed_s']:.2f}s, throughput: {report['throughput_per_min']:.2f} memos/min")
+    print(f"Latency p50: {report['p50_latency_s']:.2f}s, p95: {report['p95_latency_s']:.2f}s")
+    if input_errors:
+        print(f"Skipped input lines: {len(input_errors)}")
+        for e in input_errors[:10]:
+            print(f"  line {e['line']}: {e['error']}")
+
+
+if __name__ == "__main__":
+    main()
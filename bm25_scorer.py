@@ -0,0 +1,116 @@
+# bm25_scorer.py
+
+import math
+import threading
+from typing import Dict, List, Optional, Set
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # optional dependency: only needed for scoring="bm25"
+    np = None
+    sparse = None
+
+from case_index import CaseIndex, tokenize
+
+
+class BM25Scorer:
+    """
+    Vectorized BM25 ranking over a CaseIndex (optional: needs numpy + scipy).
+
+    Builds a sparse document-term matrix of BM25 weights once. A batch of
+    queries is then scored with a single sparse matrix product, and top-k
+    rows are picked with argpartition instead of a full sort.
+    """
+
+    def __init__(self, index: CaseIndex, k1: float = 1.5, b: float = 0.75):
+        if np is None:
+            raise ImportError("BM25 scoring needs numpy and scipy: pip install numpy scipy")
+
+        self.index = index
+        self.vocab: Dict[str, int] = {token: j for j, token in enumerate(index.postings)}
+
+        n_docs = len(index)
+        doc_lens = np.frombuffer(index.doc_lens, dtype=np.uint32).astype(np.float32)
+        avg_len = float(doc_lens.mean()) if n_docs else 0.0
+
+        rows, cols, tfs = [], [], []
+        for token, j in self.vocab.items():
+            postings = np.frombuffer(index.postings[token], dtype=np.uint32)
+            rows.append(postings)
+            cols.append(np.full(len(postings), j, dtype=np.uint32))
+            tfs.append(np.frombuffer(index.tfs[token], dtype=np.uint8))
+
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.uint32)
+        cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.uint32)
+        tf = np.concatenate(tfs).astype(np.float32) if tfs else np.zeros(0, dtype=np.float32)
+
+        df = np.array([len(index.postings[t]) for t in self.vocab], dtype=np.float32)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+
+        norm = k1 * (1.0 - b + b * doc_lens[rows] / (avg_len or 1.0))
+        weights = idf[cols] * tf * (k1 + 1.0) / (tf + norm)
+
+        shape = (n_docs, len(self.vocab))
+        self.matrix = sparse.csr_matrix((weights, (rows, cols)), shape=shape, dtype=np.float32)
+
+        # Same sparsity pattern with 1.0 everywhere: counts matched query tokens
+        self.hits = self.matrix.copy()
+        self.hits.data[:] = 1.0
+
+        self._rows_by_case: Optional[Dict[str, List[int]]] = None  # built on the first exclusion
+        self._rows_by_case_lock = threading.Lock()
+
+    def _query_matrix(self, topics: List[str]):
+        rows, cols = [], []
+        for q, topic in enumerate(topics):
+            for token in tokenize(topic):
+                j = self.vocab.get(token)
+                if j is not None:
+                    rows.append(j)
+                    cols.append(q)
+        data = np.ones(len(rows), dtype=np.float32)
+        return sparse.csc_matrix((data, (rows, cols)), shape=(len(self.vocab), len(topics)))
+
+    def _excluded_rows(self, exclude_sources: Set[str]) -> List[int]:
+        if self._rows_by_case is None:
+            with self._rows_by_case_lock:  # AnalystAgent shares one scorer between threads
+                if self._rows_by_case is None:
+                    rows_by_case: Dict[str, List[int]] = {}
+                    for row_id, case_id in enumerate(self.index.store.iter_case_ids()):
+                        rows_by_case.setdefault(case_id, []).append(row_id)
+                    self._rows_by_case = rows_by_case
+        out: List[int] = []
+        for case_id in exclude_sources:
+            out.extend(self._rows_by_case.get(case_id, ()))
+        return out
+
+    def top_k(self, topics: List[str], k: int, exclude_sources: Optional[Set[str]] = None,
+              min_hits: int = 2) -> List[List[int]]:
+        """
+        Returns, for each topic, up to k row ids ordered by BM25 score.
+        Rows matching fewer than min_hits distinct query tokens are dropped.
+        """
+        if not topics or not len(self.index) or k <= 0:
+            return [[] for _ in topics]
+
+        q = self._query_matrix(topics)
+        scores = (self.matrix @ q).toarray()
+        hits = (self.hits @ q).toarray()
+
+        scores[hits < min_hits] = -np.inf
+        if exclude_sources:
+            scores[self._excluded_rows(exclude_sources), :] = -np.inf
+
+        results: List[List[int]] = []
+        n_docs = scores.shape[0]
+        for col in range(scores.shape[1]):
+            s = scores[:, col]
+            if k < n_docs:
+                cand = np.argpartition(-s, k - 1)[:k]
+            else:
+                cand = np.arange(n_docs)
+            # best score first, ties keep CSV order
+            cand = cand[np.lexsort((cand, -s[cand]))]
+            results.append([int(r) for r in cand if math.isfinite(s[r])])
+        return results
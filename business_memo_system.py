@@ -1,18 +1,35 @@
-import csv
-import os
+import asyncio
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 import re
 from database import init_db
 init_db()
 
 from analyst_agent import AnalystAgent
-from drafting_agent import DraftingAgent
+from drafting_agent import DraftConversation, DraftingAgent
 from approval_agent import ApprovalAgent
 from evaluation_logger import EvaluationLogger
+from feedback_logger import FEEDBACK_FILE, FEEDBACK_HEADER
+from log_writer import get_writer
 from models import DraftInput, DataPoint
+from speculation import RevisionSpeculator, foreground, speculation_stats
 
+# arun(): showing a draft and waiting for the human's decision blocks a thread
+# for minutes, so it gets its own pool instead of asyncio's default executor
+REVIEW_WORKERS = 8
+_review_executor: ThreadPoolExecutor | None = None
+_review_executor_lock = threading.Lock()
 
-FEEDBACK_FILE = "feedback_memory.csv"
+
+def _review_pool() -> ThreadPoolExecutor:
+    global _review_executor
+    if _review_executor is None:
+        with _review_executor_lock:
+            if _review_executor is None:
+                _review_executor = ThreadPoolExecutor(max_workers=REVIEW_WORKERS, thread_name_prefix="memo-review")
+    return _review_executor
 
 
 def store_feedback(topic: str, edit_request: str):
@@ -20,12 +37,12 @@ def store_feedback(topic: str, edit_request: str):
     if not edit_request:
         return
 
-    file_exists = os.path.exists(FEEDBACK_FILE)
-    with open(FEEDBACK_FILE, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        if not file_exists:
-            writer.writerow(["topic", "feedback_text", "created_at"])
-        writer.writerow([topic, edit_request, datetime.now(timezone.utc).isoformat()])
+    # appended by the background log writer, off the request path
+    get_writer().submit_csv(
+        FEEDBACK_FILE,
+        FEEDBACK_HEADER,
+        [topic, edit_request, datetime.now(timezone.utc).isoformat()],
+    )
 
 
 def is_missing_info_request(edit_request: str | None) -> bool:
@@ -80,16 +97,54 @@ def get_used_sources(points: list[DataPoint]) -> set[str]:
     return {dp.source for dp in points if dp.source}
 
 
+class _Session:
+    """State of one memo workflow; run() and arun() drive the same steps over it."""
+
+    def __init__(self, topic: str, working_points: list[DataPoint], conversation: DraftConversation | None,
+                 speculator: RevisionSpeculator | None):
+        self.topic = topic
+        self.working_points = working_points
+        self.conversation = conversation
+        self.speculator = speculator
+        self.revision_cycles = 0
+        self.edit_request: str | None = None
+        self.previous_request: str | None = None  # the same edit twice in a row asks for a new sample
+        self.previous_draft: str | None = None
+        self.speculated = None
+        self.final_decision = "unknown"
+
+
 class BusinessMemoSystem:
-    def __init__(self):
+    def __init__(self, speculative: bool = False, conversational: bool = False, structured: bool = False,
+                 incremental: bool = False, use_cache: bool = True):
         self.analyst = AnalystAgent()
-        self.drafter = DraftingAgent()
+        # structured: the model writes only subject / paragraphs / action items
+        self.drafter = DraftingAgent(structured=structured, use_cache=use_cache)
         self.approval = ApprovalAgent()
         self.logger = EvaluationLogger()
-
-    def run(self, topic: str, max_revision_cycles: int = 10) -> int:
-        print("\n[AnalystAgent] Starting analysis + retrieval...")
-        analyst_output = self.analyst.run(topic)
+        # opt-in: pre-draft likely revisions while the user reads a draft (one speculator per session)
+        self.speculative = speculative
+        # opt-in: revisions are follow-up chat turns instead of full prompts
+        self.conversational = conversational
+        # opt-in: edits aimed at one section (subject, a paragraph, action items) only rewrite that section
+        self.incremental = incremental
+
+    @staticmethod
+    def _collect(body_pieces, shown: list):
+        """Passes the draft through, keeping the pieces (the next revision may build on the text)."""
+        for piece in body_pieces:
+            shown.append(piece)
+            yield piece
+
+    @staticmethod
+    def _then_speculate(body_pieces, session: _Session, draft_input: DraftInput, preferences=None):
+        """Passes the draft through; once it is fully shown, starts speculative revisions of it."""
+        with foreground():  # other speculation waits while this draft is generated
+            yield from body_pieces
+        if session.speculator is not None:
+            session.speculator.speculate(draft_input, preferences)
+
+    def _report_initial_evidence(self, analyst_output) -> list[DataPoint]:
         grounded = len(analyst_output.data_points) > 0
         print(f"[AnalystAgent] Done. Retrieved {len(analyst_output.data_points)} data point(s).")
 
@@ -98,10 +153,6 @@ class BusinessMemoSystem:
         else:
             print("[SYSTEM] Grounding: No matching dataset evidence found. Draft may rely on general LLM knowledge (TBD placeholders).")
 
-        revision_cycles = 0
-        edit_request: str | None = None
-        final_decision = "unknown"
-
         working_points = analyst_output.data_points
 
         # Debug: show sources used initially
@@ -110,88 +161,202 @@ class BusinessMemoSystem:
             print(f"[DEBUG] Initial evidence sources: {initial_sources}")
         else:
             print("[DEBUG] Initial evidence sources: []")
+        return working_points
 
-        while True:
-            if revision_cycles >= max_revision_cycles:
-                final_decision = "max_cycles_reached"
-                print(f"\n⚠️ Max revision cycles reached ({max_revision_cycles}). Stopping.")
-                break
+    def _merge_additional_evidence(self, working_points: list[DataPoint], analyst_output_2) -> list[DataPoint]:
+        print(f"[AnalystAgent] Done. Retrieved {len(analyst_output_2.data_points)} additional data point(s).")
 
-            draft_input = DraftInput(
-                topic=topic,
-                data_points=working_points,
-                edit_request=edit_request,
-                version=revision_cycles + 1,
-                grounded=(len(working_points) > 0),
-            )
-
-            print(f"\n[DraftingAgent] Starting drafting (v{draft_input.version})...")
-            draft_output = self.drafter.run(draft_input)
-            print("[DraftingAgent] Done. Draft ready.")
-
-            print("[ApprovalAgent] Waiting for human decision (approve / edit_request)...")
-            approval_output = self.approval.run(draft_output)
-            print(f"[ApprovalAgent] Done. Decision = {approval_output.decision}")
-
-            if approval_output.decision == "approve":
-                final_decision = "approve"
-                print("\n✅ Memo approved!")
-                break
+        before = len(working_points)
+        working_points = merge_datapoints(working_points, analyst_output_2.data_points, limit=16)
+        after = len(working_points)
 
-            if approval_output.decision == "edit_request":
-                revision_cycles += 1
-                edit_request = (approval_output.edit_request or "").strip()
-                if not edit_request:
-                    edit_request = "Please improve clarity and conciseness."
+        print(f"[DEBUG] Evidence size: {before} -> {after}")
+        print(f"[DEBUG] Current evidence sources: {sorted(get_used_sources(working_points))}")
+
+        if len(working_points) > 0:
+            print("[SYSTEM] Grounding: Updated evidence set will be used in the next draft.")
+        else:
+            print("[SYSTEM] Grounding: Still no dataset evidence found; next draft may include TBD placeholders.")
+        return working_points
+
+    def _start(self, topic: str, analyst_output) -> _Session:
+        return _Session(
+            topic,
+            self._report_initial_evidence(analyst_output),
+            DraftConversation() if self.conversational else None,
+            RevisionSpeculator(self.drafter) if self.speculative else None,
+        )
 
-                # If edit request asks for missing/additional info -> rerun AnalystAgent
-                if is_missing_info_request(edit_request):
-                    print("\n[AnalystAgent] Missing-info request detected. Re-running retrieval...")
+    @staticmethod
+    def _has_cycles_left(session: _Session, max_revision_cycles: int) -> bool:
+        if session.revision_cycles >= max_revision_cycles:
+            session.final_decision = "max_cycles_reached"
+            print(f"\n⚠️ Max revision cycles reached ({max_revision_cycles}). Stopping.")
+            return False
+        return True
+
+    def _review(self, session: _Session, preferences=None):
+        """Drafts the next version (or shows the speculated one) and asks for a decision; blocks on the human."""
+        draft_input = DraftInput(
+            topic=session.topic,
+            data_points=session.working_points,
+            edit_request=session.edit_request,
+            version=session.revision_cycles + 1,
+            grounded=(len(session.working_points) > 0),
+            previous_draft=session.previous_draft if self.incremental else None,
+        )
+        use_cache = session.edit_request is None or session.edit_request != session.previous_request
 
-                    used_sources = get_used_sources(working_points)
-                    print(f"[DEBUG] Excluding already-used sources: {sorted(used_sources)}")
+        if session.speculated is not None:
+            print(f"\n[DraftingAgent] v{draft_input.version} was drafted speculatively, showing it now...")
+            body_pieces = iter([session.speculated.body])
+            if session.conversation is not None:
+                self.drafter.record_turn(draft_input, session.conversation, session.speculated.body)
+        else:
+            print(f"\n[DraftingAgent] Starting drafting (v{draft_input.version}), streaming...")
+            body_pieces = self.drafter.stream(draft_input, preferences, session.conversation, use_cache=use_cache)
+        shown: list[str] = []
+        approval_output = self.approval.run_stream(
+            self.drafter.subject_for(draft_input),
+            self._then_speculate(self._collect(body_pieces, shown), session, draft_input, preferences),
+        )
+        session.previous_draft = "".join(shown)
+        session.speculated = None
+        print(f"[ApprovalAgent] Done. Decision = {approval_output.decision}")
+        return approval_output
+
+    @staticmethod
+    def _accept_decision(session: _Session, approval_output) -> bool:
+        """Records the decision; True when it is an edit request (another revision cycle follows)."""
+        if approval_output.decision == "approve":
+            session.final_decision = "approve"
+            print("\n✅ Memo approved!")
+            return False
+
+        if approval_output.decision == "edit_request":
+            session.revision_cycles += 1
+            session.previous_request = session.edit_request
+            session.edit_request = (approval_output.edit_request or "").strip()
+            if not session.edit_request:
+                session.edit_request = "Please improve clarity and conciseness."
+            return True
+
+        session.final_decision = "unknown"
+        print("\n⚠️ Unknown decision, stopping.")
+        return False
 
-                    # Ask for NEW evidence by excluding already used case IDs
-                    query = f"{topic}. User request: {edit_request}"
-                    analyst_output_2 = self.analyst.run(query, exclude_sources=used_sources)
+    @staticmethod
+    def _missing_info_query(session: _Session) -> tuple[str, set[str]]:
+        """The retrieval query for a missing-info request, and the case IDs it must not return again."""
+        print("\n[AnalystAgent] Missing-info request detected. Re-running retrieval...")
+
+        used_sources = get_used_sources(session.working_points)
+        print(f"[DEBUG] Excluding already-used sources: {sorted(used_sources)}")
+
+        if session.speculator is not None:
+            session.speculator.discard()  # new evidence: speculated drafts are stale
+        # Ask for NEW evidence by excluding already used case IDs
+        return f"{session.topic}. User request: {session.edit_request}", used_sources
+
+    @staticmethod
+    def _style_edit(session: _Session) -> None:
+        """Style edits are good feedback to reuse later; a matching speculated draft is taken here."""
+        store_feedback(session.topic, session.edit_request)
+        if session.speculator is not None:
+            session.speculated = session.speculator.take(session.edit_request, session.revision_cycles + 1)
+
+    def _finish(self, session: _Session) -> int:
+        if session.speculator is not None:
+            session.speculator.discard()
+            stats = speculation_stats()
+            print(f"[SYSTEM] Speculative revisions: hit rate {stats['hit_rate'] * 100:.0f}% "
+                  f"({stats['hits']} hit(s), {stats['wasted']} wasted, "
+                  f"{stats['wasted_seconds']:.1f}s of model time unused)")
 
-                    print(f"[AnalystAgent] Done. Retrieved {len(analyst_output_2.data_points)} additional data point(s).")
+        self.logger.log(
+            topic=session.topic,
+            revision_cycles=session.revision_cycles,
+            final_decision=session.final_decision,
+            grounded=(len(session.working_points) > 0),
+        )
+        return session.revision_cycles
 
-                    before = len(working_points)
-                    working_points = merge_datapoints(working_points, analyst_output_2.data_points, limit=16)
-                    after = len(working_points)
+    def run(self, topic: str, max_revision_cycles: int = 10) -> int:
+        print("\n[AnalystAgent] Starting analysis + retrieval...")
+        session = self._start(topic, self.analyst.run(topic))
 
-                    print(f"[DEBUG] Evidence size: {before} -> {after}")
-                    print(f"[DEBUG] Current evidence sources: {sorted(get_used_sources(working_points))}")
+        while self._has_cycles_left(session, max_revision_cycles):
+            if not self._accept_decision(session, self._review(session)):
+                break
 
-                    if len(working_points) > 0:
-                        print("[SYSTEM] Grounding: Updated evidence set will be used in the next draft.")
-                    else:
-                        print("[SYSTEM] Grounding: Still no dataset evidence found; next draft may include TBD placeholders.")
+            # If edit request asks for missing/additional info -> rerun AnalystAgent
+            if is_missing_info_request(session.edit_request):
+                query, used_sources = self._missing_info_query(session)
+                analyst_output_2 = self.analyst.run(query, exclude_sources=used_sources)
+                session.working_points = self._merge_additional_evidence(session.working_points, analyst_output_2)
+                # Do NOT store missing-info requests as feedback: they are content requests
+            else:
+                self._style_edit(session)
+
+            print(f"\n✏️ Edit requested. Starting revision cycle #{session.revision_cycles}...")
+
+        return self._finish(session)
+
+    async def arun(self, topic: str, max_revision_cycles: int = 10) -> int:
+        """
+        Asyncio variant of run(), driving the same steps. Independent stages overlap:
+        - retrieval, loading learned preferences and warming the model run together
+        - after an edit request, new retrieval (or storing style feedback and
+          taking a speculated draft) runs together with refreshing preferences
+        Human input and token rendering happen in a worker thread, so the
+        event loop stays free for other workflows. That review step runs on a
+        dedicated pool of REVIEW_WORKERS threads: at most that many workflows
+        can show a draft / wait for a decision at once (the rest queue), and
+        the short to_thread() steps never wait behind a human.
+        """
+        print("\n[AnalystAgent] Starting analysis + retrieval (warming model, loading preferences)...")
+        analyst_output, preferences, _ = await asyncio.gather(
+            self.analyst.arun(topic),
+            self.drafter.apreferences(),
+            self.drafter.llm.awarm(),
+        )
+        session = self._start(topic, analyst_output)
+        loop = asyncio.get_running_loop()
 
-                    # Do NOT store missing-info requests as feedback: they are content requests
-                else:
-                    # Style edits are good feedback to reuse later
-                    store_feedback(topic, edit_request)
+        while self._has_cycles_left(session, max_revision_cycles):
+            approval_output = await loop.run_in_executor(_review_pool(), self._review, session, preferences)
+            if not self._accept_decision(session, approval_output):
+                break
 
-                print(f"\n✏️ Edit requested. Starting revision cycle #{revision_cycles}...")
-                continue
+            if is_missing_info_request(session.edit_request):
+                query, used_sources = self._missing_info_query(session)
+                analyst_output_2, preferences = await asyncio.gather(
+                    self.analyst.arun(query, exclude_sources=used_sources),
+                    self.drafter.apreferences(),
+                )
+                session.working_points = self._merge_additional_evidence(session.working_points, analyst_output_2)
+            else:
+                _, preferences = await asyncio.gather(
+                    asyncio.to_thread(self._style_edit, session),
+                    self.drafter.apreferences(),
+                )
 
-            final_decision = "unknown"
-            print("\n⚠️ Unknown decision, stopping.")
-            break
+            print(f"\n✏️ Edit requested. Starting revision cycle #{session.revision_cycles}...")
 
-        self.logger.log(
-            topic=topic,
-            revision_cycles=revision_cycles,
-            final_decision=final_decision,
-            grounded=(len(working_points) > 0),
-        )
-        return revision_cycles
+        return await asyncio.to_thread(self._finish, session)
 
 
 if __name__ == "__main__":
-    system = BusinessMemoSystem()
+    system = BusinessMemoSystem(
+        speculative="--speculate" in sys.argv,
+        conversational="--conversational" in sys.argv,
+        structured="--structured" in sys.argv,
+        incremental="--incremental" in sys.argv,
+        use_cache="--no-cache" not in sys.argv,
+    )
     topic = input("Enter the memo topic: ")
-    cycles = system.run(topic, max_revision_cycles=10)
+    if "--async" in sys.argv:
+        cycles = asyncio.run(system.arun(topic, max_revision_cycles=10))
+    else:
+        cycles = system.run(topic, max_revision_cycles=10)
     print(f"\nRun finished. Revision cycles: {cycles}")
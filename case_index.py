@@ -0,0 +1,432 @@
+# case_index.py
+
+import argparse
+import csv
+import os
+import pickle
+import re
+import sys
+import tempfile
+import time
+from array import array
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Columns that feed retrieval (same fields AnalystAgent always matched on)
+INDEXED_FIELDS = ["topic", "audience", "tone", "evidence_pack", "gold_data_points"]
+
+# Parallel ingestion: more chunks than workers so uneven chunks balance out
+CHUNKS_PER_WORKER = 4
+
+
+def tokenize_all(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", (text or "").lower())
+
+
+def tokenize(text: str) -> set:
+    return set(tokenize_all(text))
+
+
+def _iter_records(f) -> Iterator[Tuple[int, bytes]]:
+    """
+    Yields (byte_offset, raw_record) for every CSV record of a binary file.
+    A record ends on a line break that is not inside a quoted field,
+    so multi-line cells stay in one record.
+    """
+    offset = f.tell()
+    buf: List[bytes] = []
+    quotes = 0
+    for line in f:
+        buf.append(line)
+        quotes += line.count(b'"')
+        if quotes % 2 == 0:
+            record = b"".join(buf)
+            yield offset, record
+            offset += len(record)
+            buf = []
+            quotes = 0
+    if buf:
+        yield offset, b"".join(buf)
+
+
+def _parse_record(raw: bytes) -> List[str]:
+    return next(csv.reader([raw.decode("utf-8")]), [])
+
+
+def _array_for(max_value: int) -> array:
+    """Smallest unsigned array type that can hold max_value."""
+    return array("I") if max_value <= 0xFFFFFFFF else array("Q")
+
+
+def source_key(csv_path: str) -> dict:
+    st = os.stat(csv_path)
+    return {
+        "csv_path": os.path.abspath(csv_path),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+    }
+
+
+def _read_header(csv_path: str) -> Tuple[List[str], int]:
+    """Returns the CSV fieldnames and the byte offset where data rows start."""
+    with open(csv_path, "rb") as f:
+        for offset, raw in _iter_records(f):
+            values = _parse_record(raw)
+            if values:
+                return values, offset + len(raw)
+    return [], 0
+
+
+def _split_points(csv_path: str, start: int, end: int, n_chunks: int) -> List[int]:
+    """
+    Splits [start, end) into up to n_chunks byte ranges that begin on row
+    boundaries: a line break only ends a row when the number of quotes
+    seen since `start` is even (i.e. we are not inside a quoted cell).
+    """
+    step = max(1, (end - start) // max(1, n_chunks))
+    points = [start]
+    with open(csv_path, "rb") as f:
+        pos, quotes = start, 0
+        target = start + step
+        while target < end:
+            f.seek(pos)
+            quotes += f.read(target - pos).count(b'"')
+            pos = target
+            # walk forward to the first line break outside quotes
+            while pos < end:
+                f.seek(pos)
+                block = f.read(1 << 16)
+                if not block:
+                    pos = end
+                    break
+                nl = block.find(b"\n")
+                if nl < 0:
+                    quotes += block.count(b'"')
+                    pos += len(block)
+                    continue
+                quotes += block.count(b'"', 0, nl)
+                pos += nl + 1
+                if quotes % 2 == 0:
+                    break
+            if pos >= end:
+                break
+            points.append(pos)
+            target = max(pos + 1, target + step)
+    points.append(end)
+    return points
+
+
+def _index_chunk(task: Tuple[str, List[str], int, int]) -> dict:
+    """
+    Indexes the rows in one byte range of the CSV. Row ids are local to the
+    chunk (0..n-1); CaseIndex._from_parts shifts them when merging.
+    Top-level function so it can run in a worker process.
+    """
+    csv_path, fieldnames, start, end = task
+    case_ids: List[str] = []
+    row_offsets = array("Q")
+    doc_lens = array("I")
+    postings = defaultdict(lambda: array("I"))
+    tfs = defaultdict(lambda: array("B"))
+
+    with open(csv_path, "rb") as f:
+        f.seek(start)
+        for offset, raw in _iter_records(f):
+            if offset >= end:
+                break
+            values = _parse_record(raw)
+            if not values:
+                continue  # blank line (csv.DictReader skips these too)
+
+            r = dict(zip(fieldnames, values))
+            row_id = len(case_ids)
+            case_ids.append((r.get("case_id") or "UNKNOWN_CASE").strip())
+            row_offsets.append(offset)
+
+            corpus = " ".join(r.get(name, "") or "" for name in INDEXED_FIELDS)
+            tokens = tokenize_all(corpus)
+            doc_lens.append(len(tokens))
+            for token, tf in Counter(tokens).items():
+                postings[token].append(row_id)
+                tfs[token].append(min(tf, 0xFF))
+
+    return {
+        "case_ids": case_ids,
+        "row_offsets": row_offsets,
+        "doc_lens": doc_lens,
+        "postings": dict(postings),
+        "tfs": dict(tfs),
+    }
+
+
+class CaseRecord:
+    """The two fields drafting needs from a case (no per-row dict)."""
+
+    __slots__ = ("case_id", "gold_data_points")
+
+    def __init__(self, case_id: str, gold_data_points: str):
+        self.case_id = case_id
+        self.gold_data_points = gold_data_points
+
+    def __repr__(self) -> str:
+        return f"CaseRecord(case_id={self.case_id!r}, gold_data_points={self.gold_data_points!r})"
+
+
+class CaseStore:
+    """
+    Columnar, compact storage of the case corpus:
+      - all case_ids concatenated in ONE text buffer, sliced through an
+        offsets array (no Python string object per row until it is needed)
+      - the byte offset of every row in the CSV, so gold_data_points are
+        read from disk only for the rows that are returned
+
+    Case ids are interned when materialized, so every DataPoint.source that
+    refers to the same case shares one string.
+    """
+
+    def __init__(self, csv_path: str, fieldnames: List[str], ids_buffer: str,
+                 id_offsets: array, row_offsets: array):
+        self.csv_path = csv_path
+        self.fieldnames = fieldnames
+        self.ids_buffer = ids_buffer
+        self.id_offsets = id_offsets
+        self.row_offsets = row_offsets
+
+    def __len__(self) -> int:
+        return len(self.row_offsets)
+
+    def case_id(self, row_id: int) -> str:
+        return sys.intern(self.ids_buffer[self.id_offsets[row_id]:self.id_offsets[row_id + 1]])
+
+    def iter_case_ids(self) -> Iterator[str]:
+        for row_id in range(len(self)):
+            yield self.case_id(row_id)
+
+    def records(self, row_ids: List[int]) -> Dict[int, CaseRecord]:
+        """Reads CaseRecords for the given row ids only (one seek per row)."""
+        out: Dict[int, CaseRecord] = {}
+        with open(self.csv_path, "rb") as f:
+            for row_id in row_ids:
+                f.seek(self.row_offsets[row_id])
+                record = next(_iter_records(f), (0, b""))[1]
+                r = dict(zip(self.fieldnames, _parse_record(record)))
+                out[row_id] = CaseRecord(self.case_id(row_id), r.get("gold_data_points", "") or "")
+        return out
+
+
+class CaseIndex:
+    """
+    Retrieval index over a case CSV:
+      - postings: token -> row ids (array of unsigned ints)
+      - tfs: token -> term frequency per posting (parallel to postings, capped at 255)
+      - doc_lens: number of tokens per row
+      - store: compact CaseStore with case_ids and row locations, or a
+        memory-mapped corpus_bin.MappedCorpus (same read interface)
+
+    The index is saved next to the CSV (<csv>.idx) and reused as long as the
+    CSV path, size and mtime still match. With a MappedCorpus the .idx only
+    holds the postings; rows are decoded from the mapped file on demand.
+    """
+
+    VERSION = 3
+
+    def __init__(self, key: dict, store: CaseStore, postings: Dict[str, array],
+                 tfs: Dict[str, array], doc_lens: array):
+        self.key = key
+        self.store = store
+        self.postings = postings
+        self.tfs = tfs
+        self.doc_lens = doc_lens
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    @property
+    def csv_path(self) -> str:
+        return self.key["csv_path"]
+
+    @classmethod
+    def build(cls, csv_path: str, workers: int = 1) -> "CaseIndex":
+        """
+        Tokenizes and indexes the CSV. With workers > 1 the file is split on
+        row boundaries and the chunks are indexed in a process pool.
+        """
+        if workers > 1:
+            return cls.build_parallel(csv_path, workers)
+
+        key = source_key(csv_path)
+        fieldnames, data_start = _read_header(csv_path)
+        part = _index_chunk((csv_path, fieldnames, data_start, key["size"]))
+        return cls._from_parts(key, fieldnames, [part])
+
+    @classmethod
+    def build_parallel(cls, csv_path: str, workers: int) -> "CaseIndex":
+        key = source_key(csv_path)
+        fieldnames, data_start = _read_header(csv_path)
+        bounds = _split_points(csv_path, data_start, key["size"], workers * CHUNKS_PER_WORKER)
+        tasks = [(csv_path, fieldnames, a, b) for a, b in zip(bounds, bounds[1:])]
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_index_chunk, tasks))
+        return cls._from_parts(key, fieldnames, parts)
+
+    @classmethod
+    def _from_parts(cls, key: dict, fieldnames: List[str], parts: List[dict]) -> "CaseIndex":
+        """Concatenates per-chunk results (in file order) into one index."""
+        ids_buffer = "".join(case_id for part in parts for case_id in part["case_ids"])
+        id_offsets = _array_for(len(ids_buffer))
+        id_offsets.append(0)
+        row_offsets = _array_for(key["size"])
+        doc_lens = array("I")
+
+        postings: Dict[str, array] = {}
+        tfs: Dict[str, array] = {}
+        base = 0
+        for part in parts:
+            for case_id in part["case_ids"]:
+                id_offsets.append(id_offsets[-1] + len(case_id))
+            row_offsets.extend(part["row_offsets"].tolist())
+            doc_lens.extend(part["doc_lens"])
+
+            for token, local_ids in part["postings"].items():
+                if token not in postings:
+                    postings[token] = array("I")
+                    tfs[token] = array("B")
+                if base:
+                    postings[token].extend(map(base.__add__, local_ids))
+                else:
+                    postings[token].extend(local_ids)
+                tfs[token].extend(part["tfs"][token])
+            base += len(part["case_ids"])
+
+        store = CaseStore(key["csv_path"], fieldnames, ids_buffer, id_offsets, row_offsets)
+        return cls(key, store, postings, tfs, doc_lens)
+
+    @staticmethod
+    def default_path(csv_path: str, bin_path: Optional[str] = None) -> str:
+        # separate files, so switching between inline and mmap rows does not force rebuilds
+        return (bin_path or csv_path) + ".idx"
+
+    def save(self, index_path: str) -> None:
+        data = {
+            "version": self.VERSION,
+            "key": self.key,
+            "postings": self.postings,
+            "tfs": self.tfs,
+            "doc_lens": self.doc_lens,
+        }
+        if isinstance(self.store, CaseStore):
+            data.update({
+                "store": "inline",
+                "fieldnames": self.store.fieldnames,
+                "ids_buffer": self.store.ids_buffer,
+                "id_offsets": self.store.id_offsets,
+                "row_offsets": self.store.row_offsets,
+            })
+        else:
+            data["store"] = "mmap"
+
+        # unique tmp file next to the index: concurrent savers (other processes) never share one
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(index_path) + ".",
+                                        suffix=".tmp", dir=os.path.dirname(index_path) or ".")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, index_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, index_path: str, csv_path: str, bin_path: Optional[str] = None) -> Optional["CaseIndex"]:
+        """
+        Returns the saved index, or None if it is missing, unreadable or stale.
+        With bin_path the rows come from that memory-mapped corpus file.
+        """
+        try:
+            with open(index_path, "rb") as f:
+                data = pickle.load(f)
+        except Exception:  # missing, truncated or from another code version: unpickling can raise anything
+            return None
+
+        if not isinstance(data, dict) or data.get("version") != cls.VERSION:
+            return None
+        if data.get("key") != source_key(csv_path):
+            return None
+
+        try:
+            postings, tfs, doc_lens = data["postings"], data["tfs"], data["doc_lens"]
+            if bin_path is None:
+                if data.get("store") != "inline":
+                    return None
+                store = CaseStore(data["key"]["csv_path"], data["fieldnames"], data["ids_buffer"],
+                                  data["id_offsets"], data["row_offsets"])
+        except KeyError:
+            return None  # a field is missing (e.g. an interrupted or hand-edited save): rebuild
+
+        if bin_path is not None:
+            if data.get("store") != "mmap":
+                return None
+            from corpus_bin import MappedCorpus
+
+            store = MappedCorpus.open(bin_path, csv_path)
+            if store is None:
+                return None
+
+        return cls(data["key"], store, postings, tfs, doc_lens)
+
+    @classmethod
+    def load_or_build(cls, csv_path: str, index_path: Optional[str] = None,
+                      bin_path: Optional[str] = None, workers: int = 1) -> "CaseIndex":
+        index_path = index_path or cls.default_path(csv_path, bin_path)
+
+        index = cls.load(index_path, csv_path, bin_path)
+        if index is not None:
+            return index
+
+        index = cls.build(csv_path, workers)
+        if bin_path is not None:
+            from corpus_bin import MappedCorpus, write_corpus_bin
+
+            store = MappedCorpus.open(bin_path, csv_path)
+            if store is None:
+                try:
+                    write_corpus_bin(csv_path, bin_path)
+                except ValueError:
+                    pass  # a case_id the format cannot hold: rows keep coming from the CSV
+                else:
+                    store = MappedCorpus.open(bin_path, csv_path)
+            if store is not None and len(store) == len(index):
+                index.store = store
+
+        try:
+            index.save(index_path)
+        except OSError:
+            pass  # read-only location: keep the in-memory index only
+        return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the retrieval index (<csv>.idx) for a case CSV.")
+    parser.add_argument("csv_path", nargs="?", default="business_memo_cases_20k.csv")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processes used to tokenize and index chunks (default: all CPUs)")
+    parser.add_argument("--index-path", default=None, help="output file (default: <csv>.idx)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = CaseIndex.build(args.csv_path, workers=args.workers)
+    elapsed = time.perf_counter() - started
+
+    index_path = args.index_path or CaseIndex.default_path(args.csv_path)
+    index.save(index_path)
+
+    rows_per_sec = len(index) / elapsed if elapsed > 0 else float("inf")
+    print(f"Indexed {len(index)} rows with {args.workers} worker(s) in {elapsed:.2f}s "
+          f"({rows_per_sec:,.0f} rows/sec) -> {index_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import csv
+import threading
+
+import pytest
+
+import database
+
+CASE_FIELDS = ["case_id", "topic", "audience", "tone", "evidence_pack", "gold_data_points", "reference_memo"]
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """A fresh, fully migrated memo_system.db in tmp_path; yields this thread's connection."""
+    monkeypatch.setattr(database, "DB_PATH", tmp_path / "memo_system.db")
+    database.init_db()
+    yield database.get_connection()
+    database.close_connection()
+
+
+@pytest.fixture
+def write_cases():
+    """
+    write_cases(path, n=300, rows=None) writes a case CSV: the given rows, or n
+    generated ones. Quoted cells with line breaks and escaped quotes are what
+    make row boundaries hard to find; every row matches "sales revenue".
+    """
+    def write(path, n=300, rows=None):
+        if rows is None:
+            rows = []
+            for i in range(n):
+                evidence = f'sales "q{i % 4}" budget\nmargin line\r\n{i}' if i % 3 else "sales budget"
+                rows.append([f"CASE_{i:06d}", f"revenue review {i}", "Sales team", "neutral",
+                             evidence, f"- units was {i}%\n- margin was {i % 7}%", "Dear \"team\",\n\nok"])
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(CASE_FIELDS)
+            writer.writerows(rows)
+        return path
+
+    return write
+
+
+@pytest.fixture
+def cases_csv(tmp_path, write_cases):
+    """tmp_path/cases.csv with write_cases' generated rows."""
+    return write_cases(str(tmp_path / "cases.csv"))
+
+
+@pytest.fixture
+def run_threads():
+    """run_threads(fn, n=8) calls fn on n threads at once; returns (results, errors)."""
+    def run(fn, n=8):
+        results, errors = [], []
+
+        def target():
+            try:
+                results.append(fn())
+            except Exception as e:  # collected for the test to assert on
+                errors.append(e)
+
+        threads = [threading.Thread(target=target) for _ in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results, errors
+
+    return run
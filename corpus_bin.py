@@ -0,0 +1,159 @@
+# corpus_bin.py
+
+import csv
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Dict, Iterator, List, Optional
+
+from case_index import CaseRecord, source_key
+
+# File layout (little endian):
+#   header   : magic, format version, row count, length of the source key
+#   key      : JSON of the CSV path/size/mtime the file was built from
+#   padding  : up to the next multiple of 8 bytes
+#   offsets  : (rows + 1) x uint64, start of each row inside the payload
+#   payload  : per row -> uint16 len(case_id) + case_id + gold_data_points (UTF-8)
+MAGIC = b"MEMOCASE"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8sHHQI")
+_ID_LEN = struct.Struct("<H")
+
+
+def default_bin_path(csv_path: str) -> str:
+    return csv_path + ".bin"
+
+
+def write_corpus_bin(csv_path: str, bin_path: Optional[str] = None) -> str:
+    """
+    Converts the case CSV into the binary corpus format and returns its path.
+    Rows are streamed: payloads go to a temp file while only the offset
+    table is kept in memory. Raises ValueError for a case_id longer than
+    the format's 65535 bytes (cutting it would no longer match the index).
+    """
+    bin_path = bin_path or default_bin_path(csv_path)
+    key = json.dumps(source_key(csv_path)).encode("utf-8")
+    offsets = array("Q", [0])
+
+    with tempfile.TemporaryFile() as payload:
+        with open(csv_path, "r", encoding="utf-8", newline="") as f:
+            for row_id, r in enumerate(csv.DictReader(f)):
+                case_id = (r.get("case_id") or "UNKNOWN_CASE").strip().encode("utf-8")
+                if len(case_id) > 0xFFFF:
+                    raise ValueError(f"{csv_path}: case_id of row {row_id} is longer than 65535 bytes")
+                gold = (r.get("gold_data_points", "") or "").encode("utf-8")
+                payload.write(_ID_LEN.pack(len(case_id)))
+                payload.write(case_id)
+                payload.write(gold)
+                offsets.append(offsets[-1] + _ID_LEN.size + len(case_id) + len(gold))
+
+        # unique tmp file next to the corpus: concurrent writers (other processes) never share one
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(bin_path) + ".",
+                                        suffix=".tmp", dir=os.path.dirname(bin_path) or ".")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                out.write(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(offsets) - 1, len(key)))
+                out.write(key)
+                out.write(b"\0" * (-(_HEADER.size + len(key)) % 8))
+                offsets.tofile(out)
+                payload.seek(0)
+                shutil.copyfileobj(payload, out)
+            os.replace(tmp_path, bin_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return bin_path
+
+
+class MappedCorpus:
+    """
+    Read-only, memory-mapped view of a corpus written by write_corpus_bin.
+
+    Nothing is parsed up front: the offset table is used in place and a row
+    is only decoded when asked for (typically the top-k results). Worker
+    processes mapping the same file share it through the OS page cache.
+    Offers the same read interface as case_index.CaseStore.
+    """
+
+    def __init__(self, bin_path: str):
+        self.bin_path = bin_path
+        self._file = open(bin_path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self._file.close()
+            raise
+
+        magic, version, _, n_rows, key_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{bin_path} is not a corpus file (format {FORMAT_VERSION})")
+
+        self.key = json.loads(self._mm[_HEADER.size:_HEADER.size + key_len].decode("utf-8"))
+        table_start = _HEADER.size + key_len
+        table_start += -table_start % 8
+        table_end = table_start + (n_rows + 1) * 8
+
+        self._n_rows = n_rows
+        self._offsets = memoryview(self._mm)[table_start:table_end].cast("Q")
+        self._payload_start = table_end
+
+    @classmethod
+    def open(cls, bin_path: str, csv_path: str) -> Optional["MappedCorpus"]:
+        """Maps bin_path, or returns None if it is missing, invalid or built from another CSV version."""
+        try:
+            corpus = cls(bin_path)
+        except (OSError, ValueError, struct.error):
+            return None
+        if corpus.key != source_key(csv_path):
+            corpus.close()
+            return None
+        return corpus
+
+    def close(self) -> None:
+        if getattr(self, "_offsets", None) is not None:
+            self._offsets.release()
+            self._offsets = None
+        self._mm.close()
+        self._file.close()
+
+    def __len__(self) -> int:
+        return self._n_rows
+
+    def _row_span(self, row_id: int):
+        start = self._payload_start + self._offsets[row_id]
+        end = self._payload_start + self._offsets[row_id + 1]
+        (id_len,) = _ID_LEN.unpack_from(self._mm, start)
+        return start + _ID_LEN.size, start + _ID_LEN.size + id_len, end
+
+    def case_id(self, row_id: int) -> str:
+        id_start, id_end, _ = self._row_span(row_id)
+        return sys.intern(self._mm[id_start:id_end].decode("utf-8"))
+
+    def iter_case_ids(self) -> Iterator[str]:
+        for row_id in range(len(self)):
+            yield self.case_id(row_id)
+
+    def records(self, row_ids: List[int]) -> Dict[int, CaseRecord]:
+        out: Dict[int, CaseRecord] = {}
+        for row_id in row_ids:
+            id_start, id_end, end = self._row_span(row_id)
+            out[row_id] = CaseRecord(
+                sys.intern(self._mm[id_start:id_end].decode("utf-8")),
+                self._mm[id_end:end].decode("utf-8"),
+            )
+        return out
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python corpus_bin.py <cases.csv> [output.bin]")
+        sys.exit(1)
+    path = write_corpus_bin(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    print(f"Wrote {path}")
@@ -1,30 +1,62 @@
 # database.py
 
 import sqlite3
+import threading
 from pathlib import Path
 
 DB_PATH = Path("memo_system.db")
 
+# Connection tuning: WAL lets readers run while one writer commits, NORMAL
+# sync is safe with WAL (only the last commits can be lost on power failure),
+# and busy_timeout waits for a lock instead of failing with "database is locked".
+BUSY_TIMEOUT_MS = 5000
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized_paths: set = set()
+
 
 def get_connection():
     """
-    Opens (or creates) the SQLite DB file memo_system.db.
-    Always remember to conn.close() after use.
+    Returns this thread's connection to memo_system.db (opened on first use).
+
+    The connection is reused for every later call on the same thread, so
+    callers must NOT close it; use `with conn:` (or conn.commit()) to end
+    a write transaction.
     """
-    conn = sqlite3.connect(DB_PATH)
-    # So we get dict-like rows if we want
-    conn.row_factory = sqlite3.Row
+    path = str(DB_PATH)
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+
+    conn = conns.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000)
+        # So we get dict-like rows if we want
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        conns[path] = conn
     return conn
 
 
-def init_db():
-    """
-    Create tables if they do not exist yet.
-    Run this once at startup (e.g. in business_memo_system.py).
-    """
-    conn = get_connection()
-    cur = conn.cursor()
+def close_connection():
+    """Closes the calling thread's connection (e.g. before a worker thread exits)."""
+    conn = getattr(_local, "conns", {}).pop(str(DB_PATH), None)
+    if conn is not None:
+        conn.close()
 
+
+# -----------------------------
+# Schema migrations
+# -----------------------------
+# Each entry upgrades the schema by one version. Applied versions are recorded
+# in schema_version, so every migration runs once per database file.
+# (Version 1 uses IF NOT EXISTS because it also adopts databases created
+# before schema_version existed.)
+
+def _migrate_base_tables(cur):
     # Table for evaluation logs (like evaluation_log.csv)
     cur.execute(
         """
@@ -52,5 +84,127 @@ def init_db():
         """
     )
 
-    conn.commit()
-    conn.close()
+
+def _migrate_preference_counts(cur):
+    # Aggregated preference counters (too_long, too_short, ...) maintained on insert
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS preference_counts (
+            name TEXT PRIMARY KEY,
+            count INTEGER NOT NULL
+        )
+        """
+    )
+    from preference_store import backfill_preference_counts  # avoids a circular import
+    backfill_preference_counts(cur)
+
+
+def _migrate_llm_cache(cur):
+    # Cache of LLM responses (see llm_cache.py)
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        )
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used)")
+
+
+def _migrate_log_indexes(cur):
+    # Range filters and GROUP BY topic in analytics.py
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_evaluation_log_timestamp ON evaluation_log (timestamp)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_evaluation_log_topic ON evaluation_log (topic)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_feedback_log_timestamp ON feedback_log (timestamp)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_feedback_log_topic ON feedback_log (topic)")
+
+
+def _migrate_daily_rollups(cur):
+    # Per-day, per-topic summaries of raw log rows older than the retention
+    # horizon (filled by maintenance.py; analytics.py reads raw + rollup)
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS evaluation_daily (
+            day TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            final_decision TEXT NOT NULL,
+            revision_cycles INTEGER NOT NULL,
+            runs INTEGER NOT NULL,
+            PRIMARY KEY (day, topic, final_decision, revision_cycles)
+        )
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS feedback_daily (
+            day TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            feedback INTEGER NOT NULL,
+            rated INTEGER NOT NULL,
+            rating_sum INTEGER NOT NULL,
+            PRIMARY KEY (day, topic)
+        )
+        """
+    )
+
+
+MIGRATIONS = [
+    (1, _migrate_base_tables),
+    (2, _migrate_preference_counts),
+    (3, _migrate_llm_cache),
+    (4, _migrate_log_indexes),
+    (5, _migrate_daily_rollups),
+]
+
+
+def schema_version(conn) -> int:
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def init_db():
+    """
+    Brings the schema up to date (pending migrations only).
+    Cheap to call repeatedly: after the first call in a process it returns
+    immediately, so Streamlit reruns and imports don't re-run any DDL.
+    """
+    path = str(DB_PATH)
+    if path in _initialized_paths:
+        return
+
+    with _init_lock:
+        if path in _initialized_paths:
+            return
+
+        conn = get_connection()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        conn.commit()
+
+        if schema_version(conn) < MIGRATIONS[-1][0]:
+            # IMMEDIATE takes the write lock up front, so two processes starting
+            # together don't both apply the same migration
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cur = conn.cursor()
+                current = schema_version(conn)
+                for version, migrate in MIGRATIONS:
+                    if version > current:
+                        migrate(cur)
+                        cur.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+        _initialized_paths.add(path)
@@ -1,10 +1,81 @@
-from typing import List, Optional
+from typing import Any, Dict, Iterator, List, Optional
+import asyncio
+import itertools
 import re
 from datetime import datetime
 
+from llm_cache import LLMCache
 from llm_client import LocalLLM
-from models import DraftInput, DraftOutput, DataPoint
-from preference_store import PreferenceStore  # ✅ NEW
+from models import DraftInput, DraftOutput, DataPoint, MemoSections
+from preference_store import PreferenceStore, classify_feedback  # ✅ NEW
+
+# Fixed parts of the memo, rendered in code in structured mode
+MEMO_HEADER = """Subject: {subject}
+
+To: Sales & Marketing Teams
+From: [Your Name], Sales Operations
+Date: {today}
+
+Dear Colleagues,"""
+MEMO_CLOSING = """Please reach out if further clarification is required.
+
+Kind regards,
+[Your Name]"""
+
+# Section markers of the structured output ("PARAGRAPH 1: ...", "ACTION ITEMS:")
+_SECTION_RE = re.compile(r"(?i)^[#*\s]*(SUBJECT|PARAGRAPH\s*\d*|(?:KEY\s+)?ACTION\s+ITEMS)[*\s]*:[*\s]*(.*)$")
+_BULLET_RE = re.compile(r"^(?:[-*•]|\d+[.)])\s*(.*)$")
+# Template lines the model sometimes writes anyway
+_BOILERPLATE_RE = re.compile(
+    r"(?i)^(To:|From:|Date:|Dear\b|Please reach out|Kind regards|Best regards|\[Your Name\])"
+)
+MAX_PARAGRAPHS = 3
+MAX_ACTION_ITEMS = 5
+
+# Generation limits, so no tokens are generated only to be thrown away:
+# num_predict per length class (free-form memo incl. headers and closing; the
+# structured sections need about TEMPLATE_TOKENS less), the end of a free-form
+# memo (the stream is closed right after it) and stop sequences for the
+# structured sections (the closing is rendered in code).
+NUM_PREDICT = {"exact": 256, "short": 320, "default": 448, "long": 768}
+TEMPLATE_TOKENS = 64
+MEMO_END_PATTERN = r"(?:Kind|Best) regards,?[ \t]*\n\s*\[Your Name\]"
+STRUCTURED_STOP = ["\nKind regards", "\nBest regards", "\nPlease reach out"]
+
+# Incremental revisions: edit requests that name memo sections. Keys are
+# "subject", paragraph indexes (-1 = last) and "action_items"; a request that
+# names none of them, or talks about the memo as a whole, regenerates it all.
+SECTION_PATTERNS = [
+    ("subject", re.compile(r"(?i)\b(subject|title|headline)\b")),
+    (0, re.compile(r"(?i)\b((first|1st|opening|intro(ductory)?)\s+(paragraph|section)|paragraph\s*(1|one)|intro(duction)?)\b")),
+    (1, re.compile(r"(?i)\b((second|2nd)\s+(paragraph|section)|paragraph\s*(2|two)|implications?)\b")),
+    (-1, re.compile(r"(?i)\b(last|final|closing)\s+paragraph\b")),
+    ("action_items", re.compile(r"(?i)\b(action\s+(items?|points?)|bullets?|bullet\s+points?|next\s+steps|to-?dos?)\b")),
+]
+_WHOLE_MEMO_RE = re.compile(r"(?i)\b(whole|entire|overall|everything|throughout|all\s+sections)\b")
+# clauses of a compound request ("make it shorter and change the subject line")
+_CLAUSE_SPLIT_RE = re.compile(r"(?i)\s*(?:[,;.!?]|\band\b|\bthen\b|\balso\b|\bplus\b)\s*")
+_MEMO_REF_RE = re.compile(r"(?i)\b(it|memo|email|e-mail|draft|message|text)\b")
+SECTION_TOKENS = {"subject": 32, "paragraph": 192, "action_items": 128}
+
+
+class DraftConversation:
+    """
+    Chat history of one memo, for conversational revisions: the first draft
+    sends the full prompt, later versions only send the edit request (plus
+    any new data points). Create one per memo and pass it to stream()/run().
+    """
+
+    def __init__(self, max_messages: int = 12):
+        self.max_messages = max_messages  # past this, start over with a full prompt
+        self.messages: List[Dict[str, str]] = []
+        self.sent_points: set = set()  # data point texts the model has already seen
+        self.structured: Optional[bool] = None  # prompt style of the first turn
+
+    def reset(self) -> None:
+        self.messages = []
+        self.sent_points = set()
+        self.structured = None
 
 
 class DraftingAgent:
@@ -18,12 +89,36 @@ class DraftingAgent:
     - Uses ONLY provided data points (no invented facts).
 
     NEW:
-    - Auto-adjusts base prompt using learned preferences from SQLite feedback_log.
+    - Auto-adjusts base prompt using learned preferences from SQLite feedback_log
+      (a process-wide cached snapshot, refreshed when new feedback is logged).
+    - stream(draft_input) yields the cleaned memo text while it is generated.
+    - Identical prompts (same topic/evidence/edit request) are answered from
+      an in-process LLM response cache; use_cache=False always generates
+      fresh text. persist_cache=True also keeps responses in memo_system.db
+      for a day, so later runs (e.g. a re-run batch) reuse them.
+    - run()/stream() accept preferences loaded up front (apreferences), and
+      arun() is the asyncio variant, so callers can overlap those steps.
+    - Conversational revisions: pass a DraftConversation and revisions are
+      sent as a short follow-up turn over Ollama chat instead of rebuilding
+      the full prompt, so the model only prefills the new tokens.
+    - Generations are capped (num_predict from the length class) and end at
+      the memo closing: the stream is closed as soon as it arrives, so
+      trailing notes or second drafts are never generated.
+    - Incremental revisions: with DraftInput.previous_draft set, an edit
+      that names sections ("change the subject line", "reword the action
+      items") regenerates only those and splices them into the current memo.
+    - structured=True: the model writes only the subject, paragraphs and
+      action items as delimited sections; headers, greeting and closing are
+      rendered from MEMO_HEADER / MEMO_CLOSING. Output that does not parse
+      falls back to the free-form prompt.
     """
 
-    def __init__(self, model_name: str = "phi3"):
-        self.llm = LocalLLM(model_name=model_name)
+    def __init__(self, model_name: str = "phi3", use_cache: bool = True, structured: bool = False,
+                 persist_cache: bool = False):
+        cache = LLMCache(max_entries=128, ttl_seconds=24 * 3600, persist=persist_cache) if use_cache else None
+        self.llm = LocalLLM(model_name=model_name, cache=cache)
         self.pref_store = PreferenceStore()  # ✅ NEW
+        self.structured = structured
 
     def _format_data_points(self, data_points: List[DataPoint]) -> str:
         lines = []
@@ -31,39 +126,71 @@ class DraftingAgent:
             lines.append(f"- {dp.text}")
         return "\n".join(lines) if lines else "- [no data points provided]"
 
-    def _length_instruction(self, edit_request: Optional[str]) -> str:
+    def _length_class(self, edit_request: Optional[str]) -> str:
+        """exact / short / default / long (keys of NUM_PREDICT)."""
         if not edit_request:
-            return "Length: 2 short paragraphs + action items. Keep under ~180 words."
+            return "default"
 
         req = edit_request.lower()
 
         if "3 lines" in req or "three lines" in req:
-            return "Length: EXACTLY 3 sentences total in the body (excluding headers and closing)."
+            return "exact"
         if "shorter" in req or "concise" in req or "summary" in req:
+            return "short"
+        if "longer" in req or "more detail" in req or "too short" in req:
+            return "long"
+        return "default"
+
+    def _length_instruction(self, edit_request: Optional[str]) -> str:
+        length = self._length_class(edit_request)
+
+        if length == "exact":
+            return "Length: EXACTLY 3 sentences total in the body (excluding headers and closing)."
+        if length == "short":
             return "Length: 3–5 sentences total in the body (excluding headers and closing)."
 
         return "Length: 2 short paragraphs + action items. Keep under ~180 words."
 
-    # ✅ NEW
-    def _preference_instructions(self, edit_request: Optional[str]) -> str:
-        prefs = self.pref_store.get_global_preferences()
-        instructions = []
+    def _generation_limits(self, edit_request: Optional[str], preferences: Optional[Dict[str, Any]],
+                           structured: bool) -> Dict[str, Any]:
+        """Keyword arguments for the LocalLLM call: token budget, stop sequences / end of memo."""
+        length = self._length_class(edit_request)
+        if length == "default" and not self._user_forced_length(edit_request):
+            # same learned length preference as _preference_instructions puts in the prompt
+            prefs = preferences if preferences is not None else self.pref_store.get_global_preferences()
+            if prefs.get("prefer_short"):
+                length = "short"
+            elif prefs.get("prefer_long"):
+                length = "long"
 
-        if prefs.get("prefer_more_professional"):
-            instructions.append(
-                "- Tone preference (learned): Use a more professional/formal tone. Avoid casual phrasing."
-            )
+        if structured:
+            return {"options": {"num_predict": NUM_PREDICT[length] - TEMPLATE_TOKENS, "stop": STRUCTURED_STOP}}
+        return {"options": {"num_predict": NUM_PREDICT[length]}, "end": MEMO_END_PATTERN}
 
-        # Apply learned length preference only if user didn’t explicitly force length in edit_request
+    @staticmethod
+    def _user_forced_length(edit_request: Optional[str]) -> bool:
         req = (edit_request or "").lower()
-        user_forced_length = any(
+        return any(
             x in req for x in [
                 "3 lines", "three lines", "shorter", "concise", "summary",
                 "longer", "more detail", "too short", "too long"
             ]
         )
 
-        if not user_forced_length:
+    # ✅ NEW
+    def _preference_instructions(self, edit_request: Optional[str],
+                                 prefs: Optional[Dict[str, Any]] = None) -> str:
+        if prefs is None:
+            prefs = self.pref_store.get_global_preferences()
+        instructions = []
+
+        if prefs.get("prefer_more_professional"):
+            instructions.append(
+                "- Tone preference (learned): Use a more professional/formal tone. Avoid casual phrasing."
+            )
+
+        # Apply learned length preference only if user didn’t explicitly force length in edit_request
+        if not self._user_forced_length(edit_request):
             if prefs.get("prefer_short"):
                 instructions.append("- Length preference (learned): Keep it shorter than usual.")
             elif prefs.get("prefer_long"):
@@ -87,23 +214,45 @@ class DraftingAgent:
 
         return text
 
-    def run(self, draft_input: DraftInput) -> DraftOutput:
+    def _stable_prefix(self, raw: str) -> str:
+        """
+        Part of a partial generation that _postprocess can clean for good:
+        only complete lines, and nothing from an unfinished "Key evidence"
+        block (it is removed only once the following section has arrived).
+        """
+        cut = raw.rfind("\n")
+        if cut < 0:
+            return ""
+        prefix = raw[:cut]
+
+        evidence = list(re.finditer(r"(?i)\n\s*Key evidence\s*:", prefix))
+        if evidence:
+            start = evidence[-1].start()
+            closed = re.search(
+                r"(?i)\n\s*(Key Action Items|Action items|Kind regards|Best regards)",
+                prefix[evidence[-1].end():],
+            )
+            if not closed:
+                prefix = prefix[:start]
+        return prefix
+
+    def subject_for(self, draft_input: DraftInput) -> str:
+        return f"Business memo regarding {draft_input.topic} (v{draft_input.version})"
+
+    def _brief(self, draft_input: DraftInput, preferences: Optional[Dict[str, Any]] = None,
+               include_length: bool = True) -> str:
+        """Rules, topic, data points, edit request and length: shared by both prompt styles."""
         topic = draft_input.topic
         data_points = draft_input.data_points
         edit_request = draft_input.edit_request
-        version = draft_input.version
 
         data_points_text = self._format_data_points(data_points)
         length_instruction = self._length_instruction(edit_request)
 
         # ✅ NEW: read learned preferences and inject into prompt
-        learned_prefs = self._preference_instructions(edit_request)
-
-        today = datetime.now().strftime("%d %B %Y")
-
-        prompt = f"""
-You are an assistant that writes REAL corporate email memos in English.
+        learned_prefs = self._preference_instructions(edit_request, preferences)
 
+        brief = f"""
 HARD RULES:
 - Use ONLY the DATA POINTS below as factual content. Do NOT invent facts.
 - Do NOT include sources, CASE IDs, or the word "source" anywhere in the memo.
@@ -121,9 +270,19 @@ User edit request (highest priority if present):
 
 Learned preferences from past feedback (apply unless they conflict with the user's edit request):
 {learned_prefs}
+""".strip()
+        if include_length:
+            brief += f"\n\nLength constraint:\n- {length_instruction}"
+        return brief
 
-Length constraint:
-- {length_instruction}
+    def _build_prompt(self, draft_input: DraftInput, preferences: Optional[Dict[str, Any]] = None) -> str:
+        topic = draft_input.topic
+        today = datetime.now().strftime("%d %B %Y")
+
+        prompt = f"""
+You are an assistant that writes REAL corporate email memos in English.
+
+{self._brief(draft_input, preferences)}
 
 WRITE EXACTLY THIS FORMAT:
 
@@ -150,13 +309,478 @@ Kind regards,
 Return ONLY the memo text in this exact format.
 """.strip()
 
-        email_text = self.llm.run(prompt)
-        email_text = self._postprocess(email_text)
+        return prompt
+
+    def _build_structured_prompt(self, draft_input: DraftInput,
+                                 preferences: Optional[Dict[str, Any]] = None) -> str:
+        topic = draft_input.topic
+
+        prompt = f"""
+You are an assistant that writes the content of REAL corporate email memos in English.
+
+{self._brief(draft_input, preferences)}
+
+The headers, greeting and closing are added automatically. Write ONLY these sections, in this order:
 
-        subject = f"Business memo regarding {topic} (v{version})"
+SUBJECT: <short subject line about {topic}>
+PARAGRAPH 1: <what this memo is + factual summary using the data points>
+PARAGRAPH 2: <brief implications based only on the data points. If anything is unclear, write: "Some figures require validation (TBD).">
+ACTION ITEMS:
+- <3 short bullets (no numbers, no dates, no meetings)>
+
+Write each paragraph on one line. Leave out PARAGRAPH 2 if the length constraint needs fewer sentences.
+Return ONLY these sections.
+""".strip()
+
+        return prompt
+
+    def _memo_prompt(self, draft_input: DraftInput, preferences: Optional[Dict[str, Any]] = None) -> str:
+        if self.structured:
+            return self._build_structured_prompt(draft_input, preferences)
+        return self._build_prompt(draft_input, preferences)
+
+    def _parse_sections(self, raw: str) -> MemoSections:
+        """
+        Reads SUBJECT / PARAGRAPH n / ACTION ITEMS sections. Lenient about
+        markdown and wrapped lines; a subject given after the first paragraph
+        is ignored, so parsing a prefix of the output never changes the parts
+        rendered from it.
+        """
+        sections = MemoSections()
+        current = None  # section that unmarked lines continue
+        for line in raw.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            marker = _SECTION_RE.match(line)
+            if marker:
+                name, text = marker.group(1).upper(), marker.group(2).strip()
+                if name == "SUBJECT":
+                    current = "subject" if not sections.paragraphs else None
+                    if current and text:
+                        sections.subject = text
+                elif name.startswith("PARAGRAPH"):
+                    current = "paragraph" if len(sections.paragraphs) < MAX_PARAGRAPHS else None
+                    if current:
+                        sections.paragraphs.append(text)
+                else:
+                    current = "actions"
+                continue
+            if _BOILERPLATE_RE.match(line):
+                current = None
+            elif current == "actions":
+                if len(sections.action_items) < MAX_ACTION_ITEMS:
+                    bullet = _BULLET_RE.match(line)
+                    sections.action_items.append(bullet.group(1) if bullet else line)
+            elif current == "paragraph":
+                sections.paragraphs[-1] = f"{sections.paragraphs[-1]} {line}".strip()
+            elif current == "subject" and not sections.subject:
+                sections.subject = line
+        return sections
+
+    def _render(self, sections: MemoSections, topic: str, today: str, closing: bool = True) -> str:
+        """The memo from its variable parts; without closing for a partial render while streaming."""
+        subject = self._postprocess(sections.subject) or f"Update on {topic}"
+        parts = [MEMO_HEADER.format(subject=subject, today=today)]
+        parts += [p for p in map(self._postprocess, sections.paragraphs) if p]
+        items = [i for i in map(self._postprocess, sections.action_items) if i]
+        if items:
+            parts.append("Key Action Items:\n" + "\n".join(f"- {i}" for i in items))
+        if closing:
+            parts.append(MEMO_CLOSING)
+        return "\n\n".join(parts)
+
+    def _sections_from_memo(self, memo: str) -> Optional[MemoSections]:
+        """
+        Variable parts of a memo in the standard layout (one rendered by
+        _render, or a free-form draft, markdown included). None unless the
+        parse is clean: a subject, 1..MAX_PARAGRAPHS paragraphs without
+        bullets or section labels, and action items.
+        """
+        sections = MemoSections()
+        state = None  # None (headers) | "body" | "actions" | "end"
+        for block in re.split(r"\n\s*\n", memo.strip()):
+            lines = [line.strip() for line in block.splitlines() if line.strip()]
+            if not lines:
+                continue
+            marker = _SECTION_RE.match(lines[0])
+            name = marker.group(1).upper() if marker else ""
+            plain = lines[0].lstrip("*_#> ")
+            if name == "SUBJECT":
+                sections.subject = marker.group(2).strip().strip("*_").strip()
+            elif "ACTION" in name:
+                first = [marker.group(2).strip()] if marker.group(2).strip() else []
+                sections.action_items += [_BULLET_RE.sub(r"\1", line) for line in first + lines[1:]]
+                state = "actions"
+            elif state == "actions" and all(_BULLET_RE.match(line) for line in lines):
+                sections.action_items += [_BULLET_RE.sub(r"\1", line) for line in lines]
+            elif plain.lower().startswith("dear"):
+                state = "body"
+                if len(lines) > 1:
+                    sections.paragraphs.append(" ".join(lines[1:]))
+            elif _BOILERPLATE_RE.match(plain):
+                state = "end" if state in ("body", "actions") else state
+            elif state == "body":
+                if name or any(_BULLET_RE.match(line) for line in lines):
+                    return None  # a list or label inside the body: not a layout we can splice into
+                sections.paragraphs.append(" ".join(lines))
+
+        if (not sections.subject or not 1 <= len(sections.paragraphs) <= MAX_PARAGRAPHS
+                or not sections.action_items):
+            return None
+        return sections
+
+    def _format_sections(self, sections: MemoSections) -> str:
+        """Sections in the structured output format (what the model would have written)."""
+        lines = [f"SUBJECT: {sections.subject}"]
+        lines += [f"PARAGRAPH {i}: {p}" for i, p in enumerate(sections.paragraphs, 1)]
+        lines.append("ACTION ITEMS:")
+        lines += [f"- {item}" for item in sections.action_items]
+        return "\n".join(lines)
+
+    def _section_name(self, key: Any) -> str:
+        if key == "subject":
+            return "SUBJECT"
+        if key == "action_items":
+            return "ACTION ITEMS"
+        return f"PARAGRAPH {key + 1}"
+
+    def _build_section_prompt(self, draft_input: DraftInput, current: MemoSections, targets: List[Any],
+                              preferences: Optional[Dict[str, Any]] = None) -> str:
+        formats = []
+        for key in targets:
+            if key == "subject":
+                formats.append("SUBJECT: <revised subject line>")
+            elif key == "action_items":
+                formats.append("ACTION ITEMS:\n- <revised bullets (no numbers, no dates, no meetings)>")
+            else:
+                formats.append(f"PARAGRAPH {key + 1}: <revised paragraph, on one line>")
+        formats = "\n".join(formats)
+
+        prompt = f"""
+You are an assistant that revises REAL corporate email memos in English.
+
+{self._brief(draft_input, preferences, include_length=False)}
+
+CURRENT MEMO (sections):
+{self._format_sections(current)}
+
+Rewrite ONLY these sections to apply the user's edit request: {", ".join(map(self._section_name, targets))}.
+Keep them about as long as they are now unless the edit request asks otherwise.
+Return ONLY the rewritten sections, in this order and format:
+
+{formats}
+""".strip()
+
+        return prompt
+
+    def _target_sections(self, edit_request: Optional[str], n_paragraphs: int) -> Optional[List[Any]]:
+        """
+        Sections an edit request is about, in memo order, or None when the
+        whole memo should be regenerated. A length or tone cue in a clause
+        that names no section ("make it shorter and change the subject
+        line") applies to the whole memo; one that follows a section
+        ("make the action items shorter and more formal") applies to it.
+        """
+        if not edit_request or _WHOLE_MEMO_RE.search(edit_request):
+            return None
+        targets = set()
+        previous = set()
+        for clause in (c for c in _CLAUSE_SPLIT_RE.split(edit_request) if c):
+            named = {n_paragraphs - 1 if key == -1 else key
+                     for key, pattern in SECTION_PATTERNS if pattern.search(clause)}
+            memo_wide_cue = self._length_class(clause) != "default" or classify_feedback(clause)
+            if not named and memo_wide_cue and (not previous or _MEMO_REF_RE.search(clause)):
+                return None
+            targets |= named
+            previous = named or previous
+        if any(isinstance(k, int) and k >= n_paragraphs for k in targets):
+            return None
+        order = ["subject", *range(n_paragraphs), "action_items"]
+        if not targets or len(targets) == len(order):
+            return None
+        return [key for key in order if key in targets]
+
+    def _revision_plan(self, draft_input: DraftInput):
+        """(current sections, targeted section keys) when only part of the memo needs rewriting, else None."""
+        if not draft_input.previous_draft or not draft_input.edit_request:
+            return None
+        current = self._sections_from_memo(draft_input.previous_draft)
+        if current is None:
+            return None
+        targets = self._target_sections(draft_input.edit_request, len(current.paragraphs))
+        if targets is None:
+            return None
+        return current, targets
+
+    def _splice(self, current: MemoSections, targets: List[Any], revised: MemoSections,
+                complete: bool) -> Optional[MemoSections]:
+        """
+        current with the targeted sections replaced by the model's revised
+        ones. While streaming (complete=False) the result ends at the section
+        still being written, so it only ever grows; once complete, a targeted
+        section the model left out keeps its current text. None if none of
+        the targeted sections arrived (yet).
+        """
+        new_paragraphs = iter(revised.paragraphs)
+        revised_by_key = {}
+        for key in targets:
+            if key == "subject":
+                revised_by_key[key] = revised.subject
+            elif key == "action_items":
+                revised_by_key[key] = revised.action_items
+            else:
+                revised_by_key[key] = next(new_paragraphs, "")
+        arrived = [key for key in targets if revised_by_key[key]]
+        if not arrived:
+            return None
+
+        spliced = MemoSections()
+        for key in ["subject", *range(len(current.paragraphs)), "action_items"]:
+            value = revised_by_key.get(key) if key in targets else None
+            if key in targets and not complete and (not value or key == arrived[-1]):
+                if value:
+                    self._set_section(spliced, key, value)
+                return spliced
+            if not value:
+                value = self._get_section(current, key)
+            self._set_section(spliced, key, value)
+        return spliced
+
+    def _get_section(self, sections: MemoSections, key: Any):
+        if key == "subject":
+            return sections.subject
+        if key == "action_items":
+            return sections.action_items
+        return sections.paragraphs[key]
+
+    def _set_section(self, sections: MemoSections, key: Any, value) -> None:
+        if key == "subject":
+            sections.subject = value
+        elif key == "action_items":
+            sections.action_items = list(value)
+        else:
+            sections.paragraphs.append(value)
+
+    def _stream_spliced(self, pieces: Iterator[str], topic: str, current: MemoSections, targets: List[Any]):
+        """
+        Yields the revised memo: untouched sections as soon as the first
+        rewritten section starts arriving, the rewritten ones as they stream.
+        Returns (raw text, body), with body None if no section came back.
+        """
+        today = datetime.now().strftime("%d %B %Y")
+        raw = ""
+        emitted = ""
+        for piece in pieces:
+            raw += piece
+            spliced = self._splice(current, targets, self._parse_sections(raw[:raw.rfind("\n") + 1]),
+                                   complete=False)
+            if spliced is None or not spliced.subject:
+                continue
+            rendered = self._render(spliced, topic, today, closing=False)
+            if len(rendered) > len(emitted) and rendered.startswith(emitted):
+                yield rendered[len(emitted):]
+                emitted = rendered
+
+        spliced = self._splice(current, targets, self._parse_sections(raw), complete=True)
+        if spliced is None:
+            return raw, None
+        body = self._render(spliced, topic, today)
+        if body.startswith(emitted) and len(body) > len(emitted):
+            yield body[len(emitted):]
+        return raw, body
+
+    def _revision_message(self, draft_input: DraftInput, conversation: DraftConversation) -> str:
+        """Follow-up turn for a revision: only what changed since the last version."""
+        new_points = [dp for dp in draft_input.data_points if dp.text not in conversation.sent_points]
+        parts = [
+            f"Revise the memo you wrote above (this becomes version {draft_input.version}).",
+            f"User edit request (highest priority):\n{draft_input.edit_request}",
+        ]
+        if new_points:
+            parts.append("Additional DATA POINTS (facts you may now use as well):\n"
+                         + self._format_data_points(new_points))
+        parts.append(f"Length constraint:\n- {self._length_instruction(draft_input.edit_request)}")
+        parts.append("Keep all HARD RULES and exactly the same format. "
+                     + ("Return ONLY the revised sections." if self.structured
+                        else "Return ONLY the revised memo text."))
+        return "\n\n".join(parts)
+
+    def _conversation_messages(self, draft_input: DraftInput, conversation: DraftConversation,
+                               preferences: Optional[Dict[str, Any]]) -> List[Dict[str, str]]:
+        if (conversation.messages and draft_input.edit_request
+                and conversation.structured == self.structured
+                and len(conversation.messages) + 2 <= conversation.max_messages):
+            content = self._revision_message(draft_input, conversation)
+            return conversation.messages + [{"role": "user", "content": content}]
+
+        # first draft (or history too long / other prompt style): full prompt, new conversation
+        conversation.reset()
+        conversation.structured = self.structured
+        return [{"role": "user", "content": self._memo_prompt(draft_input, preferences)}]
+
+    def record_turn(self, draft_input: DraftInput, conversation: DraftConversation, memo: str,
+                    preferences: Optional[Dict[str, Any]] = None) -> None:
+        """Adds a version produced outside the conversation (e.g. a speculative draft) to it."""
+        messages = self._conversation_messages(draft_input, conversation, preferences)
+        if self.structured:
+            sections = self._sections_from_memo(memo)
+            if sections is not None:
+                memo = self._format_sections(sections)
+        conversation.messages = messages + [{"role": "assistant", "content": memo}]
+        conversation.sent_points.update(dp.text for dp in draft_input.data_points)
+
+    def run(self, draft_input: DraftInput, preferences: Optional[Dict[str, Any]] = None,
+            conversation: Optional[DraftConversation] = None, use_cache: bool = True) -> DraftOutput:
+        if conversation is not None or self._revision_plan(draft_input) is not None:
+            pieces = self.stream(draft_input, preferences, conversation, use_cache)
+            while True:
+                try:
+                    next(pieces)
+                except StopIteration as done:
+                    return done.value
+
+        email_text = None
+        if self.structured:
+            today = datetime.now().strftime("%d %B %Y")
+            limits = self._generation_limits(draft_input.edit_request, preferences, structured=True)
+            raw = self.llm.run(self._build_structured_prompt(draft_input, preferences), use_cache, **limits)
+            sections = self._parse_sections(raw)
+            if sections.paragraphs:
+                email_text = self._render(sections, draft_input.topic, today)
+
+        if email_text is None:  # free-form mode, or structured output that did not parse
+            prompt = self._build_prompt(draft_input, preferences)
+
+            limits = self._generation_limits(draft_input.edit_request, preferences, structured=False)
+            email_text = self.llm.run(prompt, use_cache, **limits)
+            email_text = self._postprocess(email_text)
 
         return DraftOutput(
-            subject=subject,
+            subject=self.subject_for(draft_input),
             body=email_text,
-            version=version,
+            version=draft_input.version,
         )
+
+    def _open_stream(self, draft_input: DraftInput, preferences: Optional[Dict[str, Any]],
+                     conversation: Optional[DraftConversation], use_cache: bool = True):
+        """(raw text pieces, chat messages sent or None)."""
+        limits = self._generation_limits(draft_input.edit_request, preferences, self.structured)
+        if conversation is not None:
+            messages = self._conversation_messages(draft_input, conversation, preferences)
+            pieces = self.llm.chat_stream(messages, use_cache, **limits)
+            try:
+                first = next(pieces, None)
+            except ConnectionError:
+                pass  # no chat endpoint: plain prompt below (it has its own CLI fallback)
+            else:
+                return itertools.chain([first] if first is not None else [], pieces), messages
+
+        return self.llm.stream(self._memo_prompt(draft_input, preferences), use_cache, **limits), None
+
+    def stream(self, draft_input: DraftInput, preferences: Optional[Dict[str, Any]] = None,
+               conversation: Optional[DraftConversation] = None, use_cache: bool = True) -> Iterator[str]:
+        """
+        Yields pieces of the cleaned memo body as the model writes it.
+        Joined together they equal DraftOutput.body from run(); the finished
+        DraftOutput is the generator's return value.
+        With a conversation, a revision is sent as a follow-up chat turn.
+        With draft_input.previous_draft, an edit aimed at specific sections
+        (subject, a paragraph, the action items) only rewrites those.
+        use_cache=False samples a new text even for a prompt seen before
+        (a repeated "generate" or the same edit asked twice in a row).
+        """
+        plan = self._revision_plan(draft_input)
+        if plan is not None:
+            current, targets = plan
+            budget = sum(SECTION_TOKENS["paragraph" if isinstance(k, int) else k] for k in targets)
+            pieces = self.llm.stream(self._build_section_prompt(draft_input, current, targets, preferences),
+                                     use_cache, options={"num_predict": budget, "stop": STRUCTURED_STOP})
+            _, body = yield from self._stream_spliced(pieces, draft_input.topic, current, targets)
+            if body is not None:
+                if conversation is not None:
+                    self.record_turn(draft_input, conversation, body, preferences)
+                return DraftOutput(
+                    subject=self.subject_for(draft_input),
+                    body=body,
+                    version=draft_input.version,
+                )
+            # no section came back (nothing was shown): rewrite the whole memo below
+
+        pieces, messages = self._open_stream(draft_input, preferences, conversation, use_cache)
+        if self.structured:
+            raw, body = yield from self._stream_rendered(pieces, draft_input.topic)
+        else:
+            raw, body = yield from self._stream_cleaned(pieces)
+
+        if body is None:
+            # the model ignored the section format (nothing was shown yet): free-form prompt instead
+            if conversation is not None:
+                conversation.reset()
+            limits = self._generation_limits(draft_input.edit_request, preferences, structured=False)
+            pieces = self.llm.stream(self._build_prompt(draft_input, preferences), use_cache, **limits)
+            _, body = yield from self._stream_cleaned(pieces)
+        elif conversation is not None:
+            if messages is None:  # fell back to a plain prompt: next revision starts a new chat
+                conversation.reset()
+                conversation.structured = self.structured
+                messages = [{"role": "user", "content": self._memo_prompt(draft_input, preferences)}]
+            conversation.messages = messages + [{"role": "assistant", "content": raw}]
+            conversation.sent_points.update(dp.text for dp in draft_input.data_points)
+
+        return DraftOutput(
+            subject=self.subject_for(draft_input),
+            body=body,
+            version=draft_input.version,
+        )
+
+    def _stream_cleaned(self, pieces: Iterator[str]):
+        """Yields the cleaned free-form memo; returns (raw text, body)."""
+        raw = ""
+        emitted = ""
+        for piece in pieces:
+            raw += piece
+            cleaned = self._postprocess(self._stable_prefix(raw))
+            if len(cleaned) > len(emitted) and cleaned.startswith(emitted):
+                yield cleaned[len(emitted):]
+                emitted = cleaned
+
+        body = self._postprocess(raw)
+        if body.startswith(emitted) and len(body) > len(emitted):
+            yield body[len(emitted):]
+        return raw, body
+
+    def _stream_rendered(self, pieces: Iterator[str], topic: str):
+        """
+        Yields the memo rendered from the sections parsed so far (complete
+        lines only, from the first paragraph on); returns (raw text, body),
+        with body None if no paragraph could be parsed.
+        """
+        today = datetime.now().strftime("%d %B %Y")
+        raw = ""
+        emitted = ""
+        for piece in pieces:
+            raw += piece
+            sections = self._parse_sections(raw[:raw.rfind("\n") + 1])
+            if not sections.paragraphs:
+                continue
+            rendered = self._render(sections, topic, today, closing=False)
+            if len(rendered) > len(emitted) and rendered.startswith(emitted):
+                yield rendered[len(emitted):]
+                emitted = rendered
+
+        sections = self._parse_sections(raw)
+        if not sections.paragraphs:
+            return raw, None
+        body = self._render(sections, topic, today)
+        if body.startswith(emitted) and len(body) > len(emitted):
+            yield body[len(emitted):]
+        return raw, body
+
+    async def apreferences(self) -> Dict[str, Any]:
+        """Loads learned preferences off the event loop (pass them to run/stream/arun)."""
+        return await asyncio.to_thread(self.pref_store.get_global_preferences)
+
+    async def arun(self, draft_input: DraftInput, preferences: Optional[Dict[str, Any]] = None,
+                   use_cache: bool = True) -> DraftOutput:
+        return await asyncio.to_thread(self.run, draft_input, preferences, None, use_cache)
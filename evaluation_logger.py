@@ -1,17 +1,19 @@
-import csv
-import os
 from datetime import datetime
 
+from log_writer import BackgroundWriter, get_writer
+
 
 class EvaluationLogger:
-    def __init__(self, filepath: str = "evaluation_log.csv"):
+    HEADER = ["timestamp", "topic", "grounded", "revision_cycles", "final_decision"]
+
+    def __init__(self, filepath: str = "evaluation_log.csv", writer: BackgroundWriter | None = None):
         self.filepath = filepath
+        self.writer = writer or get_writer()
 
     def log(self, topic: str, revision_cycles: int, final_decision: str, grounded: bool):
-        file_exists = os.path.exists(self.filepath)
-
-        with open(self.filepath, "a", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            if not file_exists:
-                writer.writerow(["timestamp", "topic", "grounded", "revision_cycles", "final_decision"])
-            writer.writerow([datetime.utcnow().isoformat(), topic, grounded, revision_cycles, final_decision])
+        # appended by the background log writer (header added when the file is created)
+        self.writer.submit_csv(
+            self.filepath,
+            self.HEADER,
+            [datetime.utcnow().isoformat(), topic, grounded, revision_cycles, final_decision],
+        )
@@ -1,25 +1,24 @@
 # evaluation_logger_sql.py
 
 from datetime import datetime
-from database import get_connection
+
+from log_writer import BackgroundWriter, get_writer
+
+INSERT_EVALUATION_SQL = """
+    INSERT INTO evaluation_log (timestamp, topic, revision_cycles, final_decision)
+    VALUES (?, ?, ?, ?)
+"""
 
 
 class EvaluationLoggerSQL:
     """
-    Logs each run into the SQLite table evaluation_log.
+    Logs each run into the SQLite table evaluation_log
+    (queued for the background log writer; no commit on the caller's thread).
     """
 
+    def __init__(self, writer: BackgroundWriter | None = None):
+        self.writer = writer or get_writer()
+
     def log(self, topic: str, revision_cycles: int, final_decision: str):
         timestamp = datetime.now().isoformat(timespec="seconds")
-
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO evaluation_log (timestamp, topic, revision_cycles, final_decision)
-            VALUES (?, ?, ?, ?)
-            """,
-            (timestamp, topic, revision_cycles, final_decision),
-        )
-        conn.commit()
-        conn.close()
+        self.writer.submit_sql([(INSERT_EVALUATION_SQL, (timestamp, topic, revision_cycles, final_decision))])
@@ -1,27 +1,37 @@
 # feedback_logger.py
 
 from datetime import datetime
-from database import get_connection
+
+from log_writer import BackgroundWriter, get_writer
+from preference_store import PREFERENCE_UPSERT_SQL, classify_feedback, invalidate_preferences
+
+# Style edit requests, appended as they happen (read back by speculation.py,
+# compacted by maintenance.py)
+FEEDBACK_FILE = "feedback_memory.csv"
+FEEDBACK_HEADER = ["topic", "feedback_text", "created_at"]
+
+INSERT_FEEDBACK_SQL = """
+    INSERT INTO feedback_log (timestamp, topic, revision_cycles,
+                              rating_1_to_5, feedback_text)
+    VALUES (?, ?, ?, ?, ?)
+"""
 
 
 class FeedbackLoggerSQL:
     """
     Logs user rating + free-text feedback into feedback_log (SQLite).
+    The preference_counts aggregates are updated in the same transaction.
+    Rows are written by the background log writer, so log_feedback() returns
+    without waiting for a commit.
     """
 
+    def __init__(self, writer: BackgroundWriter | None = None):
+        self.writer = writer or get_writer()
+
     def log_feedback(self, topic: str, revision_cycles: int,
                      rating_1_to_5: int | None, feedback_text: str | None):
         timestamp = datetime.now().isoformat(timespec="seconds")
 
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO feedback_log (timestamp, topic, revision_cycles,
-                                      rating_1_to_5, feedback_text)
-            VALUES (?, ?, ?, ?, ?)
-            """,
-            (timestamp, topic, revision_cycles, rating_1_to_5, feedback_text),
-        )
-        conn.commit()
-        conn.close()
+        statements = [(INSERT_FEEDBACK_SQL, (timestamp, topic, revision_cycles, rating_1_to_5, feedback_text))]
+        statements += [(PREFERENCE_UPSERT_SQL, (name,)) for name in classify_feedback(feedback_text)]
+        self.writer.submit_sql(statements, on_commit=invalidate_preferences)
@@ -0,0 +1,148 @@
+# fts_backend.py
+
+import csv
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from typing import List, Optional, Set, Tuple
+
+from case_index import INDEXED_FIELDS, source_key, tokenize
+
+IMPORT_BATCH_SIZE = 1000
+
+
+class FTSCaseStore:
+    """
+    Out-of-core retrieval backend: the case CSV is imported once into an
+    SQLite FTS5 table (<csv>.fts.db) and queries are answered with a ranked
+    MATCH, so nothing but the returned rows is held in memory.
+
+    The DB remembers the CSV path, size and mtime it was built from and is
+    re-imported automatically when the CSV changes.
+    """
+
+    def __init__(self, csv_path: str, db_path: Optional[str] = None):
+        self.csv_path = csv_path
+        self.db_path = db_path or csv_path + ".fts.db"
+        self._ready = False
+        self._lock = threading.Lock()  # one import per store, however many threads query at once
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _stored_key(self) -> Optional[dict]:
+        if not os.path.exists(self.db_path):
+            return None
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+        except sqlite3.DatabaseError:
+            return None
+        finally:
+            conn.close()
+        return json.loads(row["value"]) if row else None
+
+    def build(self) -> None:
+        """(Re)imports the CSV, streaming rows in batches (constant memory)."""
+        key = source_key(self.csv_path)
+        # unique tmp file next to the DB: concurrent builders (other processes) never share one
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(self.db_path) + ".",
+                                        suffix=".tmp", dir=os.path.dirname(self.db_path) or ".")
+        os.close(fd)
+        try:
+            self._import(tmp_path, key)
+            os.replace(tmp_path, self.db_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _import(self, tmp_path: str, key: dict) -> None:
+        conn = sqlite3.connect(tmp_path)
+        cur = conn.cursor()
+        cur.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        cur.execute(
+            """
+            CREATE VIRTUAL TABLE cases USING fts5(
+                corpus,
+                case_id UNINDEXED,
+                gold_data_points UNINDEXED
+            )
+            """
+        )
+
+        with open(self.csv_path, "r", encoding="utf-8", newline="") as f:
+            batch = []
+            for r in csv.DictReader(f):
+                batch.append((
+                    " ".join(r.get(name, "") or "" for name in INDEXED_FIELDS),
+                    (r.get("case_id") or "UNKNOWN_CASE").strip(),
+                    r.get("gold_data_points", "") or "",
+                ))
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    cur.executemany("INSERT INTO cases (corpus, case_id, gold_data_points) VALUES (?, ?, ?)", batch)
+                    batch = []
+            if batch:
+                cur.executemany("INSERT INTO cases (corpus, case_id, gold_data_points) VALUES (?, ?, ?)", batch)
+
+        cur.execute("INSERT INTO cases (cases) VALUES ('optimize')")
+        cur.execute("INSERT INTO meta (key, value) VALUES ('source', ?)", (json.dumps(key),))
+        conn.commit()
+        conn.close()
+
+    def ensure_ready(self) -> None:
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            if self._stored_key() != source_key(self.csv_path):
+                self.build()
+            self._ready = True
+
+    def search(self, topic: str, top_k: int, exclude_sources: Optional[Set[str]] = None,
+               min_hits: int = 2, candidates: int = 10) -> List[Tuple[str, str]]:
+        """
+        Returns up to top_k (case_id, gold_data_points) pairs ranked by FTS5 bm25.
+        Like the in-memory index, a row must contain at least min_hits query
+        tokens: matches are re-checked in windows of top_k * candidates rows,
+        each twice the size of the last, until top_k rows pass or the matches
+        run out (e.g. when the best-ranked rows all hit one rare token).
+        """
+        q = tokenize(topic)
+        if len(q) < min_hits:
+            return []
+        self.ensure_ready()
+
+        exclude = sorted(exclude_sources or ())
+        # quoted terms: query tokens like "and"/"or"/"not" must not become operators
+        match = " OR ".join(f'"{t}"' for t in sorted(q))
+        sql = "SELECT case_id, gold_data_points, corpus FROM cases WHERE cases MATCH ?"
+        params: list = [match]
+        if exclude:
+            sql += f" AND case_id NOT IN ({', '.join('?' for _ in exclude)})"
+            params.extend(exclude)
+        sql += " ORDER BY rank LIMIT ? OFFSET ?"
+
+        hits: List[Tuple[str, str]] = []
+        window, offset = top_k * candidates, 0
+        conn = self._connect()
+        try:
+            while True:
+                rows = conn.execute(sql, params + [window, offset]).fetchall()
+                for row in rows:
+                    if len(q & tokenize(row["corpus"])) < min_hits:
+                        continue
+                    hits.append((row["case_id"], row["gold_data_points"]))
+                    if len(hits) >= top_k:
+                        return hits
+                if len(rows) < window:
+                    return hits
+                offset += window
+                window *= 2
+        finally:
+            conn.close()
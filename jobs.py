@@ -0,0 +1,143 @@
+# jobs.py
+
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, Optional
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function once cancellation was requested."""
+
+
+class Job:
+    """
+    One unit of background work (retrieval + drafting).
+
+    The job function gets the Job as its first argument and reports progress
+    through set_stage() / set_partial(); it should call check_cancelled()
+    between steps. Readers (the UI) only look at the public attributes.
+    """
+
+    def __init__(self, kind: str, meta: Optional[Dict[str, Any]] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.meta = meta or {}
+        self.status = "queued"   # queued | running | done | failed | cancelled
+        self.stage = "Waiting for a free worker..."
+        self.partial = ""
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._cancel = threading.Event()
+        self._future: Optional[Future] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed", "cancelled")
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def check_cancelled(self) -> None:
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def set_stage(self, stage: str) -> None:
+        self.stage = stage
+
+    def set_partial(self, text: str) -> None:
+        self.partial = text
+
+    def stream_into(self, pieces: Iterator[str]) -> str:
+        """
+        Consumes a text stream, publishing the text so far as partial output.
+        On cancellation the stream is closed, which for LocalLLM drops the
+        HTTP connection and stops the generation on the server.
+        """
+        text = ""
+        try:
+            for piece in pieces:
+                text += piece
+                self.partial = text
+                self.check_cancelled()
+        finally:
+            close = getattr(pieces, "close", None)
+            if close is not None:
+                close()
+        return text
+
+
+class JobManager:
+    """
+    Runs jobs on a small worker pool so slow generations don't occupy the
+    caller's thread (e.g. a Streamlit script run). Jobs are looked up by id,
+    so a client that lost its session (browser refresh) can pick its job up
+    again. Finished jobs are forgotten after retention_seconds.
+    """
+
+    def __init__(self, max_workers: int = 4, retention_seconds: float = 3600.0):
+        self.retention_seconds = retention_seconds
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="memo-job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, fn: Callable[..., Any], *args,
+               meta: Optional[Dict[str, Any]] = None, **kwargs) -> Job:
+        job = Job(kind, meta)
+        with self._lock:
+            self._evict_finished()
+            self._jobs[job.id] = job
+        job._future = self._pool.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job: Job, fn: Callable[..., Any], args, kwargs) -> None:
+        if job.cancel_requested:
+            job.status = "cancelled"
+            job.finished_at = time.time()
+            return
+        job.status = "running"
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.status = "done"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as e:  # surfaced to the UI instead of killing the worker
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        if not job_id:
+            return None
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Requests cancellation; a queued job never starts, a running one stops at its next check."""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        job._cancel.set()
+        if job._future is not None and job._future.cancel():
+            job.status = "cancelled"
+            job.finished_at = time.time()
+        return True
+
+    def _evict_finished(self) -> None:
+        cutoff = time.time() - self.retention_seconds
+        # finished_at is set just after the final status: a job finishing right now is kept
+        for job_id in [j.id for j in self._jobs.values()
+                       if j.finished and j.finished_at is not None and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
@@ -0,0 +1,146 @@
+# llm_cache.py
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from database import get_connection
+
+
+class LLMCache:
+    """
+    Content-addressed cache for LLM responses.
+
+    Key = sha256 of (model, prompt, generation options), so the same prompt
+    sent to the same model with the same options is only generated once.
+      - in-process LRU (max_entries)
+      - optional persistent copy in memo_system.db -> llm_cache (max_persisted rows)
+      - optional TTL for both levels
+      - hit / miss / eviction counters (see stats())
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: Optional[float] = None,
+                 persist: bool = False, max_persisted: int = 5000):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist = persist
+        self.max_persisted = max_persisted
+
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "persistent_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    @staticmethod
+    def make_key(model: str, prompt: str, options: Optional[Dict[str, Any]] = None) -> str:
+        payload = json.dumps([model, prompt, options or {}], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._expired(entry[1]):
+                    del self._entries[key]
+                    self.counters["expired"] += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.counters["hits"] += 1
+                    return entry[0]
+
+        if self.persist:
+            row = self._load_persisted(key)
+            if row is not None:
+                response, created_at = row
+                self._remember(key, response, created_at)
+                with self._lock:
+                    self.counters["persistent_hits"] += 1
+                return response
+
+        with self._lock:
+            self.counters["misses"] += 1
+        return None
+
+    def put(self, key: str, model: str, response: str) -> None:
+        created_at = time.time()
+        self._remember(key, response, created_at)
+        if self.persist:
+            self._store_persisted(key, model, response, created_at)
+
+    def _remember(self, key: str, response: str, created_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (response, created_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def _load_persisted(self, key: str) -> Optional[Tuple[str, float]]:
+        conn = get_connection()
+        try:
+            with conn:
+                cur = conn.cursor()
+                cur.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,))
+                row = cur.fetchone()
+                if row is None:
+                    return None
+                if self._expired(row["created_at"]):
+                    cur.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    with self._lock:
+                        self.counters["expired"] += 1
+                    return None
+                cur.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+                return row["response"], row["created_at"]
+        except sqlite3.OperationalError:
+            return None  # table missing (init_db not run) or DB busy: behave like a miss
+
+    def _store_persisted(self, key: str, model: str, response: str, created_at: float) -> None:
+        conn = get_connection()
+        try:
+            with conn:
+                cur = conn.cursor()
+                cur.execute(
+                    """
+                    INSERT OR REPLACE INTO llm_cache (key, model, response, created_at, last_used)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (key, model, response, created_at, created_at),
+                )
+                # size eviction: keep only the most recently used rows
+                cur.execute(
+                    """
+                    DELETE FROM llm_cache WHERE key IN (
+                        SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                    )
+                    """,
+                    (self.max_persisted,),
+                )
+                if self.ttl_seconds is not None:
+                    cur.execute("DELETE FROM llm_cache WHERE created_at < ?", (created_at - self.ttl_seconds,))
+        except sqlite3.OperationalError:
+            pass  # caching is best effort
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.persist:
+            conn = get_connection()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM llm_cache")
+            except sqlite3.OperationalError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self.counters)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["persistent_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["persistent_hits"]) / lookups if lookups else 0.0
+        return stats
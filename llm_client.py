@@ -1,26 +1,363 @@
+import asyncio
+import codecs
+import http.client
+import json
+import queue
+import re
 import subprocess
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+from llm_cache import LLMCache
+
+
+class OllamaError(RuntimeError):
+    """The Ollama HTTP API answered with an error status."""
+
+
+class _ConnectionPool:
+    """
+    Small pool of keep-alive HTTP connections to one host.
+    Connections are reused across calls (and threads) instead of paying a
+    TCP handshake per generation; a broken connection is simply dropped.
+    """
+
+    def __init__(self, host: str, port: int, timeout: float, size: int = 4):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue(maxsize=size)
+
+    def acquire(self, fresh: bool = False) -> http.client.HTTPConnection:
+        if not fresh:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def release(self, conn: http.client.HTTPConnection) -> None:
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def discard(self, conn: http.client.HTTPConnection) -> None:
+        conn.close()
 
 
 class LocalLLM:
     """
     Uses Ollama to run a FREE local model.
+
+    NEW:
+    - Talks to the Ollama HTTP API (/api/generate, /api/chat) over pooled
+      keep-alive connections; keep_alive keeps the model loaded between calls.
+    - Falls back to `ollama run` (subprocess) when the server is unreachable,
+      or always when backend="subprocess".
+    - stream(prompt) yields text pieces as the model produces them.
+    - Optional LLMCache: run()/stream() reuse an earlier response for the same
+      (model, prompt, options); pass use_cache=False for fresh sampling.
+    - arun()/awarm() for asyncio callers (blocking I/O runs in a worker thread).
+    - chat_stream(messages) streams a multi-turn /api/chat reply; resending the
+      same history lets the server reuse its cached prefix (only new turns
+      are prefilled).
+    - Per-call options (e.g. {"num_predict": 300, "stop": [...]}) override
+      the defaults; stop strings are also applied client-side (the CLI has
+      no options). end="<regex>" finishes a stream right after the first
+      match, closing the connection so the server stops generating.
     """
 
-    def __init__(self, model_name="llama3.2:3b"):
+    def __init__(self, model_name="llama3.2:3b", host: str = "http://localhost:11434",
+                 backend: str = "http", keep_alive: Optional[str] = "30m",
+                 timeout: float = 300.0, options: Optional[Dict[str, Any]] = None,
+                 cache: Optional[LLMCache] = None):
+        if backend not in ("http", "subprocess"):
+            raise ValueError(f"Unknown LLM backend {backend!r} (expected 'http' or 'subprocess')")
+
         self.model = model_name
+        self.backend = backend
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.options = options or {}
+        self.cache = cache
+
+        url = urlparse(host if "://" in host else f"http://{host}")
+        self._pool = _ConnectionPool(url.hostname or "localhost", url.port or 11434, timeout)
+
+    def _request(self, path: str, payload: Dict[str, Any]) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+        """Sends the request and returns the connection + response (body not read yet)."""
+        body = json.dumps(payload).encode("utf-8")
+        for attempt in range(2):
+            # 2nd attempt uses a new connection: the server may have closed an idle one
+            conn = self._pool.acquire(fresh=attempt > 0)
+            try:
+                conn.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+                return conn, conn.getresponse()
+            except (ConnectionError, http.client.HTTPException):
+                self._pool.discard(conn)
+                if attempt:
+                    raise
+            except OSError:
+                self._pool.discard(conn)
+                raise
+        raise ConnectionError(f"Could not reach Ollama at {self._pool.host}:{self._pool.port}")
+
+    def _finish(self, conn: http.client.HTTPConnection, resp: http.client.HTTPResponse, fully_read: bool) -> None:
+        if fully_read and not resp.will_close:
+            self._pool.release(conn)
+        else:
+            self._pool.discard(conn)
+
+    def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        conn, resp = self._request(path, payload)
+        try:
+            data = resp.read()
+        except (OSError, http.client.HTTPException):
+            self._finish(conn, resp, fully_read=False)
+            raise
+        self._finish(conn, resp, fully_read=True)
+
+        if resp.status != 200:
+            raise OllamaError(f"Ollama {path} returned HTTP {resp.status}: {data[:300]!r}")
+        return json.loads(data.decode("utf-8"))
+
+    def _iter_stream(self, path: str, payload: Dict[str, Any],
+                     extract: Callable[[Dict[str, Any]], str]) -> Iterator[str]:
+        """
+        Reads Ollama's NDJSON stream line by line. If the consumer stops early
+        the connection is dropped (not returned to the pool), which also
+        tells the server to stop generating.
+        """
+        conn, resp = self._request(path, payload)
+        fully_read = False
+        try:
+            if resp.status != 200:
+                data = resp.read()
+                fully_read = True
+                raise OllamaError(f"Ollama {path} returned HTTP {resp.status}: {data[:300]!r}")
+
+            while True:
+                line = resp.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                chunk = json.loads(line.decode("utf-8"))
+                if chunk.get("error"):
+                    raise OllamaError(f"Ollama {path} failed: {chunk['error']}")
+                text = extract(chunk)
+                if text:
+                    yield text
+                if chunk.get("done"):
+                    resp.read()  # consume the end of the chunked body so the connection can be reused
+                    fully_read = True
+                    break
+        finally:
+            self._finish(conn, resp, fully_read)
+
+    def _options(self, options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        return {**self.options, **options} if options else self.options
 
-    def generate_email(self, prompt: str) -> str:
+    def _payload(self, options: Optional[Dict[str, Any]] = None, **fields) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {"model": self.model, "stream": False, **fields}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        options = self._options(options)
+        if options:
+            payload["options"] = options
+        return payload
+
+    @staticmethod
+    def _limit(pieces: Iterator[str], stop: Sequence[str] = (), end: Optional[str] = None) -> Iterator[str]:
+        """
+        Ends a text stream at the first stop string (dropped, like Ollama's
+        stop option) or right after the first match of end (kept), and closes
+        the source so nothing more is generated. Text that may still turn out
+        to start a stop string is held back until that is decided.
+        """
+        if not stop and end is None:
+            yield from pieces
+            return
+        end_re = re.compile(end) if end is not None else None
+        hold = max((len(s) for s in stop), default=1) - 1
+        text = ""
+        emitted = 0
+        try:
+            for piece in pieces:
+                text += piece
+                cuts = [i for i in (text.find(s) for s in stop) if i >= 0]
+                match = end_re.search(text) if end_re is not None else None
+                if match:
+                    cuts.append(match.end())
+                if cuts:
+                    cut = min(cuts)
+                    if cut > emitted:
+                        yield text[emitted:cut]
+                    return
+                if len(text) - hold > emitted:
+                    yield text[emitted:len(text) - hold]
+                    emitted = len(text) - hold
+            if len(text) > emitted:
+                yield text[emitted:]
+        finally:
+            close = getattr(pieces, "close", None)
+            if close is not None:
+                close()
+
+    def _generate_subprocess(self, prompt: str) -> str:
         result = subprocess.run(
             ["ollama", "run", self.model],
             input=prompt.encode("utf-8"),
-            capture_output=True
+            capture_output=True,
+            timeout=self.timeout,
         )
         return result.stdout.decode("utf-8")
 
+    def _stream_subprocess(self, prompt: str) -> Iterator[str]:
+        proc = subprocess.Popen(
+            ["ollama", "run", self.model],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        try:
+            proc.stdin.write(prompt.encode("utf-8"))
+            proc.stdin.close()
+            while True:
+                data = proc.stdout.read1(4096)
+                if not data:
+                    break
+                text = decoder.decode(data)
+                if text:
+                    yield text
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                yield tail
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+            proc.stdout.close()
+
+    def generate_email(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> str:
+        if self.backend == "http":
+            try:
+                return self._post("/api/generate", self._payload(options, prompt=prompt)).get("response", "")
+            except ConnectionError:
+                pass  # server not reachable: fall back to the CLI
+        return self._generate_subprocess(prompt)
+
+    def _cache_key(self, prompt: str, use_cache: bool, options: Optional[Dict[str, Any]] = None,
+                   end: Optional[str] = None) -> Optional[str]:
+        if self.cache is None or not use_cache:
+            return None
+        options = self._options(options)
+        if end is not None:
+            options = {**options, "end": end}  # a cut-short text is a different response
+        return self.cache.make_key(self.model, prompt, options)
+
+    def stream(self, prompt: str, use_cache: bool = True, options: Optional[Dict[str, Any]] = None,
+               end: Optional[str] = None) -> Iterator[str]:
+        """Yields the generated text piece by piece (same fallback rules as generate_email)."""
+        key = self._cache_key(prompt, use_cache, options, end)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        # only a generation that ran to the end (or to its stop / end) is cached
+        pieces = []
+        stop = self._options(options).get("stop") or ()
+        for piece in self._limit(self._stream_uncached(prompt, options), stop, end):
+            pieces.append(piece)
+            yield piece
+        if key is not None:
+            self.cache.put(key, self.model, "".join(pieces))
+
+    def _stream_uncached(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        if self.backend == "http":
+            try:
+                pieces = self._iter_stream("/api/generate", self._payload(options, prompt=prompt, stream=True),
+                                           lambda chunk: chunk.get("response", ""))
+                first = next(pieces, None)
+            except ConnectionError:
+                pass  # server not reachable: fall back to the CLI
+            else:
+                if first is not None:
+                    yield first
+                    yield from pieces
+                return
+        yield from self._stream_subprocess(prompt)
+
+    def chat(self, messages: List[Dict[str, str]]) -> str:
+        """Multi-turn generation via /api/chat (messages: [{"role": ..., "content": ...}])."""
+        data = self._post("/api/chat", self._payload(messages=messages))
+        return (data.get("message") or {}).get("content", "")
+
+    def chat_stream(self, messages: List[Dict[str, str]], use_cache: bool = True,
+                    options: Optional[Dict[str, Any]] = None, end: Optional[str] = None) -> Iterator[str]:
+        """
+        Streaming chat(). HTTP only: raises ConnectionError when the server is
+        unreachable (there is no CLI equivalent of a chat history).
+        """
+        key = self._cache_key(json.dumps(messages, ensure_ascii=False), use_cache, options, end)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        if self.backend != "http":
+            raise ConnectionError("chat needs the Ollama HTTP backend")
+        pieces = []
+        stop = self._options(options).get("stop") or ()
+        chunks = self._iter_stream("/api/chat", self._payload(options, messages=messages, stream=True),
+                                   lambda chunk: (chunk.get("message") or {}).get("content", ""))
+        for piece in self._limit(chunks, stop, end):
+            pieces.append(piece)
+            yield piece
+        if key is not None:
+            self.cache.put(key, self.model, "".join(pieces))
+
     # NEW: generic interface used by DraftingAgent
-    def run(self, prompt: str) -> str:
+    def run(self, prompt: str, use_cache: bool = True, options: Optional[Dict[str, Any]] = None,
+            end: Optional[str] = None) -> str:
         """
         Generic 'run' method so other components can call the LLM
         without caring about the underlying implementation.
         """
-        return self.generate_email(prompt)
+        if end is not None:
+            return "".join(self.stream(prompt, use_cache, options, end))  # only a stream can be cut short
+
+        key = self._cache_key(prompt, use_cache, options)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        text = "".join(self._limit(iter([self.generate_email(prompt, options)]),
+                                   self._options(options).get("stop") or ()))
+        if key is not None:
+            self.cache.put(key, self.model, text)
+        return text
+
+    def warm(self) -> None:
+        """Asks Ollama to load the model now (no prompt), so the first draft skips the load."""
+        if self.backend != "http":
+            return
+        try:
+            self._post("/api/generate", self._payload())
+        except (OSError, http.client.HTTPException, OllamaError):
+            # refused, DNS failure, socket timeout (TimeoutError is an OSError), dropped connection:
+            # best effort, the real call will load (or fall back) anyway
+            pass
+
+    async def awarm(self) -> None:
+        await asyncio.to_thread(self.warm)
+
+    async def arun(self, prompt: str, use_cache: bool = True, options: Optional[Dict[str, Any]] = None,
+                   end: Optional[str] = None) -> str:
+        return await asyncio.to_thread(self.run, prompt, use_cache, options, end)
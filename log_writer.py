@@ -0,0 +1,298 @@
+# log_writer.py
+
+import atexit
+import csv
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from database import get_connection
+
+# A queued write is either
+#   ("sql", [(statement, params), ...], on_commit)  -> applied in one transaction
+#   ("csv", (path, header, row), None)               -> appended to a CSV file
+# Statements of one item always land in the same batch (= same transaction).
+SqlStatements = List[Tuple[str, Sequence[Any]]]
+
+
+class _Flush:
+    def __init__(self, stop: bool = False):
+        self.done = threading.Event()
+        self.stop = stop
+
+
+class BackgroundWriter:
+    """
+    Write-behind logger: callers enqueue rows and return immediately, a
+    single flusher thread writes them in batches.
+
+      - a batch is written when it reaches batch_size items or flush_interval
+        seconds after its first item, whichever comes first
+      - SQL rows of a batch go through executemany in ONE transaction
+      - CSV rows are appended with one open() per file per batch
+      - the queue is bounded (max_queue); when it is full a caller waits up to
+        block_timeout seconds, then the row is dropped (see stats())
+      - a SQL batch that fails is retried once, then written one item per
+        transaction; only items that still fail are dropped (counted as
+        "failed" and reported on stderr)
+      - pending rows are flushed at interpreter exit; rows submitted after
+        close() are written synchronously
+    """
+
+    def __init__(self, batch_size: int = 200, flush_interval: float = 0.5,
+                 max_queue: int = 10000, block_timeout: float = 1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._csv_lock = threading.Lock()  # held while appending; csv_paused() holds it to stop appends
+        self._closed = False
+        self.counters: Dict[str, Any] = {
+            "submitted": 0, "written": 0, "batches": 0, "max_depth": 0,
+            "blocked": 0, "blocked_seconds": 0.0, "dropped": 0, "failed": 0, "errors": 0,
+        }
+        self.last_error: Optional[str] = None
+
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # -----------------------------
+    # Producer side
+    # -----------------------------
+    def submit_sql(self, statements: SqlStatements,
+                   on_commit: Optional[Callable[[], None]] = None) -> bool:
+        """Queues statements that must be committed together; on_commit runs after the commit."""
+        return self._put(("sql", statements, on_commit))
+
+    def submit_csv(self, path: str, header: Sequence[str], row: Sequence[Any]) -> bool:
+        """Queues one CSV row (header is written first if the file does not exist yet)."""
+        return self._put(("csv", (path, header, row), None))
+
+    def _put(self, item) -> bool:
+        with self._lock:
+            closed = self._closed
+        if closed:
+            self._write([item])  # after shutdown: write synchronously rather than lose the row
+            return True
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            started = time.perf_counter()
+            try:
+                self._queue.put(item, timeout=self.block_timeout)
+            except queue.Full:
+                with self._lock:
+                    self.counters["dropped"] += 1
+                return False
+            finally:
+                with self._lock:
+                    self.counters["blocked"] += 1
+                    self.counters["blocked_seconds"] += time.perf_counter() - started
+
+        with self._lock:
+            self.counters["submitted"] += 1
+            self.counters["max_depth"] = max(self.counters["max_depth"], self._queue.qsize())
+        return True
+
+    def flush(self, timeout: Optional[float] = 10.0) -> bool:
+        """Blocks until everything queued so far is written. Returns False on timeout."""
+        if self._closed:
+            return True
+        marker = _Flush()
+        self._queue.put(marker)
+        return marker.done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        """Flushes pending rows and stops the flusher thread."""
+        with self._lock:
+            if self._closed:
+                return
+            # from here on _put() writes synchronously instead of queueing
+            self._closed = True
+        marker = _Flush(stop=True)
+        self._queue.put(marker)
+        marker.done.wait(timeout)
+        self._thread.join(timeout)
+        self._drain()  # rows that passed the closed check just before it landed behind the marker
+
+    @contextmanager
+    def csv_paused(self) -> Iterator[None]:
+        """
+        Writes everything queued so far, then holds back CSV appends until the
+        block ends (e.g. while maintenance rewrites a log file in place).
+        """
+        self.flush()
+        with self._csv_lock:
+            yield
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.counters)
+        stats["queued"] = self._queue.qsize()
+        stats["avg_batch"] = stats["written"] / stats["batches"] if stats["batches"] else 0.0
+        stats["last_error"] = self.last_error
+        return stats
+
+    # -----------------------------
+    # Flusher thread
+    # -----------------------------
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            batch, marker = [], None
+            if isinstance(item, _Flush):
+                marker = item
+            else:
+                batch.append(item)
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if isinstance(item, _Flush):
+                        marker = item
+                        break
+                    batch.append(item)
+
+            if batch:
+                self._write(batch)
+            if marker is not None:
+                if marker.stop:
+                    self._drain()
+                marker.done.set()
+                if marker.stop:
+                    return
+
+    def _drain(self) -> None:
+        """Writes whatever is still queued (used once the writer is closed)."""
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, _Flush):
+                item.done.set()
+            else:
+                batch.append(item)
+        if batch:
+            self._write(batch)
+
+    def _write(self, batch) -> None:
+        sql_items: List[Tuple[SqlStatements, Optional[Callable[[], None]]]] = []
+        csv_rows: Dict[str, Tuple[Sequence[str], List[Sequence[Any]]]] = {}
+
+        for kind, payload, on_commit in batch:
+            if kind == "sql":
+                sql_items.append((payload, on_commit))
+            else:
+                path, header, row = payload
+                csv_rows.setdefault(path, (header, []))[1].append(row)
+
+        written = self._write_sql_items(sql_items) if sql_items else 0
+        for path, (header, rows) in csv_rows.items():
+            if self._write_csv(path, header, rows):
+                written += len(rows)
+            else:
+                self._count_failed(len(rows), f"{len(rows)} CSV row(s) for {path} dropped")
+
+        with self._lock:
+            self.counters["batches"] += 1
+            self.counters["written"] += written
+
+    def _write_sql_items(self, items) -> int:
+        """
+        Commits the items in one transaction (retried once). If that keeps
+        failing, each item gets its own transaction so one bad row does not
+        take the others with it. on_commit callbacks run for committed items.
+        Returns the number of items written.
+        """
+        if self._write_sql(self._group(items)) or self._write_sql(self._group(items)):
+            committed = items
+        else:
+            committed = []
+            for item in items:
+                if self._write_sql(self._group([item])):
+                    committed.append(item)
+                else:
+                    self._count_failed(1, f"SQL item dropped: {item[0]!r}")
+
+        callbacks: List[Callable[[], None]] = []
+        for _, on_commit in committed:
+            if on_commit is not None and on_commit not in callbacks:
+                callbacks.append(on_commit)
+        for callback in callbacks:
+            callback()
+        return len(committed)
+
+    @staticmethod
+    def _group(items) -> Dict[str, List[Sequence[Any]]]:
+        """statement -> params of every row, for executemany (items keep their order)."""
+        statements: Dict[str, List[Sequence[Any]]] = {}
+        for payload, _ in items:
+            for sql, params in payload:
+                statements.setdefault(sql, []).append(params)
+        return statements
+
+    def _write_sql(self, statements: Dict[str, List[Sequence[Any]]]) -> bool:
+        conn = get_connection()
+        try:
+            with conn:
+                for sql, rows in statements.items():
+                    conn.executemany(sql, rows)
+            return True
+        except sqlite3.Error as e:
+            self._record_error(f"SQLite write failed: {e}")
+            return False
+
+    def _write_csv(self, path: str, header: Sequence[str], rows: List[Sequence[Any]]) -> bool:
+        try:
+            with self._csv_lock:
+                file_exists = os.path.exists(path)
+                with open(path, "a", newline="", encoding="utf-8") as f:
+                    writer = csv.writer(f)
+                    if not file_exists:
+                        writer.writerow(header)
+                    writer.writerows(rows)
+            return True
+        except OSError as e:
+            self._record_error(f"CSV write to {path} failed: {e}")
+            return False
+
+    def _count_failed(self, n: int, message: str) -> None:
+        with self._lock:
+            self.counters["failed"] += n
+        self._record_error(message)
+
+    def _record_error(self, message: str) -> None:
+        # logging must never take the app down: count it and report on stderr
+        with self._lock:
+            self.counters["errors"] += 1
+        self.last_error = message
+        print(f"[log_writer] {message}", file=sys.stderr)
+
+
+_writer: Optional[BackgroundWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> BackgroundWriter:
+    """The process-wide BackgroundWriter (started on first use)."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = BackgroundWriter()
+    return _writer
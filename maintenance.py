@@ -0,0 +1,275 @@
+# maintenance.py
+#
+# Retention for the evaluation / feedback logs (run it from cron or by hand,
+# ideally while the app is idle; CSV appends of this process's log writer are
+# paused while a CSV is rewritten):
+#
+#   python maintenance.py --days 90
+#
+#   - SQLite: evaluation_log / feedback_log rows older than the horizon are
+#     folded into the evaluation_daily / feedback_daily rollup tables, written
+#     to a gzip archive and deleted; freed pages are returned with an
+#     incremental vacuum
+#   - CSV: evaluation_log.csv is compacted the same way (old rows go to
+#     evaluation_log.daily.csv + the archive); feedback_memory.csv keeps only
+#     recent rows
+#
+# analytics.py and analyze_evaluation.py combine raw rows with the rollups,
+# so reports still cover the full history. Learned preferences come from
+# preference_counts, which is never trimmed.
+
+import argparse
+import csv
+import gzip
+import io
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from analyze_evaluation import rollup_path
+from database import get_connection, init_db
+from feedback_logger import FEEDBACK_FILE, FEEDBACK_HEADER
+from log_writer import get_writer
+
+ROLLUP_EVALUATION_SQL = """
+    INSERT INTO evaluation_daily (day, topic, final_decision, revision_cycles, runs)
+    SELECT substr(timestamp, 1, 10), topic, final_decision, revision_cycles, COUNT(*)
+    FROM evaluation_log
+    WHERE timestamp < ?
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (day, topic, final_decision, revision_cycles)
+    DO UPDATE SET runs = runs + excluded.runs
+"""
+
+ROLLUP_FEEDBACK_SQL = """
+    INSERT INTO feedback_daily (day, topic, feedback, rated, rating_sum)
+    SELECT substr(timestamp, 1, 10), topic, COUNT(*), COUNT(rating_1_to_5), COALESCE(SUM(rating_1_to_5), 0)
+    FROM feedback_log
+    WHERE timestamp < ?
+    GROUP BY 1, 2
+    ON CONFLICT (day, topic)
+    DO UPDATE SET feedback = feedback + excluded.feedback,
+                  rated = rated + excluded.rated,
+                  rating_sum = rating_sum + excluded.rating_sum
+"""
+
+
+def _archive_file(archive_dir: Optional[Path], name: str) -> Optional[Path]:
+    if archive_dir is None:
+        return None
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    return archive_dir / f"{name}-{datetime.now().strftime('%Y%m%dT%H%M%S')}.csv.gz"
+
+
+def _archive_query(conn, path: Optional[Path], sql: str, params) -> int:
+    """Streams the result of sql into a gzip CSV (with header). Returns the row count."""
+    cur = conn.execute(sql, params)
+    if path is None:
+        return 0
+    n = 0
+    with gzip.open(path, "wt", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow([c[0] for c in cur.description])
+        for row in cur:
+            writer.writerow(row)
+            n += 1
+    if n == 0:
+        path.unlink()
+    return n
+
+
+def rollup_sqlite(cutoff: str, archive_dir: Optional[Path]) -> Dict[str, int]:
+    """Rolls up + archives + deletes raw rows with timestamp < cutoff, in one transaction."""
+    conn = get_connection()
+    moved = {}
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for table, rollup_sql in (("evaluation_log", ROLLUP_EVALUATION_SQL),
+                                  ("feedback_log", ROLLUP_FEEDBACK_SQL)):
+            _archive_query(conn, _archive_file(archive_dir, table),
+                           f"SELECT * FROM {table} WHERE timestamp < ? ORDER BY id", (cutoff,))
+            conn.execute(rollup_sql, (cutoff,))
+            moved[table] = conn.execute(f"DELETE FROM {table} WHERE timestamp < ?", (cutoff,)).rowcount
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return moved
+
+
+def vacuum() -> Tuple[int, int]:
+    """Returns freed pages to the OS. Returns (pages before, pages after)."""
+    conn = get_connection()
+    before = conn.execute("PRAGMA page_count").fetchone()[0]
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        # one-off: switching to incremental mode needs a full VACUUM
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    else:
+        conn.execute("PRAGMA incremental_vacuum")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    after = conn.execute("PRAGMA page_count").fetchone()[0]
+    return before, after
+
+
+def _write_tmp_csv(path: str, rows, header) -> str:
+    """Writes a replacement for path next to it (unique name); _replace() it into place afterwards."""
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                    dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if header:
+                writer.writerow(header)
+            writer.writerows(rows)
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path
+
+
+def _read_snapshot(path: str) -> Tuple[str, int]:
+    """The file's text and its size in bytes at the time it was read."""
+    with open(path, "rb") as f:
+        data = f.read()
+    return data.decode("utf-8"), len(data)
+
+
+def _replace(tmp_path: str, path: str, read_size: int) -> None:
+    """
+    Swaps tmp_path in for path, first carrying over rows another process
+    appended after path was read (read_size bytes).
+    """
+    with open(path, "rb") as src:
+        src.seek(read_size)
+        tail = src.read()
+    if tail:
+        with open(tmp_path, "ab") as dst:
+            dst.write(tail)
+    os.replace(tmp_path, path)
+
+
+def compact_evaluation_csv(path: str, cutoff: str, archive_dir: Optional[Path]) -> int:
+    """Moves rows older than cutoff from the CSV log into its daily rollup file."""
+    if not os.path.exists(path):
+        return 0
+    # rows the log writer still holds are written first; new appends wait for the swap
+    with get_writer().csv_paused():
+        return _compact_evaluation_csv(path, cutoff, archive_dir)
+
+
+def _compact_evaluation_csv(path: str, cutoff: str, archive_dir: Optional[Path]) -> int:
+    text, read_size = _read_snapshot(path)
+
+    # rollup: (day, topic, final_decision, revision_cycles) -> runs
+    rollup_file = rollup_path(path)
+    rollup: Dict[Tuple[str, str, str, int], int] = {}
+    if os.path.exists(rollup_file):
+        with open(rollup_file, "r", newline="", encoding="utf-8") as f:
+            for r in csv.DictReader(f):
+                key = (r["day"], r["topic"], r["final_decision"], int(r["revision_cycles"]))
+                rollup[key] = rollup.get(key, 0) + int(r["runs"])
+
+    keep, moved = [], 0
+    archive = _archive_file(archive_dir, Path(path).stem + "-csv")
+    archive_f = gzip.open(archive, "wt", newline="", encoding="utf-8") if archive else None
+    try:
+        with io.StringIO(text, newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, None) or []
+            if archive_f:
+                archive_writer = csv.writer(archive_f)
+                archive_writer.writerow(header)
+            i_ts, i_topic = header.index("timestamp"), header.index("topic")
+            i_decision, i_cycles = header.index("final_decision"), header.index("revision_cycles")
+            for row in reader:
+                if len(row) < len(header) or row[i_ts] >= cutoff:
+                    keep.append(row)
+                    continue
+                try:
+                    cycles = int(row[i_cycles])
+                except ValueError:
+                    cycles = 0
+                key = (row[i_ts][:10], row[i_topic], row[i_decision], cycles)
+                rollup[key] = rollup.get(key, 0) + 1
+                if archive_f:
+                    archive_writer.writerow(row)
+                moved += 1
+    finally:
+        if archive_f:
+            archive_f.close()
+    if archive and not moved:
+        archive.unlink()
+    if not moved:
+        return 0
+
+    # both files are fully written before either is swapped in, which keeps the
+    # window where the old rows exist in both (and count twice) to two renames
+    rollup_tmp = _write_tmp_csv(rollup_file, ([*k, v] for k, v in sorted(rollup.items())),
+                                ["day", "topic", "final_decision", "revision_cycles", "runs"])
+    log_tmp = _write_tmp_csv(path, keep, header)
+    os.replace(rollup_tmp, rollup_file)
+    _replace(log_tmp, path, read_size)
+    return moved
+
+
+def compact_feedback_memory(path: str, cutoff: str, archive_dir: Optional[Path]) -> int:
+    """Drops (and archives) style feedback older than cutoff from feedback_memory.csv."""
+    if not os.path.exists(path):
+        return 0
+    with get_writer().csv_paused():
+        return _compact_feedback_memory(path, cutoff, archive_dir)
+
+
+def _compact_feedback_memory(path: str, cutoff: str, archive_dir: Optional[Path]) -> int:
+    text, read_size = _read_snapshot(path)
+    with io.StringIO(text, newline="") as f:
+        rows = list(csv.reader(f))
+    header = rows.pop(0) if rows and rows[0] == FEEDBACK_HEADER else None
+
+    keep = [r for r in rows if len(r) < 3 or r[2] >= cutoff]
+    old = [r for r in rows if len(r) >= 3 and r[2] < cutoff]
+    if not old:
+        return 0
+
+    archive = _archive_file(archive_dir, Path(path).stem + "-csv")
+    if archive:
+        with gzip.open(archive, "wt", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows(old)
+    _replace(_write_tmp_csv(path, keep, header), path, read_size)
+    return len(old)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roll up, archive and trim old evaluation / feedback logs.")
+    parser.add_argument("--days", type=int, default=90, help="keep raw rows for this many days (default: 90)")
+    parser.add_argument("--archive-dir", default="archive", help="where compressed raw rows go (default: archive/)")
+    parser.add_argument("--no-archive", action="store_true", help="delete old raw rows without archiving them")
+    parser.add_argument("--evaluation-csv", default="evaluation_log.csv")
+    parser.add_argument("--feedback-csv", default=FEEDBACK_FILE)
+    parser.add_argument("--skip-csv", action="store_true", help="only maintain the SQLite database")
+    args = parser.parse_args()
+
+    cutoff = (date.today() - timedelta(days=args.days)).isoformat()
+    archive_dir = None if args.no_archive else Path(args.archive_dir)
+
+    init_db()
+    moved = rollup_sqlite(cutoff, archive_dir)
+    before, after = vacuum()
+    print(f"=== Log maintenance (raw rows before {cutoff}) ===")
+    print(f"evaluation_log: {moved['evaluation_log']} rows rolled up")
+    print(f"feedback_log: {moved['feedback_log']} rows rolled up")
+    print(f"memo_system.db: {before} -> {after} pages")
+
+    if not args.skip_csv:
+        print(f"{args.evaluation_csv}: {compact_evaluation_csv(args.evaluation_csv, cutoff, archive_dir)} rows rolled up")
+        print(f"{args.feedback_csv}: {compact_feedback_memory(args.feedback_csv, cutoff, archive_dir)} rows archived")
+
+
+if __name__ == "__main__":
+    main()
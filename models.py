@@ -1,14 +1,14 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import List, Optional, Literal
 
 
-@dataclass
+@dataclass(slots=True)
 class DataPoint:
     text: str
     source: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class AnalystOutput:
     topic: str
     data_points: List[DataPoint]
@@ -21,6 +21,7 @@ class DraftInput:
     edit_request: Optional[str]
     version: int
     grounded: bool  # NEW: whether we found dataset evidence
+    previous_draft: Optional[str] = None  # body of the version being revised (incremental revisions)
 
 
 @dataclass
@@ -30,6 +31,14 @@ class DraftOutput:
     version: int
 
 
+@dataclass
+class MemoSections:
+    """The variable parts of a memo; headers, greeting and closing come from the template."""
+    subject: str = ""
+    paragraphs: List[str] = field(default_factory=list)
+    action_items: List[str] = field(default_factory=list)
+
+
 ApprovalDecision = Literal["approve", "edit_request"]
 
 
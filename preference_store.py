@@ -1,63 +1,118 @@
 # preference_store.py
 
-from collections import Counter
-from typing import Dict, Any
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
 
 from database import get_connection
 
+# Counters kept in the preference_counts table
+PREFERENCE_COUNTERS = ["too_long", "too_short", "more_professional"]
+
+
+def classify_feedback(feedback_text: str | None) -> List[str]:
+    """Which preference counters a piece of free-text feedback increments."""
+    text = (feedback_text or "").lower()
+    if not text.strip():
+        return []
+
+    counters = []
+
+    # Length hints
+    if any(p in text for p in ["too long", "very long", "shorter"]):
+        counters.append("too_long")
+    if any(p in text for p in ["too short", "longer", "more detail"]):
+        counters.append("too_short")
+
+    # Tone hints
+    if any(p in text for p in ["more professional", "professional tone", "more formal"]):
+        counters.append("more_professional")
+
+    return counters
+
+
+PREFERENCE_UPSERT_SQL = """
+    INSERT INTO preference_counts (name, count) VALUES (?, 1)
+    ON CONFLICT(name) DO UPDATE SET count = count + 1
+"""
+
+
+def increment_preference_counts(cur, feedback_text: str | None) -> None:
+    """Bumps the aggregate counters for one feedback row (call inside the insert's transaction)."""
+    for name in classify_feedback(feedback_text):
+        cur.execute(PREFERENCE_UPSERT_SQL, (name,))
+
+
+def backfill_preference_counts(cur) -> None:
+    """One-off rebuild of preference_counts from the whole feedback_log."""
+    cur.execute("DELETE FROM preference_counts")
+    cur.execute("SELECT feedback_text FROM feedback_log")
+    for row in cur.fetchall():
+        increment_preference_counts(cur, row["feedback_text"])
+
+
+# Process-wide snapshot shared by every PreferenceStore (drafting, Streamlit sidebar).
+# _version is bumped by FeedbackLoggerSQL writes in this process; the TTL covers
+# writes made by other processes.
+_snapshot_lock = threading.Lock()
+_snapshot: Optional[Tuple[int, float, Dict[str, Any]]] = None  # (version, loaded_at, prefs)
+_version = 0
+
+
+def invalidate_preferences() -> None:
+    """Marks the cached preference snapshot as stale (called after feedback is written)."""
+    global _version
+    with _snapshot_lock:
+        _version += 1
+
 
 class PreferenceStore:
     """
-    Reads feedback_log table in SQLite and extracts SIMPLE global preferences like:
+    Reads SIMPLE global preferences learned from feedback_log, like:
       - prefer_short
       - prefer_long
       - prefer_more_professional
+
+    NEW:
+    - Reads the small preference_counts aggregate table (kept up to date by
+      FeedbackLoggerSQL at insert time) instead of scanning all feedback.
+    - The result is cached for the whole process until new feedback is logged
+      or ttl_seconds pass, so most drafts do no preference I/O at all.
     """
 
-    def _load_rows(self) -> list[dict]:
+    def __init__(self, ttl_seconds: float = 60.0):
+        self.ttl_seconds = ttl_seconds
+
+    def _load_counts(self) -> Dict[str, int]:
         conn = get_connection()
         cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT rating_1_to_5, feedback_text
-            FROM feedback_log
-            """
-        )
-        rows = []
+        cur.execute("SELECT name, count FROM preference_counts")
+        counts = {name: 0 for name in PREFERENCE_COUNTERS}
         for row in cur.fetchall():
-            rows.append({
-                "rating_1_to_5": row["rating_1_to_5"],
-                "feedback_text": row["feedback_text"] or "",
-            })
-        conn.close()
-        return rows
-
-    def get_global_preferences(self) -> Dict[str, Any]:
-        rows = self._load_rows()
-        if not rows:
-            return {
-                "prefer_short": False,
-                "prefer_long": False,
-                "prefer_more_professional": False,
-            }
-
-        counts = Counter()
-
-        for row in rows:
-            text = (row["feedback_text"] or "").lower()
-
-            if not text.strip():
-                continue
-
-            # Length hints
-            if any(p in text for p in ["too long", "very long", "shorter"]):
-                counts["too_long"] += 1
-            if any(p in text for p in ["too short", "longer", "more detail"]):
-                counts["too_short"] += 1
-
-            # Tone hints
-            if any(p in text for p in ["more professional", "professional tone", "more formal"]):
-                counts["more_professional"] += 1
+            counts[row["name"]] = row["count"]
+        return counts
+
+    def get_counts(self) -> Dict[str, int]:
+        """The raw preference_counts totals (not cached; e.g. as a prior for speculation)."""
+        return self._load_counts()
+
+    def get_global_preferences(self, fresh: bool = False) -> Dict[str, Any]:
+        global _snapshot
+        with _snapshot_lock:
+            version = _version
+            snapshot = _snapshot
+        if (not fresh and snapshot is not None and snapshot[0] == version
+                and time.monotonic() - snapshot[1] < self.ttl_seconds):
+            return dict(snapshot[2])
+
+        prefs = self._compute_preferences()
+        with _snapshot_lock:
+            # a write that landed while loading leaves the version bumped -> reloaded next time
+            _snapshot = (version, time.monotonic(), prefs)
+        return dict(prefs)
+
+    def _compute_preferences(self) -> Dict[str, Any]:
+        counts = self._load_counts()
 
         prefer_short = counts["too_long"] > counts["too_short"]
         prefer_long = counts["too_short"] > counts["too_long"]
@@ -0,0 +1,286 @@
+# speculation.py
+
+import csv
+import os
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from drafting_agent import SECTION_PATTERNS, DraftingAgent
+from feedback_logger import FEEDBACK_FILE
+from models import DraftInput, DraftOutput
+from preference_store import PreferenceStore, classify_feedback
+
+# The revisions users ask for most (see feedback_memory.csv / preference_counts),
+# keyed by the preference counter classify_feedback() maps them to.
+CANDIDATE_EDITS = {
+    "too_long": "Make it shorter.",
+    "too_short": "Make it longer.",
+    "more_professional": "Use a more professional tone.",
+}
+
+# An actual request "matches" a speculated one when it classifies to the same
+# single category and is short enough not to carry other instructions. It must
+# be about the whole memo (no named section) and not negated ("not shorter").
+MAX_MATCH_WORDS = 8
+_NEGATION_RE = re.compile(r"(?i)\b(not|no|never|without)\b|n['’]t\b")
+_PART_RE = re.compile(r"(?i)\b(paragraph|section|sentence)s?\b")
+
+# One process-wide worker: speculation never competes with itself for the model
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, float] = {
+    "started": 0, "completed": 0, "paused": 0, "hits": 0, "misses": 0, "wasted": 0,
+    "wasted_seconds": 0.0, "used_seconds": 0.0,
+}
+
+# Real (user-facing) work running anywhere in the process, e.g. other Streamlit
+# sessions' jobs. Speculation yields the model to it and starts over when idle.
+_busy = 0
+_busy_cond = threading.Condition()
+
+# path -> ((mtime_ns, size), prior): feedback_memory.csv is re-read only when it changes
+_prior_lock = threading.Lock()
+_priors: Dict[str, Tuple[Tuple[int, int], Dict[str, float]]] = {}
+
+_PAUSED = object()
+
+
+def _shared_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="speculate")
+    return _executor
+
+
+def _count(**deltas) -> None:
+    with _stats_lock:
+        for name, delta in deltas.items():
+            _stats[name] += delta
+
+
+@contextmanager
+def foreground() -> Iterator[None]:
+    """Marks real work (a draft or revision someone is waiting for) while the block runs."""
+    global _busy
+    with _busy_cond:
+        _busy += 1
+    try:
+        yield
+    finally:
+        with _busy_cond:
+            _busy -= 1
+            _busy_cond.notify_all()
+
+
+def _wake() -> None:
+    with _busy_cond:
+        _busy_cond.notify_all()
+
+
+def edit_history_prior(path: str = FEEDBACK_FILE) -> Dict[str, float]:
+    """
+    Share of each candidate edit among the style edits recorded in
+    feedback_memory.csv (topic, feedback_text, created_at). Empty when there
+    is no history yet.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return {}
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _prior_lock:
+        cached = _priors.get(path)
+    if cached is not None and cached[0] == stamp:
+        return dict(cached[1])
+
+    counts: Counter = Counter()
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if len(row) >= 2 and row[:2] != ["topic", "feedback_text"]:
+                counts.update(c for c in classify_feedback(row[1]) if c in CANDIDATE_EDITS)
+    total = sum(counts.values())
+    prior = {c: n / total for c, n in counts.items()} if total else {}
+    with _prior_lock:
+        _priors[path] = (stamp, prior)
+    return dict(prior)
+
+
+def speculation_stats() -> Dict[str, Any]:
+    """
+    Process-wide counters: hits / misses over style edits, speculations that
+    were never used (wasted) and the model time spent on them.
+    """
+    with _stats_lock:
+        stats: Dict[str, Any] = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    spent = stats["wasted_seconds"] + stats["used_seconds"]
+    stats["wasted_ratio"] = stats["wasted_seconds"] / spent if spent else 0.0
+    return stats
+
+
+class _Speculation:
+    def __init__(self, category: str, draft_input: DraftInput):
+        self.category = category
+        self.draft_input = draft_input
+        self.cancel = threading.Event()
+        self.claimed = False  # take() is waiting for it: it is real work now
+        self.seconds = 0.0
+        self.future: Optional[Future] = None
+
+
+class RevisionSpeculator:
+    """
+    Opt-in speculative revisions for one memo session.
+
+    After version N is shown, speculate() drafts the most likely next edits
+    (from this session's edits so far + the recorded edit history) on a
+    single background worker. take() serves a finished (or nearly finished)
+    speculation when the user's real request matches one; every other
+    speculation is cancelled right away, which closes its LLM stream so the
+    real request gets the model. While any foreground() work runs in the
+    process, unclaimed speculations close their stream and wait.
+    """
+
+    def __init__(self, drafter: DraftingAgent, max_candidates: int = 2,
+                 pref_store: Optional[PreferenceStore] = None, feedback_csv: str = FEEDBACK_FILE):
+        self.drafter = drafter
+        self.max_candidates = max_candidates
+        self.pref_store = pref_store or PreferenceStore()
+        self.feedback_csv = feedback_csv
+        self.history: List[str] = []  # this session's edit requests
+        self._pending: List[_Speculation] = []
+        self._lock = threading.Lock()  # speculate() and take() may run on different threads
+
+    def predict(self) -> List[str]:
+        """
+        Most probable next edit requests, best first: the recorded edit
+        history (or, without one, the preference_counts totals) as the prior,
+        outweighed by this session's own edits.
+        """
+        scores: Counter = Counter({c: 0.0 for c in CANDIDATE_EDITS})
+        prior = edit_history_prior(self.feedback_csv)
+        if not prior:
+            counts = {c: n for c, n in self.pref_store.get_counts().items() if c in CANDIDATE_EDITS}
+            total = sum(counts.values())
+            prior = {c: n / total for c, n in counts.items()} if total else {}
+        scores.update(prior)
+        for request in self.history:
+            for category in classify_feedback(request):
+                scores[category] += 2.0
+
+        return [CANDIDATE_EDITS[c] for c, _ in scores.most_common(self.max_candidates)]
+
+    def speculate(self, shown: DraftInput, preferences: Optional[Dict[str, Any]] = None) -> None:
+        """Starts drafting likely revisions of the version that was just shown."""
+        self.discard()
+        for request in self.predict():
+            (category,) = classify_feedback(request)
+            spec = _Speculation(category, DraftInput(
+                topic=shown.topic,
+                data_points=shown.data_points,
+                edit_request=request,
+                version=shown.version + 1,
+                grounded=shown.grounded,
+            ))
+            # asking for the edit that produced the shown version again wants a new sample
+            use_cache = request != shown.edit_request
+            spec.future = _shared_executor().submit(self._generate, spec, preferences, use_cache)
+            with self._lock:
+                self._pending.append(spec)
+            _count(started=1)
+
+    def _generate(self, spec: _Speculation, preferences: Optional[Dict[str, Any]],
+                  use_cache: bool = True) -> Optional[DraftOutput]:
+        while True:
+            with _busy_cond:
+                _busy_cond.wait_for(lambda: spec.cancel.is_set() or spec.claimed or not _busy)
+            if spec.cancel.is_set():
+                return None
+            result = self._attempt(spec, preferences, use_cache)
+            if result is not _PAUSED:
+                return result
+            _count(paused=1)
+
+    def _attempt(self, spec: _Speculation, preferences: Optional[Dict[str, Any]], use_cache: bool):
+        """One generation; closed early (returns _PAUSED) when real work starts."""
+        started = time.perf_counter()
+        pieces = self.drafter.stream(spec.draft_input, preferences, use_cache=use_cache)
+        try:
+            while True:
+                if spec.cancel.is_set():
+                    return None
+                if _busy and not spec.claimed:
+                    return _PAUSED
+                next(pieces)
+        except StopIteration as done:
+            _count(completed=1)
+            return done.value
+        finally:
+            pieces.close()
+            spec.seconds += time.perf_counter() - started
+
+    def _match(self, edit_request: str, version: int) -> Optional[_Speculation]:
+        categories = classify_feedback(edit_request)
+        if len(categories) != 1 or len(edit_request.split()) > MAX_MATCH_WORDS:
+            return None
+        if _NEGATION_RE.search(edit_request) or _PART_RE.search(edit_request):
+            return None
+        if any(pattern.search(edit_request) for _, pattern in SECTION_PATTERNS):
+            return None
+        for spec in self._pending:
+            if spec.category == categories[0] and spec.draft_input.version == version:
+                return spec
+        return None
+
+    def take(self, edit_request: str, version: int) -> Optional[DraftOutput]:
+        """
+        The speculated draft for this (style) edit request, or None.
+        Waits for a matching speculation that is running or paused: it has a
+        head start on a fresh generation. One still queued has none and is
+        dropped, so the caller never waits on the shared worker.
+        """
+        with self._lock:
+            self.history.append(edit_request)
+            spec = self._match(edit_request, version)
+            if spec is not None:
+                self._pending.remove(spec)
+                if spec.future.cancel():
+                    _count(wasted=1)
+                    spec = None
+                else:
+                    spec.claimed = True
+        self.discard()  # first, so the match does not queue behind a wrong guess
+        _wake()
+
+        result = None
+        if spec is not None:
+            try:
+                result = spec.future.result()
+            except Exception:
+                result = None  # the speculative generation failed: draft normally
+        if result is None:
+            _count(misses=1)
+            return None
+        _count(hits=1, used_seconds=spec.seconds)
+        return result
+
+    def discard(self) -> None:
+        """Cancels all outstanding speculations (e.g. the memo was approved)."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for spec in pending:
+            spec.cancel.set()
+            spec.future.cancel()
+        _wake()
+        for spec in pending:
+            spec.future.add_done_callback(lambda _, s=spec: _count(wasted=1, wasted_seconds=s.seconds))
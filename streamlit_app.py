@@ -1,17 +1,19 @@
 import re
-import os
-import csv
+import time
 from datetime import datetime, timezone
 
 import streamlit as st
 
 from analyst_agent import AnalystAgent
-from drafting_agent import DraftingAgent
+from drafting_agent import DraftConversation, DraftingAgent
 from models import DraftInput, DataPoint
 
 from database import init_db
-from feedback_logger import FeedbackLoggerSQL
+from feedback_logger import FEEDBACK_FILE, FEEDBACK_HEADER, FeedbackLoggerSQL
+from jobs import Job, JobManager
+from log_writer import get_writer
 from preference_store import PreferenceStore
+from speculation import RevisionSpeculator, foreground, speculation_stats
 
 # -----------------------------
 # Init DB (SQLite)
@@ -21,7 +23,7 @@ init_db()
 # -----------------------------
 # Local constants
 # -----------------------------
-FEEDBACK_FILE = "feedback_memory.csv"
+JOB_POLL_SECONDS = 0.5  # how often a page with a running job refreshes
 
 # -----------------------------
 # Helpers (UI-safe)
@@ -72,12 +74,11 @@ def store_style_feedback_csv(topic: str, edit_request: str) -> None:
     """Store human style edits into feedback_memory.csv (topic, feedback_text, created_at)."""
     if not edit_request:
         return
-    file_exists = os.path.exists(FEEDBACK_FILE)
-    with open(FEEDBACK_FILE, "a", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        if not file_exists:
-            w.writerow(["topic", "feedback_text", "created_at"])
-        w.writerow([topic, edit_request, datetime.now(timezone.utc).isoformat()])
+    get_writer().submit_csv(
+        FEEDBACK_FILE,
+        FEEDBACK_HEADER,
+        [topic, edit_request, datetime.now(timezone.utc).isoformat()],
+    )
 
 
 def get_revision_cycles() -> int:
@@ -85,10 +86,6 @@ def get_revision_cycles() -> int:
     return max(0, st.session_state.version - 1)
 
 
-def set_busy(flag: bool) -> None:
-    st.session_state.is_busy = flag
-
-
 # -----------------------------
 # Streamlit App
 # -----------------------------
@@ -97,14 +94,72 @@ st.set_page_config(page_title="Business Memo Emailing Crew", layout="wide")
 st.sidebar.subheader("Learned preferences")
 st.sidebar.json(PreferenceStore().get_global_preferences())
 
+st.sidebar.subheader("Speculative revisions")
+speculative = st.sidebar.checkbox(
+    "Pre-draft likely edits in the background",
+    value=False,
+    help="While you read a draft, the most likely next edits (shorter, more formal, ...) "
+         "are drafted ahead of time and shown instantly if you ask for one of them.",
+)
+if speculative:
+    st.sidebar.json(speculation_stats())
+
+conversational = st.sidebar.checkbox(
+    "Conversational revisions",
+    value=False,
+    help="Revisions are sent as a short follow-up in the same model chat "
+         "(edit request only), instead of the full prompt with all data points.",
+)
+
+structured = st.sidebar.checkbox(
+    "Structured output",
+    value=False,
+    help="The model writes only the subject, paragraphs and action items; "
+         "headers, greeting and closing come from the memo template.",
+)
+
+incremental = st.sidebar.checkbox(
+    "Incremental revisions",
+    value=False,
+    help="Edits aimed at one part of the memo (subject, a paragraph, the action items) "
+         "only rewrite that part; the rest of the current draft is kept as is.",
+)
+
+use_cache = st.sidebar.checkbox(
+    "Reuse cached responses",
+    value=True,
+    help="Identical revision prompts are answered from the LLM response cache. First drafts, "
+         "regenerating a draft or repeating the same edit always sample a new text; untick to "
+         "never use the cache.",
+)
+
 st.title("Business Memo Emailing Crew")
 st.caption("Analyst → Drafting → Human-in-the-loop approval (Streamlit UI)")
 
-# Init agents (kept in session for speed)
-if "analyst" not in st.session_state:
-    st.session_state.analyst = AnalystAgent()
-if "drafter" not in st.session_state:
-    st.session_state.drafter = DraftingAgent()
+# Agents are process-wide shared resources: the case index and the LLM client
+# (connection pool, response cache) are loaded once and reused by every
+# session, so per-session state below stays small.
+@st.cache_resource(show_spinner="Loading case index...")
+def shared_analyst() -> AnalystAgent:
+    analyst = AnalystAgent()
+    _ = analyst.index  # load now, not inside the first user's request
+    return analyst
+
+
+@st.cache_resource
+def shared_drafter(structured: bool = False, use_cache: bool = True) -> DraftingAgent:
+    return DraftingAgent(structured=structured, use_cache=use_cache)
+
+
+@st.cache_resource
+def shared_jobs() -> JobManager:
+    # retrieval + generation run here, not in the Streamlit script thread
+    return JobManager(max_workers=4)
+
+
+analyst = shared_analyst()
+drafter = shared_drafter(structured, use_cache)
+jobs = shared_jobs()
 
 # Session state for workflow
 defaults = {
@@ -115,7 +170,10 @@ defaults = {
     "current_draft": "",
     "approved": False,
     "history": [],       # list of dicts: {version, edit_request, draft}
-    "is_busy": False,    # disable buttons while generating
+    "job_id": None,      # running generation (also kept in the URL, see below)
+    "job_notice": None,  # message about the last job that failed / was cancelled
+    "speculator": None,  # RevisionSpeculator, created when speculative mode is on
+    "conversation": None,  # DraftConversation, created when conversational mode is on
 }
 for k, v in defaults.items():
     if k not in st.session_state:
@@ -130,29 +188,141 @@ def reset_run(new_topic: str):
     st.session_state.current_draft = ""
     st.session_state.approved = False
     st.session_state.history = []
-    st.session_state.is_busy = False
-
+    if st.session_state.speculator is not None:
+        st.session_state.speculator.discard()
+    if st.session_state.conversation is not None:
+        st.session_state.conversation.reset()
 
-def run_draft(edit_request: str | None):
-    st.session_state.version += 1
 
+# -----------------------------
+# Background jobs (run on the JobManager pool: no st.* calls in here)
+# -----------------------------
+def draft_job(job: Job, topic: str, points: list[DataPoint], edit_request: str | None, version: int,
+              conversation: DraftConversation | None = None, previous_draft: str | None = None,
+              fresh: bool = False) -> dict:
+    """
+    Writes one version; the text so far is visible as job.partial while it streams.
+    fresh: bypass the response cache (the user asked for a new sample of a prompt already answered).
+    """
+    job.set_stage("DraftingAgent: writing memo..." if edit_request is None else "DraftingAgent: revising memo...")
     draft_input = DraftInput(
-        topic=st.session_state.topic,
-        data_points=st.session_state.data_points,
+        topic=topic,
+        data_points=points,
         edit_request=edit_request,
-        version=st.session_state.version,
-        grounded=bool(st.session_state.data_points),
+        version=version,
+        grounded=bool(points),
+        previous_draft=previous_draft,
     )
+    body = job.stream_into(drafter.stream(draft_input, conversation=conversation, use_cache=not fresh))
+    return {"topic": topic, "data_points": points, "edit_request": edit_request, "version": version, "draft": body}
+
+
+def generate_job(job: Job, topic: str, version: int, conversation: DraftConversation | None = None,
+                 fresh: bool = False) -> dict:
+    with foreground():  # speculation in every session waits meanwhile
+        job.set_stage("AnalystAgent: retrieving evidence...")
+        points = analyst.run(topic).data_points
+        job.check_cancelled()
+        return draft_job(job, topic, points, None, version, conversation, fresh=fresh)
+
+
+def revise_job(job: Job, topic: str, points: list[DataPoint], edit_request: str, version: int,
+               speculator: RevisionSpeculator | None = None,
+               conversation: DraftConversation | None = None, previous_draft: str | None = None,
+               fresh: bool = False) -> dict:
+    with foreground():  # speculation in every session waits meanwhile
+        # Style edit that was drafted ahead of time: serve it
+        if speculator is not None and not is_missing_info_request(edit_request):
+            job.set_stage("Checking speculative drafts...")
+            speculated = speculator.take(edit_request, version)
+            if speculated is not None:
+                job.set_partial(speculated.body)
+                if conversation is not None:
+                    drafter.record_turn(DraftInput(topic=topic, data_points=points, edit_request=edit_request,
+                                                   version=version, grounded=bool(points)),
+                                        conversation, speculated.body)
+                return {"topic": topic, "data_points": points, "edit_request": edit_request,
+                        "version": version, "draft": speculated.body}
 
-    draft_output = st.session_state.drafter.run(draft_input)
-    st.session_state.current_draft = draft_output.body
+        # If missing-info request: rerun retrieval and merge new evidence
+        if is_missing_info_request(edit_request):
+            if speculator is not None:
+                speculator.discard()  # new evidence: speculated drafts are stale
+            job.set_stage("Missing-info detected: retrieving additional evidence...")
+            used_sources = get_used_sources(points)
+            query = f"{topic}. User request: {edit_request}"
+            analyst_out_2 = analyst.run(query, exclude_sources=used_sources)
+            points = merge_datapoints(points, analyst_out_2.data_points, limit=16)
+            job.check_cancelled()
+        return draft_job(job, topic, points, edit_request, version, conversation, previous_draft, fresh)
+
+
+def start_job(job: Job) -> None:
+    st.session_state.job_id = job.id
+    st.session_state.job_notice = None
+    st.query_params["job"] = job.id  # a browser refresh finds the job again
+
+
+def finish_job(job: Job | None) -> None:
+    """Copies a finished job's result into the session (runs in the script thread)."""
+    st.session_state.job_id = None
+    if "job" in st.query_params:
+        del st.query_params["job"]
+    if job is None:
+        return
+    if job.status == "failed":
+        st.session_state.job_notice = f"Generation failed: {job.error}"
+        return
+    if job.status == "cancelled":
+        st.session_state.job_notice = "Generation cancelled."
+        return
 
+    result = job.result
+    if st.session_state.topic != result["topic"]:
+        reset_run(result["topic"])  # session was lost (browser refresh) while the job ran
+    st.session_state.data_points = result["data_points"]
+    st.session_state.grounded = bool(result["data_points"])
+    st.session_state.version = result["version"]
+    st.session_state.current_draft = result["draft"]
     st.session_state.history.append({
-        "version": st.session_state.version,
-        "edit_request": edit_request,
-        "draft": draft_output.body,
+        "version": result["version"],
+        "edit_request": result["edit_request"],
+        "draft": result["draft"],
     })
 
+    if st.session_state.speculator is not None:
+        st.session_state.speculator.speculate(DraftInput(
+            topic=result["topic"],
+            data_points=result["data_points"],
+            edit_request=result["edit_request"],
+            version=result["version"],
+            grounded=bool(result["data_points"]),
+        ))
+
+
+if speculative and (st.session_state.speculator is None or st.session_state.speculator.drafter is not drafter):
+    if st.session_state.speculator is not None:
+        st.session_state.speculator.discard()  # drafted with the other prompt style
+    st.session_state.speculator = RevisionSpeculator(drafter)
+elif not speculative and st.session_state.speculator is not None:
+    st.session_state.speculator.discard()
+    st.session_state.speculator = None
+
+if conversational and st.session_state.conversation is None:
+    st.session_state.conversation = DraftConversation()
+elif not conversational:
+    st.session_state.conversation = None
+
+# Pick up a job started before a browser refresh
+if st.session_state.job_id is None and st.query_params.get("job"):
+    st.session_state.job_id = st.query_params.get("job")
+
+active_job = jobs.get(st.session_state.job_id)
+if st.session_state.job_id and (active_job is None or active_job.finished):
+    finish_job(active_job)  # done, failed, cancelled, or forgotten (expired / server restart)
+    active_job = None
+is_busy = active_job is not None  # disable buttons while generating
+
 
 left, right = st.columns([1.1, 1.4], gap="large")
 
@@ -163,7 +333,7 @@ with left:
         "Enter memo topic",
         value=st.session_state.topic,
         placeholder='e.g., "sales revenue from 2016"',
-        disabled=st.session_state.is_busy,
+        disabled=is_busy,
     )
 
     col_a, col_b = st.columns(2)
@@ -172,13 +342,13 @@ with left:
             "Generate draft (v1)",
             type="primary",
             use_container_width=True,
-            disabled=st.session_state.is_busy,
+            disabled=is_busy,
         )
     with col_b:
         reset_clicked = st.button(
             "Reset",
             use_container_width=True,
-            disabled=st.session_state.is_busy,
+            disabled=is_busy,
         )
 
     if reset_clicked:
@@ -190,7 +360,7 @@ with left:
 
     approve_clicked = st.button(
         "Approve ✅",
-        disabled=(not st.session_state.current_draft) or st.session_state.is_busy,
+        disabled=(not st.session_state.current_draft) or is_busy,
         use_container_width=True,
     )
 
@@ -199,11 +369,11 @@ with left:
             "Edit request",
             placeholder="e.g., Make it shorter. / Use a more formal tone. / Add missing KPIs.",
             height=110,
-            disabled=st.session_state.is_busy,
+            disabled=is_busy,
         )
         submit_edit = st.button(
             "Submit edit request",
-            disabled=(not st.session_state.current_draft) or st.session_state.is_busy,
+            disabled=(not st.session_state.current_draft) or is_busy,
             use_container_width=True,
         )
 
@@ -211,17 +381,17 @@ with left:
     st.subheader("3) Feedback (after approval)")
 
     if st.session_state.approved:
-        rating = st.slider("Rate this memo (1–5)", 1, 5, 4, disabled=st.session_state.is_busy)
+        rating = st.slider("Rate this memo (1–5)", 1, 5, 4, disabled=is_busy)
         fb_text = st.text_area(
             "Optional feedback (tone / length / clarity)",
             placeholder="e.g., Too long, make it more formal, improve action items...",
-            disabled=st.session_state.is_busy,
+            disabled=is_busy,
         )
 
         save_feedback = st.button(
             "Save feedback ⭐",
             use_container_width=True,
-            disabled=st.session_state.is_busy,
+            disabled=is_busy,
         )
 
         if save_feedback:
@@ -239,14 +409,27 @@ with left:
 with right:
     st.subheader("Draft output")
 
-    if st.session_state.current_draft:
-        st.text_area(
+    if st.session_state.job_notice:
+        st.warning(st.session_state.job_notice)
+
+    # Placeholder, so a draft being generated can be streamed into the same spot
+    draft_slot = st.empty()
+    if active_job is not None:
+        if active_job.partial:
+            draft_slot.text(active_job.partial + " ▌")
+        else:
+            draft_slot.info(active_job.stage)
+        if st.button("Cancel generation ✖", use_container_width=True):
+            jobs.cancel(active_job.id)
+            st.rerun()
+    elif st.session_state.current_draft:
+        draft_slot.text_area(
             "Memo (what you would send)",
             value=st.session_state.current_draft,
             height=420,
         )
     else:
-        st.info("Generate a draft to see the memo here.")
+        draft_slot.info("Generate a draft to see the memo here.")
 
     # Optional: show internal evidence, but clearly labeled as NOT part of memo
     with st.expander("Internal evidence (NOT included in the memo)", expanded=False):
@@ -280,19 +463,11 @@ if generate_clicked:
         if st.session_state.topic != new_topic:
             reset_run(new_topic)
 
-        set_busy(True)
-        try:
-            with st.spinner("AnalystAgent: retrieving evidence..."):
-                analyst_out = st.session_state.analyst.run(st.session_state.topic)
-                st.session_state.data_points = analyst_out.data_points
-                st.session_state.grounded = bool(st.session_state.data_points)
-
-            with st.spinner("DraftingAgent: writing memo..."):
-                run_draft(edit_request=None)
-
-        finally:
-            set_busy(False)
-
+        # the cache is shared by every session: a new session (or "Generate draft" again)
+        # wants its own first draft, not the one another run got for the same topic
+        start_job(jobs.submit("generate", generate_job, st.session_state.topic,
+                              st.session_state.version + 1, st.session_state.conversation,
+                              fresh=True, meta={"topic": st.session_state.topic}))
         st.rerun()
 
 
@@ -301,32 +476,29 @@ if submit_edit:
     if not req:
         req = "Please improve clarity and conciseness."
 
-    set_busy(True)
-    try:
-        # If missing-info request: rerun retrieval and merge new evidence
-        if is_missing_info_request(req):
-            with st.spinner("Missing-info detected: retrieving additional evidence..."):
-                used_sources = get_used_sources(st.session_state.data_points)
-                query = f"{st.session_state.topic}. User request: {req}"
-                analyst_out_2 = st.session_state.analyst.run(query, exclude_sources=used_sources)
-                st.session_state.data_points = merge_datapoints(
-                    st.session_state.data_points,
-                    analyst_out_2.data_points,
-                    limit=16
-                )
-        else:
-            # Style edits get stored for your "memory" CSV
-            store_style_feedback_csv(st.session_state.topic, req)
-
-        with st.spinner("DraftingAgent: revising memo..."):
-            run_draft(edit_request=req)
-
-    finally:
-        set_busy(False)
-
+    if not is_missing_info_request(req):
+        # Style edits get stored for your "memory" CSV
+        store_style_feedback_csv(st.session_state.topic, req)
+
+    history = st.session_state.history
+    start_job(jobs.submit("revise", revise_job, st.session_state.topic, list(st.session_state.data_points),
+                          req, st.session_state.version + 1, st.session_state.speculator,
+                          st.session_state.conversation,
+                          st.session_state.current_draft if incremental else None,
+                          fresh=bool(history) and history[-1]["edit_request"] == req,  # same edit again
+                          meta={"topic": st.session_state.topic}))
     st.rerun()
 
 
 if approve_clicked:
     st.session_state.approved = True
+    if st.session_state.speculator is not None:
+        st.session_state.speculator.discard()
     st.success("✅ Memo approved!")
+
+
+# While a job runs, refresh the page to show its progress (the work itself
+# happens on the job pool, so this script run finishes right away)
+if active_job is not None:
+    time.sleep(JOB_POLL_SECONDS)
+    st.rerun()
@@ -0,0 +1,144 @@
+import json
+import threading
+import time
+
+import pytest
+
+from analytics import approval_summary, revision_cycle_distribution, topic_stats
+from analyze_evaluation import summarize
+from batch_memo import BatchMemoRunner, percentile, read_topics
+from log_writer import get_writer
+from models import AnalystOutput, DataPoint, DraftOutput
+
+
+def test_batch_runs_are_left_out_of_run_reports(temp_db):
+    with temp_db:
+        temp_db.executemany(
+            "INSERT INTO evaluation_log (timestamp, topic, revision_cycles, final_decision) VALUES (?, ?, ?, ?)",
+            [("2026-10-01T10:00:00", "q3", 2, "approve"),
+             ("2026-10-01T11:00:00", "q3", 4, "max_cycles_reached"),
+             ("2026-10-01T12:00:00", "q3", 0, "batch_generated"),
+             ("2026-10-01T12:00:01", "batch only", 0, "batch_error")])
+        temp_db.execute("INSERT INTO evaluation_daily (day, topic, final_decision, revision_cycles, runs) "
+                        "VALUES ('2025-01-01', 'q3', 'batch_generated', 0, 40)")
+
+    summary = approval_summary()
+    assert summary["total_runs"] == 2
+    assert summary["decisions"] == {"approve": 1, "max_cycles_reached": 1}
+    assert summary["approval_rate"] == 0.5 and summary["avg_revision_cycles"] == 3.0
+    assert revision_cycle_distribution() == {2: 1, 4: 1}
+    assert [t["topic"] for t in topic_stats()] == ["q3"]
+
+    rows = [("q3", "approve", 2, 1), ("q3", "batch_generated", 0, 40), ("q3", "batch_error", 0, 1)]
+    assert summarize(rows)["total_runs"] == 1
+
+
+def test_read_topics_jsonl_skips_and_records_bad_lines(tmp_path):
+    path = tmp_path / "topics.jsonl"
+    path.write_text("\n".join([
+        json.dumps({"topic": " Q3 churn "}),
+        json.dumps("plain string topic"),
+        json.dumps({"topic": 123}),
+        json.dumps({"topic": None}),
+        json.dumps({"other": "x"}),
+        "{not json",
+        "",
+        json.dumps({"topic": "   "}),
+        json.dumps({"topic": "last"}),
+    ]), encoding="utf-8")
+
+    errors = []
+    assert list(read_topics(str(path), errors)) == ["Q3 churn", "plain string topic", "last"]
+    assert [e["line"] for e in errors] == [3, 4, 5, 6]
+    assert "123" in errors[0]["error"] and "invalid JSON" in errors[3]["error"]
+    assert list(read_topics(str(path))) == ["Q3 churn", "plain string topic", "last"]  # errors optional
+
+
+def test_read_topics_csv(tmp_path):
+    path = tmp_path / "topics.csv"
+    path.write_text('topic,owner\n"Q3, churn",a\n,b\n  sales  ,c\n', encoding="utf-8")
+    assert list(read_topics(str(path))) == ["Q3, churn", "sales"]
+
+
+@pytest.mark.parametrize("pct, expected", [(0, 1), (50, 5), (90, 9), (95, 10), (100, 10)])
+def test_percentile_nearest_rank(pct, expected):
+    assert percentile([7, 3, 10, 1, 5, 9, 2, 8, 4, 6], pct) == expected
+
+
+def test_percentile_edge_cases():
+    assert percentile([], 95) == 0.0
+    assert percentile([4.2], 50) == 4.2
+    assert percentile([1, 2], 50) == 1
+
+
+class Gauge:
+    """Tracks how many callers are inside at once."""
+
+    def __init__(self):
+        self.now = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        with self.lock:
+            self.now += 1
+            self.peak = max(self.peak, self.now)
+
+    def __exit__(self, *exc):
+        with self.lock:
+            self.now -= 1
+
+
+class FakeAnalyst:
+    index = None
+
+    def __init__(self):
+        self.gauge = Gauge()
+
+    def run(self, topic):
+        with self.gauge:
+            time.sleep(0.005)
+        if topic == "boom":
+            raise RuntimeError("retrieval failed")
+        return AnalystOutput(topic, [DataPoint(f"{topic} figure", "CASE_1")])
+
+
+class FakeDrafter:
+    def __init__(self):
+        self.gauge = Gauge()
+
+    def run(self, draft_input):
+        with self.gauge:
+            time.sleep(0.01)
+        return DraftOutput(subject=draft_input.topic, body="body", version=1)
+
+
+def test_runner_bounds_llm_concurrency_and_in_flight_topics(temp_db, tmp_path):
+    analyst, drafter = FakeAnalyst(), FakeDrafter()
+    runner = BatchMemoRunner(workers=4, llm_concurrency=2, analyst=analyst, drafter=drafter)
+
+    topics = [f"topic {i}" for i in range(60)] + ["boom"]
+    out = tmp_path / "memos.jsonl"
+    read_ahead = []
+
+    def source():
+        for n, topic in enumerate(topics):
+            # topics taken from the input but not yet written to the output
+            with open(out, encoding="utf-8") as f:
+                read_ahead.append(n - sum(1 for _ in f))
+            yield topic
+
+    report = runner.run(source(), str(out))
+
+    assert report["memos"] == 61 and report["errors"] == 1
+    assert drafter.gauge.peak <= 2  # llm_concurrency
+    assert analyst.gauge.peak <= 4  # workers
+    assert max(read_ahead) <= 4 * 4  # at most workers * 4 topics in flight
+    results = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    assert sorted(r["topic"] for r in results) == sorted(topics)
+    assert report["p50_latency_s"] <= report["p95_latency_s"]
+
+    get_writer().flush()
+    decisions = dict(temp_db.execute("SELECT final_decision, COUNT(*) FROM evaluation_log GROUP BY 1").fetchall())
+    assert decisions == {"batch_generated": 60, "batch_error": 1}
+    assert approval_summary()["total_runs"] == 0
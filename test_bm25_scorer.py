@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip("scipy")
+
+from bm25_scorer import BM25Scorer  # noqa: E402
+from case_index import CaseIndex  # noqa: E402
+
+TOPICS = ["apple apple banana", "apple banana cherry date", "banana cherry", "cherry date elder fig"]
+
+# Hand-computed with k1 = 1.5, b = 0.75, N = 4, avgdl = 13 / 4:
+#   idf(apple)  = ln(1 + (4 - 2 + 0.5) / (2 + 0.5)) = ln 2        = 0.693147
+#   idf(banana) = ln(1 + (4 - 3 + 0.5) / (3 + 0.5)) = ln(10 / 7)  = 0.356675
+#   norm(dl)    = 1.5 * (0.25 + 0.75 * dl / 3.25)
+#   weight      = idf * tf * 2.5 / (tf + norm(dl))
+# CASE_0 (dl 3): 0.693147 * 2 * 2.5 / (2 + 1.413462) + 0.356675 * 2.5 / (1 + 1.413462) = 1.384777
+# CASE_1 (dl 4): (0.693147 + 0.356675) * 2.5 / (1 + 1.759615)                          = 0.951059
+# CASE_2 (dl 2): 0.356675 * 2.5 / (1 + 1.067308)                                         = 0.431328
+EXPECTED = [1.384777, 0.951059, 0.431328, 0.0]
+
+
+@pytest.fixture
+def scorer(tmp_path, write_cases):
+    path = write_cases(str(tmp_path / "cases.csv"),
+                       rows=[[f"CASE_{i}", topic, "", "", "", "", ""] for i, topic in enumerate(TOPICS)])
+    return BM25Scorer(CaseIndex.build(path))
+
+
+def test_scores_match_hand_computed_bm25(scorer):
+    scores = (scorer.matrix @ scorer._query_matrix(["apple banana"])).toarray()[:, 0]
+    assert list(scores) == pytest.approx(EXPECTED, abs=1e-5)
+
+
+def test_top_k_ranks_by_bm25(scorer):
+    assert scorer.top_k(["apple banana"], k=4, min_hits=1) == [[0, 1, 2]]
+    assert scorer.top_k(["apple banana"], k=2, min_hits=1) == [[0, 1]]
+    assert scorer.top_k(["apple banana"], k=4) == [[0, 1]]  # min_hits=2: CASE_2 only has banana
+    assert scorer.top_k(["apple banana"], k=4, exclude_sources={"CASE_0"}) == [[1]]
+    assert scorer.top_k(["apple banana", "elder fig"], k=1) == [[0], [3]]
@@ -0,0 +1,112 @@
+import asyncio
+import importlib
+
+import pytest
+
+from models import AnalystOutput, ApprovalOutput, DataPoint, DraftOutput
+
+
+class FakeAnalyst:
+    def __init__(self):
+        self.queries = []
+
+    def run(self, topic, exclude_sources=None):
+        self.queries.append(topic)
+        return AnalystOutput(topic, [DataPoint(f"figure {len(self.queries)}", f"CASE_{len(self.queries)}")])
+
+    async def arun(self, topic, exclude_sources=None):
+        return self.run(topic, exclude_sources)
+
+
+class FakeLLM:
+    async def awarm(self):
+        pass
+
+
+class FakeDrafter:
+    def __init__(self):
+        self.llm = FakeLLM()
+
+    def stream(self, draft_input, preferences=None, conversation=None, use_cache=True):
+        yield f"v{draft_input.version} "
+        yield "drafted"
+
+    def subject_for(self, draft_input):
+        return draft_input.topic
+
+    async def apreferences(self):
+        return {}
+
+
+class FakeApproval:
+    def __init__(self, *decisions):
+        self.decisions = list(decisions)
+        self.shown = []
+
+    def run_stream(self, subject, body_pieces):
+        self.shown.append("".join(body_pieces))
+        return self.decisions.pop(0)
+
+
+class FakeSpeculator:
+    def __init__(self, drafter):
+        self.speculated = []
+
+    def speculate(self, draft_input, preferences=None):
+        self.speculated.append(draft_input.version)
+
+    def take(self, edit_request, version):
+        return DraftOutput(subject="s", body=f"v{version} speculated", version=version)
+
+    def discard(self):
+        pass
+
+
+class FakeLogger:
+    def __init__(self):
+        self.logged = []
+
+    def log(self, **kwargs):
+        self.logged.append(kwargs)
+
+
+@pytest.fixture
+def system(temp_db, monkeypatch):
+    bms = importlib.import_module("business_memo_system")  # inits the DB on import: after temp_db
+    monkeypatch.setattr(bms, "AnalystAgent", FakeAnalyst)
+    monkeypatch.setattr(bms, "DraftingAgent", lambda **kwargs: FakeDrafter())
+    monkeypatch.setattr(bms, "ApprovalAgent", lambda: FakeApproval(
+        ApprovalOutput("edit_request", "make it shorter"),
+        ApprovalOutput("edit_request", "please add more data"),
+        ApprovalOutput("approve"),
+    ))
+    monkeypatch.setattr(bms, "EvaluationLogger", FakeLogger)
+    monkeypatch.setattr(bms, "RevisionSpeculator", FakeSpeculator)
+    feedback = []
+    monkeypatch.setattr(bms, "store_feedback", lambda topic, request: feedback.append(request))
+    s = bms.BusinessMemoSystem(speculative=True)
+    s.feedback = feedback
+    return s
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_run_and_arun_take_the_same_steps(system, use_async):
+    if use_async:
+        cycles = asyncio.run(system.arun("Q3 churn"))
+    else:
+        cycles = system.run("Q3 churn")
+
+    assert cycles == 2
+    # v2 is the speculated draft (arun speculates too); the missing-info request drafts v3 fresh
+    assert system.approval.shown == ["v1 drafted", "v2 speculated", "v3 drafted"]
+    assert system.feedback == ["make it shorter"]
+    assert system.analyst.queries == ["Q3 churn", "Q3 churn. User request: please add more data"]
+    assert system.logger.logged == [{"topic": "Q3 churn", "revision_cycles": 2,
+                                     "final_decision": "approve", "grounded": True}]
+
+
+def test_run_stops_after_max_revision_cycles(system):
+    assert system.run("Q3 churn", max_revision_cycles=1) == 1
+    assert system.approval.shown == ["v1 drafted"]
+    assert system.logger.logged[0]["final_decision"] == "max_cycles_reached"
+
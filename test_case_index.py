@@ -0,0 +1,100 @@
+import os
+import pickle
+
+import pytest
+
+from case_index import CaseIndex, _read_header, _split_points
+from corpus_bin import MappedCorpus, write_corpus_bin
+
+
+@pytest.mark.parametrize("n_chunks", [1, 2, 7, 64, 10_000])
+def test_split_points_fall_on_row_starts(cases_csv, n_chunks):
+    serial = CaseIndex.build(cases_csv)
+    _, start = _read_header(cases_csv)
+    end = serial.key["size"]
+    points = _split_points(cases_csv, start, end, n_chunks)
+
+    assert points[0] == start and points[-1] == end
+    assert points == sorted(set(points))
+    assert set(points[:-1]) <= set(serial.store.row_offsets)
+
+
+def test_parallel_build_matches_serial(cases_csv):
+    serial = CaseIndex.build(cases_csv)
+    parallel = CaseIndex.build(cases_csv, workers=3)
+
+    assert len(serial) == len(parallel) == 300
+    assert list(parallel.store.iter_case_ids()) == list(serial.store.iter_case_ids())
+    assert list(parallel.store.row_offsets) == list(serial.store.row_offsets)
+    assert list(parallel.doc_lens) == list(serial.doc_lens)
+    assert parallel.postings == serial.postings
+    assert parallel.tfs == serial.tfs
+
+
+def test_concurrent_saves_and_corpus_writes_do_not_collide(cases_csv, tmp_path, run_threads):
+    index = CaseIndex.build(cases_csv)
+    index_path = CaseIndex.default_path(cases_csv)
+
+    _, errors = run_threads(lambda: index.save(index_path), n=6)
+    assert errors == []
+    _, errors = run_threads(lambda: write_corpus_bin(cases_csv), n=6)
+    assert errors == []
+    assert sorted(os.listdir(tmp_path)) == ["cases.csv", "cases.csv.bin", "cases.csv.idx"]
+
+    loaded = CaseIndex.load(index_path, cases_csv)
+    assert loaded is not None and loaded.postings == index.postings
+    corpus = MappedCorpus.open(cases_csv + ".bin", cases_csv)
+    assert corpus is not None and len(corpus) == len(index)
+    corpus.close()
+
+
+def test_corpus_rejects_case_ids_it_cannot_store(tmp_path, write_cases):
+    long_id = "é" * 0x8000  # 65536 UTF-8 bytes: a byte cut would split the last character
+    path = write_cases(str(tmp_path / "cases.csv"), rows=[
+        ["CASE_1", "revenue review", "", "", "sales budget", "- units was 1%", ""],
+        [long_id, "revenue review", "", "", "sales budget", "- units was 2%", ""],
+    ])
+
+    with pytest.raises(ValueError, match="row 1"):
+        write_corpus_bin(path)
+    assert sorted(os.listdir(tmp_path)) == ["cases.csv"]
+
+    bin_path = path + ".bin"
+    index = CaseIndex.load_or_build(path, bin_path=bin_path)  # falls back to the CSV-backed store
+    assert not isinstance(index.store, MappedCorpus)
+    assert index.store.case_id(1) == long_id
+    assert index.store.records([1])[1].gold_data_points == "- units was 2%"
+
+
+def test_corpus_keeps_multibyte_case_ids(tmp_path, write_cases):
+    ids = ["CASE_1", "Fall_Überprüfung", "案例" + "界" * 21843]  # the last is exactly 65535 bytes
+    path = write_cases(str(tmp_path / "cases.csv"),
+                       rows=[[case_id, "revenue review", "", "", "sales budget", "", ""] for case_id in ids])
+
+    corpus = MappedCorpus.open(write_corpus_bin(path), path)
+    assert list(corpus.iter_case_ids()) == ids
+    corpus.close()
+
+
+@pytest.mark.parametrize("damage", ["missing_field", "unknown_class", "truncated"])
+def test_damaged_index_file_is_rebuilt(cases_csv, damage):
+    index = CaseIndex.build(cases_csv)
+    index_path = CaseIndex.default_path(cases_csv)
+    index.save(index_path)
+    with open(index_path, "rb") as f:
+        data = pickle.load(f)
+
+    if damage == "missing_field":
+        del data["doc_lens"]  # same version and source key, but not loadable
+        payload = pickle.dumps(data)
+    elif damage == "unknown_class":
+        payload = pickle.dumps(data).replace(b"\x8c\x05array", b"\x8c\x05nopes")  # module gone
+    else:
+        payload = pickle.dumps(data)[:-50]
+    with open(index_path, "wb") as f:
+        f.write(payload)
+
+    assert CaseIndex.load(index_path, cases_csv) is None
+    rebuilt = CaseIndex.load_or_build(cases_csv)
+    assert rebuilt.postings == index.postings and list(rebuilt.doc_lens) == list(index.doc_lens)
+    assert CaseIndex.load(index_path, cases_csv) is not None  # saved again
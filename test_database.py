@@ -0,0 +1,139 @@
+import sqlite3
+import threading
+
+import pytest
+
+import database
+from preference_store import PreferenceStore
+
+VERSIONS = [version for version, _ in database.MIGRATIONS]
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = tmp_path / "memo_system.db"
+    monkeypatch.setattr(database, "DB_PATH", path)
+    monkeypatch.setattr(database, "_initialized_paths", set())
+    yield path
+    database.close_connection()
+
+
+@pytest.fixture
+def applied(monkeypatch):
+    """Records which migrations run."""
+    calls = []
+
+    def recorded(version, migrate):
+        def run(cur):
+            calls.append(version)
+            migrate(cur)
+        return run
+
+    monkeypatch.setattr(database, "MIGRATIONS", [(v, recorded(v, m)) for v, m in database.MIGRATIONS])
+    return calls
+
+
+def restart(monkeypatch):
+    """As if a new process opened the same database."""
+    database.close_connection()
+    monkeypatch.setattr(database, "_initialized_paths", set())
+
+
+def tables(conn):
+    return {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'index')")}
+
+
+def test_migrations_apply_once_and_are_recorded(db_path, applied, monkeypatch):
+    database.init_db()
+    conn = database.get_connection()
+    assert applied == VERSIONS
+    recorded = conn.execute("SELECT version, applied_at FROM schema_version ORDER BY version").fetchall()
+    assert [r["version"] for r in recorded] == VERSIONS
+    assert database.schema_version(conn) == VERSIONS[-1]
+    assert {"evaluation_log", "feedback_log", "preference_counts", "llm_cache",
+            "evaluation_daily", "feedback_daily", "idx_evaluation_log_timestamp"} <= tables(conn)
+
+    database.init_db()  # same process: returns straight away
+    restart(monkeypatch)
+    database.init_db()
+    conn = database.get_connection()
+    assert applied == VERSIONS
+    assert conn.execute("SELECT version, applied_at FROM schema_version ORDER BY version").fetchall() == recorded
+
+
+def test_upgrades_a_database_from_before_schema_version(db_path, applied):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        # the layout init_db() created before migrations were introduced
+        conn.execute("CREATE TABLE evaluation_log (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, "
+                     "topic TEXT NOT NULL, revision_cycles INTEGER NOT NULL, final_decision TEXT NOT NULL)")
+        conn.execute("CREATE TABLE feedback_log (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, "
+                     "topic TEXT NOT NULL, revision_cycles INTEGER NOT NULL, rating_1_to_5 INTEGER, feedback_text TEXT)")
+        conn.execute("INSERT INTO evaluation_log (timestamp, topic, revision_cycles, final_decision) "
+                     "VALUES ('2025-01-01T00:00:00', 'q3', 2, 'approve')")
+        conn.executemany("INSERT INTO feedback_log (timestamp, topic, revision_cycles, rating_1_to_5, feedback_text) "
+                         "VALUES ('2025-01-01T00:00:00', 'q3', 1, 4, ?)",
+                         [("too long",), ("shorter please",), ("more formal",)])
+    conn.close()
+
+    database.init_db()
+    conn = database.get_connection()
+    assert applied == VERSIONS
+    assert database.schema_version(conn) == VERSIONS[-1]
+    assert conn.execute("SELECT COUNT(*) FROM evaluation_log").fetchone()[0] == 1
+    assert PreferenceStore().get_counts() == {"too_long": 2, "too_short": 0, "more_professional": 1}
+
+
+def test_only_pending_migrations_run(db_path, applied, monkeypatch):
+    database.init_db()
+    with database.get_connection() as conn:
+        conn.execute("DROP TABLE evaluation_daily")
+        conn.execute("DROP TABLE feedback_daily")
+        conn.execute("DELETE FROM schema_version WHERE version = ?", (VERSIONS[-1],))
+    restart(monkeypatch)
+    applied.clear()
+
+    database.init_db()
+    assert applied == [VERSIONS[-1]]
+    assert {"evaluation_daily", "feedback_daily"} <= tables(database.get_connection())
+
+
+def test_a_failed_migration_is_rolled_back_and_retried(db_path, monkeypatch):
+    def broken(cur):
+        cur.execute("CREATE TABLE half_done (x INTEGER)")
+        raise RuntimeError("migration failed")
+
+    good = database.MIGRATIONS
+    monkeypatch.setattr(database, "MIGRATIONS", good + [(VERSIONS[-1] + 1, broken)])
+    with pytest.raises(RuntimeError):
+        database.init_db()
+    conn = database.get_connection()
+    assert database.schema_version(conn) == 0  # all pending migrations share one transaction
+    assert "half_done" not in tables(conn)
+
+    monkeypatch.setattr(database, "MIGRATIONS", good)
+    database.init_db()  # not marked initialized: tries again
+    assert database.schema_version(database.get_connection()) == VERSIONS[-1]
+
+
+def test_connections_are_reused_per_thread(db_path):
+    conn = database.get_connection()
+    assert database.get_connection() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == database.BUSY_TIMEOUT_MS
+
+    others = []
+
+    def worker():
+        others.append(database.get_connection())
+        others.append(database.get_connection())
+        database.close_connection()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    assert others[0] is others[1] and others[0] is not conn
+    assert database.get_connection() is conn  # closing another thread's connection leaves ours open
+
+    database.close_connection()
+    assert database.get_connection() is not conn
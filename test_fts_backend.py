@@ -0,0 +1,58 @@
+import os
+
+from analyst_agent import AnalystAgent
+from fts_backend import FTSCaseStore
+
+def test_concurrent_first_queries_build_once(cases_csv, tmp_path, monkeypatch, run_threads):
+    store = FTSCaseStore(cases_csv)
+
+    builds = []
+    original = FTSCaseStore.build
+    monkeypatch.setattr(FTSCaseStore, "build", lambda self: (builds.append(1), original(self)))
+
+    results, errors = run_threads(lambda: store.search("sales revenue", top_k=3))
+    assert errors == []
+    assert len(builds) == 1
+    assert all(len(hits) == 3 for hits in results)
+    assert sorted(os.listdir(tmp_path)) == ["cases.csv", "cases.csv.fts.db"]
+
+
+def test_separate_stores_build_into_unique_tmp_files(cases_csv, tmp_path, run_threads):
+    # two stores on the same DB (e.g. two processes) may both rebuild; neither corrupts the other
+    stores = [FTSCaseStore(cases_csv) for _ in range(4)]
+
+    results, errors = run_threads(lambda: stores.pop().build(), n=4)
+    assert errors == []
+    assert sorted(os.listdir(tmp_path)) == ["cases.csv", "cases.csv.fts.db"]
+    assert len(FTSCaseStore(cases_csv).search("sales revenue", top_k=3)) == 3
+
+
+def test_shared_analyst_fts5_concurrent_first_queries(cases_csv, monkeypatch, run_threads):
+    agent = AnalystAgent(cases_csv, backend="fts5")
+
+    builds = []
+    original = FTSCaseStore.build
+    monkeypatch.setattr(FTSCaseStore, "build", lambda self: (builds.append(1), original(self)))
+
+    results, errors = run_threads(lambda: agent.run("sales revenue review"))
+    assert errors == []
+    assert len(builds) == 1
+    assert all(len(out.data_points) == 3 for out in results)
+
+
+def test_rows_hitting_one_rare_token_do_not_hide_qualifying_rows(tmp_path, write_cases):
+    # 60 short rows that only hit "zephyr" (many times) outrank the rows with both
+    # query terms in FTS5's bm25, so they fill the first top_k * candidates window
+    csv_path = write_cases(str(tmp_path / "cases.csv"), rows=(
+        [[f"RARE_{i:03d}", "zephyr zephyr zephyr zephyr", "", "", "", f"rare {i}", ""] for i in range(60)]
+        + [[f"FILL_{i:03d}", f"quarterly budget {i}", "", "", "margin " * 20, "", ""] for i in range(200)]
+        + [[f"BOTH_{i}", "zephyr margin", "", "", "notes " * 40, f"both {i}", ""] for i in range(3)]
+    ))
+
+    store = FTSCaseStore(csv_path)
+    hits = store.search("zephyr margin", top_k=3)
+    assert sorted(case_id for case_id, _ in hits) == ["BOTH_0", "BOTH_1", "BOTH_2"]
+
+    memory = AnalystAgent(csv_path, backend="index").run("zephyr margin")
+    assert sorted(dp.source for dp in memory.data_points) == ["BOTH_0", "BOTH_1", "BOTH_2"]
+    assert store.search("zephyr margin", top_k=5) == hits  # runs out of matches: fewer than top_k
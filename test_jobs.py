@@ -0,0 +1,123 @@
+import threading
+import time
+
+import pytest
+
+import jobs
+from jobs import JobManager
+
+
+class FakeStream:
+    """An LLM piece stream that records whether it was closed; endless unless given pieces."""
+
+    def __init__(self, pieces=None, delay=0.005):
+        self.pieces = pieces
+        self.delay = delay
+        self.sent = 0
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.closed or (self.pieces is not None and self.sent == len(self.pieces)):
+            raise StopIteration
+        time.sleep(self.delay)
+        self.sent += 1
+        return self.pieces[self.sent - 1] if self.pieces is not None else "x"
+
+    def close(self):
+        self.closed = True
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+@pytest.fixture
+def manager():
+    m = JobManager(max_workers=1)
+    yield m
+    m._pool.shutdown(wait=True)
+
+
+def stream_job(job, stream):
+    job.set_stage("Drafting...")
+    return job.stream_into(stream)
+
+
+def test_stream_into_publishes_partial_text_and_closes_the_stream(manager):
+    stream = FakeStream(["Dear ", "team,", " ok"])
+    job = manager.submit("generate", stream_job, stream, meta={"topic": "q3"})
+    wait_for(lambda: job.finished)
+
+    assert job.status == "done" and job.result == job.partial == "Dear team, ok"
+    assert job.stage == "Drafting..." and job.meta == {"topic": "q3"}
+    assert stream.closed
+    assert manager.get(job.id) is job and manager.get(None) is None
+
+
+def test_cancel_running_job_closes_its_stream(manager):
+    stream = FakeStream()
+    job = manager.submit("generate", stream_job, stream)
+    wait_for(lambda: job.status == "running" and job.partial)
+
+    assert manager.cancel(job.id)
+    wait_for(lambda: job.finished)
+    assert job.status == "cancelled" and job.finished_at is not None
+    assert stream.closed
+    assert job.partial  # what was generated so far stays readable
+    assert not manager.cancel(job.id)  # already finished
+
+
+def test_cancel_queued_job_never_starts(manager):
+    release = threading.Event()
+    blocker = manager.submit("generate", lambda job: release.wait(5))
+    wait_for(lambda: blocker.status == "running")
+    started = []
+    queued = manager.submit("revise", lambda job: started.append(job))
+
+    assert queued.status == "queued"
+    assert manager.cancel(queued.id)
+    assert queued.status == "cancelled" and queued.finished
+    release.set()
+    wait_for(lambda: blocker.finished)
+    assert started == []
+    assert manager.stats() == {"done": 1, "cancelled": 1}
+    assert not manager.cancel("no-such-job")
+
+
+def test_failed_job_reports_the_error(manager):
+    def boom(job):
+        raise ValueError("model not found")
+
+    job = manager.submit("generate", boom)
+    wait_for(lambda: job.finished)
+    assert job.status == "failed" and job.error == "ValueError: model not found"
+
+
+def test_finished_jobs_are_forgotten_after_retention(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(jobs.time, "time", lambda: now[0])
+    manager = JobManager(max_workers=1, retention_seconds=60)
+    release = threading.Event()
+    try:
+        done = manager.submit("generate", lambda job: "memo")
+        wait_for(lambda: done.finished)
+        running = manager.submit("generate", lambda job: release.wait(5))
+        wait_for(lambda: running.status == "running")
+
+        now[0] += 60
+        manager.submit("generate", lambda job: None)  # eviction happens on submit
+        assert manager.get(done.id) is done  # not older than retention_seconds yet
+
+        now[0] += 1
+        manager.submit("generate", lambda job: None)
+        assert manager.get(done.id) is None
+        assert manager.get(running.id) is running  # unfinished jobs are never evicted
+    finally:
+        release.set()
+        manager._pool.shutdown(wait=True)
@@ -0,0 +1,94 @@
+import pytest
+
+import llm_cache
+from drafting_agent import DraftingAgent
+from llm_cache import LLMCache
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(llm_cache.time, "time", c.time)
+    return c
+
+
+def test_make_key_covers_model_prompt_and_options():
+    key = LLMCache.make_key("phi3", "prompt", {"temperature": 0.2, "num_predict": 200})
+    assert key == LLMCache.make_key("phi3", "prompt", {"num_predict": 200, "temperature": 0.2})
+    assert key != LLMCache.make_key("phi3", "prompt", {"temperature": 0.3, "num_predict": 200})
+    assert key != LLMCache.make_key("llama3", "prompt", {"temperature": 0.2, "num_predict": 200})
+    assert LLMCache.make_key("phi3", "prompt") == LLMCache.make_key("phi3", "prompt", {})
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = LLMCache(max_entries=2)
+    cache.put("a", "phi3", "A")
+    cache.put("b", "phi3", "B")
+    assert cache.get("a") == "A"  # "b" is now the oldest
+    cache.put("c", "phi3", "C")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "A" and cache.get("c") == "C"
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["size"] == 2
+    assert stats["hits"] == 3 and stats["misses"] == 1 and stats["hit_rate"] == 0.75
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = LLMCache(ttl_seconds=60)
+    cache.put("a", "phi3", "A")
+    clock.now += 60
+    assert cache.get("a") == "A"
+    clock.now += 1
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert stats["expired"] == 1 and stats["misses"] == 1 and stats["size"] == 0
+
+
+def test_in_process_cache_writes_nothing_to_the_database(temp_db):
+    LLMCache().put("a", "phi3", "A")
+    assert temp_db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] == 0
+
+
+def test_persisted_entries_survive_a_new_cache(temp_db):
+    LLMCache(persist=True).put("a", "phi3", "A")
+
+    fresh = LLMCache(persist=True)
+    assert fresh.get("a") == "A"
+    assert fresh.get("a") == "A"  # now answered from memory
+    assert fresh.get("missing") is None
+    stats = fresh.stats()
+    assert stats["persistent_hits"] == 1 and stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_persisted_rows_are_capped_by_last_use(temp_db, clock):
+    cache = LLMCache(persist=True, max_persisted=2)
+    for key in "abc":
+        clock.now += 1
+        cache.put(key, "phi3", key.upper())
+    keys = [r[0] for r in temp_db.execute("SELECT key FROM llm_cache ORDER BY key")]
+    assert keys == ["b", "c"]
+
+
+def test_persisted_entries_expire_after_ttl(temp_db, clock):
+    LLMCache(persist=True, ttl_seconds=60).put("a", "phi3", "A")
+    clock.now += 61
+
+    cache = LLMCache(persist=True, ttl_seconds=60)
+    assert cache.get("a") is None
+    assert cache.stats()["expired"] == 1
+    assert temp_db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] == 0
+
+
+def test_drafting_agent_persists_only_when_asked():
+    assert DraftingAgent().llm.cache.persist is False
+    assert DraftingAgent(persist_cache=True).llm.cache.persist is True
+    assert DraftingAgent(use_cache=False).llm.cache is None
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from llm_client import LocalLLM
+
+MEMO = "Subject: Stub\n\nDear Colleagues,\n\nBody.\n\nKind regards,\n[Your Name]"
+
+
+class StubOllama(BaseHTTPRequestHandler):
+    """Minimal /api/generate + /api/chat: JSON replies, or NDJSON chunks when stream is true."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive, like Ollama
+    requests: list = []
+    text = MEMO
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        type(self).requests.append((self.path, payload, self.client_address))
+
+        def chunk(text, done=False):
+            if self.path == "/api/chat":
+                return {"message": {"role": "assistant", "content": text}, "done": done}
+            return {"response": text, "done": done}
+
+        if payload.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            pieces = [self.text[i:i + 8] for i in range(0, len(self.text), 8)]
+            for line in [chunk(p) for p in pieces] + [chunk("", done=True)]:
+                data = json.dumps(line).encode() + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.write(b"0\r\n\r\n")
+            return
+
+        body = json.dumps(chunk(self.text, done=True)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def ollama():
+    StubOllama.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOllama)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def client(server, **kwargs) -> LocalLLM:
+    return LocalLLM(model_name="stub", host=f"http://127.0.0.1:{server.server_port}", **kwargs)
+
+
+def test_generate_reuses_connection_and_sends_keep_alive(ollama):
+    llm = client(ollama, keep_alive="10m")
+    assert llm.run("one") == MEMO
+    assert llm.run("two") == MEMO
+
+    (path1, payload1, addr1), (path2, payload2, addr2) = StubOllama.requests
+    assert path1 == path2 == "/api/generate"
+    assert payload1["keep_alive"] == "10m"
+    assert payload1["model"] == "stub" and payload1["stream"] is False
+    assert addr1 == addr2  # same client socket: the pooled connection was reused
+
+
+def test_stream_reads_ndjson_pieces(ollama):
+    llm = client(ollama)
+    pieces = list(llm.stream("prompt"))
+    assert len(pieces) > 1
+    assert "".join(pieces) == MEMO
+
+    # the connection is back in the pool after a fully read stream
+    assert llm.run("again") == MEMO
+    assert StubOllama.requests[0][2] == StubOllama.requests[1][2]
+
+
+def test_chat_stream(ollama):
+    llm = client(ollama)
+    messages = [{"role": "user", "content": "hi"}]
+    assert "".join(llm.chat_stream(messages)) == MEMO
+    path, payload, _ = StubOllama.requests[0]
+    assert path == "/api/chat"
+    assert payload["messages"] == messages and payload["stream"] is True
+
+
+def test_falls_back_to_cli_when_connection_refused(monkeypatch):
+    with socket.socket() as s:  # a port with nothing listening on it
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    llm = LocalLLM(model_name="stub", host=f"http://127.0.0.1:{port}")
+    monkeypatch.setattr(llm, "_generate_subprocess", lambda prompt: "cli:" + prompt)
+    monkeypatch.setattr(llm, "_stream_subprocess", lambda prompt: iter(["cli:", prompt]))
+
+    assert llm.run("p") == "cli:p"
+    assert "".join(llm.stream("p")) == "cli:p"
+    with pytest.raises(ConnectionError):
+        list(llm.chat_stream([{"role": "user", "content": "p"}]))
+
+
+@pytest.mark.parametrize("error", [TimeoutError("timed out"), socket.gaierror("no such host"),
+                                   ConnectionRefusedError()])
+def test_warm_swallows_network_errors(monkeypatch, error):
+    llm = LocalLLM(model_name="stub", host="http://ollama.invalid:11434")
+
+    def fail(*args):
+        raise error
+
+    monkeypatch.setattr(llm, "_post", fail)
+    llm.warm()
+    asyncio.run(llm.awarm())
+
+
+class Source:
+    """A piece iterator that records whether it was closed early."""
+
+    def __init__(self, pieces):
+        self.pieces = iter(pieces)
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.pieces)
+
+    def close(self):
+        self.closed = True
+
+
+def splits(text):
+    """Every way of cutting text into two or three pieces."""
+    for i in range(len(text) + 1):
+        for j in range(i, len(text) + 1):
+            yield [text[:i], text[i:j], text[j:]]
+
+
+def test_limit_drops_stop_string_split_across_pieces():
+    text = "Body text.\n\nKind regards,\n[Your Name]\n<END>trailing"
+    for pieces in splits(text):
+        source = Source(pieces)
+        assert "".join(LocalLLM._limit(source, stop=["<END>", "\n\n\n"])) == text[:text.index("<END>")]
+        assert source.closed
+
+
+def test_limit_keeps_end_match_and_stops_there():
+    text = "Body.\n\nKind regards,\n[Your Name]\n\nP.S. more"
+    end = r"Kind regards,\s*\n\[Your Name\]"
+    for pieces in splits(text):
+        source = Source(pieces)
+        assert "".join(LocalLLM._limit(source, end=end)) == "Body.\n\nKind regards,\n[Your Name]"
+        assert source.closed
+
+
+def test_limit_earliest_cut_wins_and_holds_back_only_possible_stops():
+    assert "".join(LocalLLM._limit(iter(["a<E", "ND>b [Your Name]"]), stop=["<END>"], end=r"\[Your Name\]")) == "a"
+    assert "".join(LocalLLM._limit(iter(["[Your Name]", "<END>"]), stop=["<END>"], end=r"\[Your Name\]")) == "[Your Name]"
+    # a partial stop string that never completes is released at the end
+    assert "".join(LocalLLM._limit(iter(["abc<EN", "D"]), stop=["<END>"])) == "abc<END"
+    assert "".join(LocalLLM._limit(iter(["abc<EN"]), stop=["<END>"])) == "abc<EN"
+    assert list(LocalLLM._limit(iter(["x", "y"]))) == ["x", "y"]
+
+
+def test_stream_applies_stop_and_end_client_side(ollama):
+    llm = client(ollama)
+    assert "".join(llm.stream("p", end=r"Dear Colleagues,")) == "Subject: Stub\n\nDear Colleagues,"
+    assert llm.run("p", options={"stop": ["\n\nBody"]}, end=r"\[Your Name\]") == "Subject: Stub\n\nDear Colleagues,"
+    assert StubOllama.requests[-1][1]["options"]["stop"] == ["\n\nBody"]
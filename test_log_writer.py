@@ -0,0 +1,104 @@
+import csv
+import threading
+import time
+
+import pytest
+
+from log_writer import BackgroundWriter
+
+HEADER = ["topic", "feedback_text", "created_at"]
+INSERT_SQL = "INSERT INTO evaluation_log (timestamp, topic, revision_cycles, final_decision) VALUES (?, ?, ?, ?)"
+
+
+@pytest.fixture
+def writer():
+    w = BackgroundWriter(batch_size=3, flush_interval=0.05)
+    yield w
+    w.close()
+
+
+def read_rows(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def row(i):
+    return [f"topic {i}", "make it shorter", f"2026-10-17T00:00:{i:02d}"]
+
+
+def test_csv_rows_are_batched_with_one_header(writer, tmp_path):
+    path = str(tmp_path / "log.csv")
+    for i in range(7):
+        assert writer.submit_csv(path, HEADER, row(i))
+    assert writer.flush()
+
+    assert read_rows(path) == [HEADER] + [row(i) for i in range(7)]
+    stats = writer.stats()
+    assert stats["written"] == 7 and stats["queued"] == 0
+    assert 3 <= stats["batches"] < 7  # batch_size=3: rows share writes
+
+
+def test_sql_batch_commits_and_runs_each_callback_once(writer, temp_db):
+    calls = []
+    callback = lambda: calls.append(1)  # noqa: E731 - the same callable for every item
+    for i in range(5):
+        writer.submit_sql([(INSERT_SQL, ("2026-10-17", f"t{i}", i, "approve"))], on_commit=callback)
+    writer.flush()
+
+    assert temp_db.execute("SELECT COUNT(*) FROM evaluation_log").fetchone()[0] == 5
+    assert 1 <= len(calls) <= 2  # once per batch, not per row
+
+
+def test_failed_batch_falls_back_to_one_transaction_per_item(writer, temp_db, tmp_path):
+    committed = []
+    # submitted within flush_interval (and < batch_size): one batch, one failing transaction
+    writer.submit_csv(str(tmp_path / "log.csv"), HEADER, row(0))
+    writer.submit_sql([(INSERT_SQL, ("2026-10-17", "good", 0, "approve"))],
+                      on_commit=lambda: committed.append("good"))
+    writer.submit_sql([("INSERT INTO no_such_table VALUES (?)", (1,))],
+                      on_commit=lambda: committed.append("bad"))
+    writer.flush()
+
+    assert [r[0] for r in temp_db.execute("SELECT topic FROM evaluation_log")] == ["good"]
+    assert committed == ["good"]
+    stats = writer.stats()
+    assert stats["failed"] == 1 and stats["written"] == 2
+    assert "no_such_table" in stats["last_error"]
+
+
+def test_rows_are_dropped_only_when_the_queue_stays_full(tmp_path):
+    w = BackgroundWriter(batch_size=1, flush_interval=0.01, max_queue=1, block_timeout=0.05)
+    path = str(tmp_path / "log.csv")
+    try:
+        with w._csv_lock:  # the flusher blocks in its first write
+            assert w.submit_csv(path, HEADER, row(0))
+            time.sleep(0.05)  # ... which it has taken off the queue
+            assert w.submit_csv(path, HEADER, row(1))  # fills the queue
+            assert not w.submit_csv(path, HEADER, row(2))  # waits block_timeout, then dropped
+        w.flush()
+        assert read_rows(path) == [HEADER, row(0), row(1)]
+        stats = w.stats()
+        assert stats["dropped"] == 1 and stats["blocked"] == 1
+    finally:
+        w.close()
+
+
+def test_close_writes_rows_queued_behind_the_stop_marker(tmp_path):
+    w = BackgroundWriter(batch_size=1, flush_interval=0.01)
+    path = str(tmp_path / "log.csv")
+    with w._csv_lock:
+        w.submit_csv(path, HEADER, row(0))
+        closer = threading.Thread(target=w.close)
+        closer.start()
+        while not w._closed:
+            time.sleep(0.001)
+        time.sleep(0.02)
+        # a row that passed the closed check just before close() lands behind the stop marker
+        w._queue.put(("csv", (path, HEADER, row(1)), None))
+    closer.join(5)
+    assert not closer.is_alive()
+
+    w.submit_csv(path, HEADER, row(2))  # after close: written synchronously
+    assert read_rows(path) == [HEADER, row(0), row(1), row(2)]
+    assert w.flush() is True
+    w.close()  # idempotent
@@ -0,0 +1,120 @@
+import csv
+import gzip
+import os
+
+import maintenance
+from analytics import approval_summary
+from analyze_evaluation import iter_evaluation_log, iter_evaluation_rollup, rollup_path, summarize
+from evaluation_logger import EvaluationLogger
+from log_writer import get_writer
+
+CUTOFF = "2026-01-01"
+OLD = ["2025-03-01T10:00:00", "2025-03-01T11:00:00", "2025-06-15T09:30:00"]
+NEW = ["2026-02-01T08:00:00", "2026-10-16T12:00:00"]
+
+
+def fill_db(conn):
+    with conn:
+        for i, ts in enumerate(OLD + NEW):
+            conn.execute("INSERT INTO evaluation_log (timestamp, topic, revision_cycles, final_decision) "
+                         "VALUES (?, ?, ?, ?)", (ts, f"topic {i % 2}", i, "approve" if i % 2 else "max_cycles_reached"))
+            conn.execute("INSERT INTO feedback_log (timestamp, topic, revision_cycles, rating_1_to_5, feedback_text) "
+                         "VALUES (?, ?, ?, ?, ?)", (ts, f"topic {i % 2}", i, 4, "make it shorter"))
+
+
+def gz_rows(path):
+    with gzip.open(path, "rt", newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def test_rollup_sqlite_moves_old_rows_and_keeps_reports(temp_db, tmp_path):
+    fill_db(temp_db)
+    before = approval_summary()
+    archive_dir = tmp_path / "archive"
+
+    moved = maintenance.rollup_sqlite(CUTOFF, archive_dir)
+    assert moved == {"evaluation_log": len(OLD), "feedback_log": len(OLD)}
+
+    kept = [r["timestamp"] for r in temp_db.execute("SELECT timestamp FROM evaluation_log ORDER BY id")]
+    assert kept == NEW
+    assert temp_db.execute("SELECT COUNT(*) FROM feedback_log").fetchone()[0] == len(NEW)
+    assert temp_db.execute("SELECT SUM(runs) FROM evaluation_daily").fetchone()[0] == len(OLD)
+    assert temp_db.execute("SELECT SUM(feedback), SUM(rating_sum) FROM feedback_daily").fetchone()[:] == (3, 12)
+
+    archives = sorted(os.listdir(archive_dir))
+    assert [name.split("-")[0] for name in archives] == ["evaluation_log", "feedback_log"]
+    header, *rows = gz_rows(archive_dir / archives[0])
+    assert "timestamp" in header and [r[header.index("timestamp")] for r in rows] == OLD
+
+    assert approval_summary() == before
+    assert approval_summary(since="2025-06-01")["total_runs"] == 3  # day resolution for rolled-up rows
+
+    maintenance.vacuum()
+    assert temp_db.execute("PRAGMA auto_vacuum").fetchone()[0] == 2  # incremental from now on
+    assert approval_summary() == before
+
+
+def test_rollup_sqlite_is_a_no_op_inside_the_horizon(temp_db):
+    fill_db(temp_db)
+    before = approval_summary()
+    assert maintenance.rollup_sqlite("2025-01-01", None) == {"evaluation_log": 0, "feedback_log": 0}
+    assert temp_db.execute("SELECT COUNT(*) FROM evaluation_log").fetchone()[0] == len(OLD + NEW)
+    assert approval_summary() == before
+
+
+def write_evaluation_csv(path):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(EvaluationLogger.HEADER)
+        for i, ts in enumerate(OLD + NEW):
+            writer.writerow([ts, f"topic {i % 2}", True, i, "approve" if i % 2 else "edit_request"])
+
+
+def test_compact_evaluation_csv(tmp_path):
+    path = str(tmp_path / "evaluation_log.csv")
+    write_evaluation_csv(path)
+    before = summarize(iter_evaluation_log(path))
+
+    assert maintenance.compact_evaluation_csv(path, CUTOFF, tmp_path / "archive") == len(OLD)
+    with open(path, newline="", encoding="utf-8") as f:
+        assert [r[0] for r in csv.reader(f)] == ["timestamp"] + NEW
+    assert os.path.exists(rollup_path(path))
+    assert len(gz_rows(next((tmp_path / "archive").iterdir()))) == 1 + len(OLD)  # header + rows
+
+    after = summarize(list(iter_evaluation_rollup(path)) + list(iter_evaluation_log(path)))
+    assert after == before
+    assert sorted(os.listdir(tmp_path)) == ["archive", "evaluation_log.csv", "evaluation_log.daily.csv"]
+
+    assert maintenance.compact_evaluation_csv(path, CUTOFF, None) == 0  # second run: nothing left to move
+
+
+def test_compact_keeps_rows_queued_in_the_log_writer(tmp_path):
+    path = str(tmp_path / "evaluation_log.csv")
+    write_evaluation_csv(path)
+    logger = EvaluationLogger(path)
+    for _ in range(5):
+        logger.log("late topic", 0, "approve", True)  # still in the writer's queue
+
+    assert maintenance.compact_evaluation_csv(path, CUTOFF, None) == len(OLD)
+    get_writer().flush()
+    topics = [topic for topic, *_ in iter_evaluation_log(path)]
+    assert topics.count("late topic") == 5 and len(topics) == len(NEW) + 5
+
+
+def test_rows_appended_during_compaction_are_carried_over(tmp_path, monkeypatch):
+    path = str(tmp_path / "feedback_memory.csv")
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows([["t", "make it shorter", ts] for ts in OLD + NEW])
+
+    write_tmp_csv = maintenance._write_tmp_csv
+
+    def append_meanwhile(*args):
+        # another process appends after the file was read
+        with open(path, "a", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerow(["t", "make it longer", "2026-10-17T00:00:00"])
+        return write_tmp_csv(*args)
+
+    monkeypatch.setattr(maintenance, "_write_tmp_csv", append_meanwhile)
+    assert maintenance.compact_feedback_memory(path, CUTOFF, None) == len(OLD)
+    with open(path, newline="", encoding="utf-8") as f:
+        assert [r[2] for r in csv.reader(f)] == NEW + ["2026-10-17T00:00:00"]
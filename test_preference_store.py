@@ -0,0 +1,75 @@
+from collections import Counter
+
+from feedback_logger import FeedbackLoggerSQL
+from log_writer import get_writer
+from preference_store import PREFERENCE_COUNTERS, PreferenceStore, backfill_preference_counts
+
+FEEDBACK = [
+    "Too long, please trim",
+    "make it SHORTER",
+    "a bit longer please",
+    "Too short and needs more detail",
+    "More formal, and shorter",
+    "use a professional tone",
+    "shorter, not longer",
+    "",
+    "   ",
+    None,
+    "looks good",
+    "Very long intro; more professional wording",
+]
+
+
+def legacy_counts(conn):
+    """The full feedback_log scan PreferenceStore did before preference_counts existed."""
+    counts = Counter()
+    for row in conn.execute("SELECT rating_1_to_5, feedback_text FROM feedback_log"):
+        text = (row["feedback_text"] or "").lower()
+        if not text.strip():
+            continue
+        if any(p in text for p in ["too long", "very long", "shorter"]):
+            counts["too_long"] += 1
+        if any(p in text for p in ["too short", "longer", "more detail"]):
+            counts["too_short"] += 1
+        if any(p in text for p in ["more professional", "professional tone", "more formal"]):
+            counts["more_professional"] += 1
+    return {name: counts[name] for name in PREFERENCE_COUNTERS}
+
+
+def legacy_preferences(counts):
+    return {
+        "prefer_short": counts["too_long"] > counts["too_short"],
+        "prefer_long": counts["too_short"] > counts["too_long"],
+        "prefer_more_professional": counts["more_professional"] > 0,
+    }
+
+
+def test_backfill_matches_the_legacy_feedback_scan(temp_db):
+    with temp_db:
+        temp_db.executemany(
+            "INSERT INTO feedback_log (timestamp, topic, revision_cycles, rating_1_to_5, feedback_text) "
+            "VALUES ('2026-10-17T00:00:00', 't', 1, ?, ?)",
+            [(i % 6 or None, text) for i, text in enumerate(FEEDBACK * 3)])
+        temp_db.execute("INSERT INTO preference_counts (name, count) VALUES ('too_long', 999)")  # stale
+        backfill_preference_counts(temp_db.cursor())
+
+    expected = legacy_counts(temp_db)
+    assert expected == {"too_long": 15, "too_short": 9, "more_professional": 9}
+    store = PreferenceStore()
+    assert store.get_counts() == expected
+    assert store.get_global_preferences(fresh=True) == legacy_preferences(expected)
+
+
+def test_counts_kept_at_insert_time_match_the_legacy_feedback_scan(temp_db):
+    logger = FeedbackLoggerSQL()
+    for i, text in enumerate(FEEDBACK):
+        logger.log_feedback("t", i, i % 6 or None, text)
+    get_writer().flush()
+
+    expected = legacy_counts(temp_db)
+    assert PreferenceStore().get_counts() == expected
+    assert PreferenceStore().get_global_preferences() == legacy_preferences(expected)
+
+    with temp_db:
+        backfill_preference_counts(temp_db.cursor())
+    assert PreferenceStore().get_counts() == expected
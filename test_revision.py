@@ -0,0 +1,85 @@
+from drafting_agent import NUM_PREDICT, TEMPLATE_TOKENS, DraftingAgent
+
+MARKDOWN_MEMO = """**Subject:** Q3 churn update
+
+**To:** Sales & Marketing Teams
+**From:** [Your Name], Sales Operations
+**Date:** 16 October 2026
+
+Dear Colleagues,
+
+This memo summarizes churn for Q3.
+
+Some figures require validation (TBD).
+
+**Key Action Items:**
+- Review accounts
+- Share notes
+
+Please reach out if further clarification is required.
+
+Kind regards,
+[Your Name]"""
+
+
+def agent():
+    return DraftingAgent(use_cache=False)
+
+
+def test_sections_from_markdown_memo():
+    sections = agent()._sections_from_memo(MARKDOWN_MEMO)
+    assert sections.subject == "Q3 churn update"
+    assert sections.paragraphs == ["This memo summarizes churn for Q3.", "Some figures require validation (TBD)."]
+    assert sections.action_items == ["Review accounts", "Share notes"]
+
+
+def test_sections_round_trip_through_render():
+    a = agent()
+    sections = a._sections_from_memo(MARKDOWN_MEMO)
+    assert a._sections_from_memo(a._render(sections, "Q3 churn", "17 October 2026")) == sections
+
+
+def test_unclean_memo_is_not_spliced():
+    a = agent()
+    assert a._sections_from_memo("Subject: X\n\nDear Colleagues,\n\nOnly a paragraph.") is None
+    assert a._sections_from_memo(MARKDOWN_MEMO.replace("Some figures", "- Some figures")) is None
+    assert a._sections_from_memo(MARKDOWN_MEMO.replace("**Subject:** Q3 churn update\n\n", "")) is None
+
+
+def test_target_sections():
+    a = agent()
+    assert a._target_sections("Change the subject line", 2) == ["subject"]
+    assert a._target_sections("Reword the action items", 2) == ["action_items"]
+    assert a._target_sections("Make the second paragraph shorter", 2) == [1]
+    assert a._target_sections("Make the action items shorter and more formal", 2) == ["action_items"]
+    assert a._target_sections("Rewrite the intro and the bullets", 2) == [0, "action_items"]
+    assert a._target_sections("paragraph 3 please", 2) is None
+    assert a._target_sections("Make it shorter", 2) is None
+
+
+def test_memo_wide_cue_regenerates_everything():
+    a = agent()
+    assert a._target_sections("make it shorter and change the subject line", 2) is None
+    assert a._target_sections("Use a more formal tone and reword the action items", 2) is None
+    assert a._target_sections("Change the subject line and make it more concise", 2) is None
+    assert a._target_sections("Make the whole memo more formal, including the subject", 2) is None
+
+
+def test_generation_limits_follow_the_learned_length_preference():
+    short = {"prefer_short": True, "prefer_long": False}
+    long = {"prefer_short": False, "prefer_long": True}
+    none = {"prefer_short": False, "prefer_long": False}
+    a = agent()
+
+    def budget(edit_request, prefs, structured=False):
+        return a._generation_limits(edit_request, prefs, structured)["options"]["num_predict"]
+
+    assert budget(None, short) == NUM_PREDICT["short"]
+    assert budget(None, short, structured=True) == NUM_PREDICT["short"] - TEMPLATE_TOKENS
+    assert budget("fix the typo in the subject", long) == NUM_PREDICT["long"]
+    assert budget(None, none) == NUM_PREDICT["default"]
+    # an explicit length request wins over the learned preference, as in the prompt
+    assert budget("make it longer", short) == NUM_PREDICT["long"]
+    assert budget("this is too long", long) == NUM_PREDICT["default"]
+    assert "Keep it shorter" not in a._preference_instructions("this is too long", short)
+    assert "Keep it shorter" in a._preference_instructions(None, short)
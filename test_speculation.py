@@ -0,0 +1,118 @@
+import threading
+import time
+
+import speculation
+from models import DraftInput, DraftOutput
+from speculation import RevisionSpeculator, foreground, speculation_stats
+
+
+class FakeDrafter:
+    """Streams a few slow pieces; records how many generations were started and closed early."""
+
+    def __init__(self, pieces=20, delay=0.01):
+        self.pieces = pieces
+        self.delay = delay
+        self.started = 0
+        self.closed_early = 0
+
+    def stream(self, draft_input, preferences=None, use_cache=True):
+        self.started += 1
+        done = False
+        try:
+            for _ in range(self.pieces):
+                time.sleep(self.delay)
+                yield "x"
+            done = True
+            return DraftOutput(subject=draft_input.topic, body=draft_input.edit_request, version=draft_input.version)
+        finally:
+            if not done:
+                self.closed_early += 1
+
+
+class Counts:
+    def __init__(self, **counts):
+        self.counts = counts
+
+    def get_counts(self):
+        return dict(self.counts)
+
+
+def shown():
+    return DraftInput(topic="Q3 churn", data_points=[], edit_request=None, version=1, grounded=False)
+
+
+def write_history(path, requests):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("topic,feedback_text,created_at\n")
+        for i, request in enumerate(requests):
+            f.write(f"t{i},{request},2026-10-0{i % 9 + 1}T00:00:00+00:00\n")
+
+
+def test_predict_prior_comes_from_edit_history(tmp_path):
+    path = str(tmp_path / "feedback_memory.csv")
+    write_history(path, ["make it more formal"] * 3 + ["make it longer"] * 2 + ["make it shorter"])
+    spec = RevisionSpeculator(FakeDrafter(), pref_store=Counts(too_long=50), feedback_csv=path)
+    assert spec.predict() == ["Use a more professional tone.", "Make it longer."]
+
+    spec.history = ["shorter please"]  # this session's own edits outweigh the prior
+    assert spec.predict()[0] == "Make it shorter."
+
+
+def test_predict_falls_back_to_preference_counts(tmp_path):
+    spec = RevisionSpeculator(FakeDrafter(), pref_store=Counts(too_long=1, too_short=4, more_professional=2),
+                              feedback_csv=str(tmp_path / "missing.csv"))
+    assert spec.predict() == ["Make it longer.", "Use a more professional tone."]
+
+
+def test_speculation_pauses_while_real_work_runs(tmp_path):
+    drafter = FakeDrafter()
+    spec = RevisionSpeculator(drafter, max_candidates=1, pref_store=Counts(), feedback_csv=str(tmp_path / "none"))
+    paused = speculation_stats()["paused"]
+
+    spec.speculate(shown())
+    time.sleep(0.05)
+    with foreground():
+        time.sleep(0.05)
+        assert drafter.closed_early == 1  # the running stream was closed
+        assert drafter.started == 1  # ... and not restarted while real work runs
+    assert speculation_stats()["paused"] == paused + 1
+
+    out = spec.take("Make it shorter.", 2)  # restarted once idle, served in full
+    assert out is not None and out.body == "Make it shorter."
+    assert drafter.started == 2
+
+
+def test_take_inside_foreground_resumes_its_own_speculation(tmp_path):
+    drafter = FakeDrafter()
+    spec = RevisionSpeculator(drafter, max_candidates=1, pref_store=Counts(), feedback_csv=str(tmp_path / "none"))
+    spec.speculate(shown())
+    time.sleep(0.05)
+
+    result = []
+    with foreground():  # the revision job asking for exactly this edit
+        t = threading.Thread(target=lambda: result.append(spec.take("make it shorter", 2)))
+        t.start()
+        t.join(timeout=5)
+    assert not t.is_alive()
+    assert result[0] is not None and result[0].body == "Make it shorter."
+
+
+def test_edit_history_prior_is_reread_when_the_file_changes(tmp_path):
+    path = str(tmp_path / "feedback_memory.csv")
+    write_history(path, ["make it shorter"])
+    assert speculation.edit_history_prior(path) == {"too_long": 1.0}
+    write_history(path, ["make it shorter", "more detail please"])
+    assert speculation.edit_history_prior(path) == {"too_long": 0.5, "too_short": 0.5}
+
+
+def test_section_and_negated_requests_never_match(tmp_path):
+    drafter = FakeDrafter(pieces=1, delay=0)
+    spec = RevisionSpeculator(drafter, max_candidates=3, pref_store=Counts(), feedback_csv=str(tmp_path / "none"))
+    spec.speculate(shown())
+    for request in ["make the action items shorter", "make the second paragraph longer",
+                    "make the third paragraph shorter", "do not make it shorter",
+                    "change the subject, not shorter", "don't make it longer", "more formal subject line"]:
+        assert spec._match(request, 2) is None, request
+    assert spec._match("make it shorter", 2).category == "too_long"
+    assert spec._match("Use a more formal tone", 2).category == "more_professional"
+    spec.discard()